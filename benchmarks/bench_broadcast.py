@@ -0,0 +1,98 @@
+"""
+Benchmark: koszt CPU jednego broadcast_room_state dla pokoi 10/50/200 graczy.
+
+Uruchamianie (z katalogu głównego repo):
+    python benchmarks/bench_broadcast.py
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_manager import RoomManager
+from models import GameSettings
+from enums import Phase
+from fakes import FakeWebSocket
+
+ROOM_SIZES = (10, 50, 200)
+ITERATIONS = 200
+
+
+async def build_room(manager: RoomManager, size: int):
+    settings = GameSettings(f"bench_{size}", None, size, 10, 1000, None, True, ["base"])
+    manager.create_room("p0", settings)
+    sockets = []
+    for i in range(size):
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        manager.active_connections[ws] = f"p{i}"
+        await manager.join_room(ws, settings.name, None, f"c{i}")
+        sockets.append(ws)
+
+    room = manager.rooms[settings.name]
+    room.game_started = True
+    await room.start_round()
+    for ws in sockets:
+        hand = room.players_data[ws]['hand']
+        room.submit_cards(ws, list(hand)[:room.current_black_card.pick_count])
+    room.pick_winner(0)
+    assert room.phase == Phase.SUMMARY
+    return room, sockets
+
+
+def legacy_broadcast(room, sockets):
+    """Stara ścieżka: pełny słownik i pełne kodowanie JSON dla każdego gracza."""
+    submissions = [{"id": i, "full_text": room.current_black_card.fill_blanks(cards),
+                    "author": room.players_data[ws]['nick'], "is_winner": i == room.winning_submission_index}
+                   for i, (ws, cards) in enumerate(room.judging_order)]
+    players_list = [{"nick": p['nick'], "score": p['score'], "is_czar": ws == room.czar_socket, "id": p['id']}
+                    for ws, p in room.players_data.items()]
+    for ws in sockets:
+        hand = [{"id": cid, "text": room.get_white_card(cid).get_nominative()} for cid in room.players_data[ws]['hand']]
+        json.dumps({"type": "GAME_UPDATE", "phase": room.phase.value,
+                    "black_card": {"text": room.current_black_card.get_display_text(),
+                                   "pick": room.current_black_card.pick_count},
+                    "hand": hand, "is_czar": ws == room.czar_socket, "submissions": submissions,
+                    "has_submitted": ws in room.round_submissions, "ready_status": {"ready": 0, "total": len(sockets)},
+                    "am_i_ready": ws in room.ready_players, "players_list": players_list,
+                    "winner": room.winner_nick, "room_name": room.room_name, "can_start_game": False},
+                   separators=(",", ":"), ensure_ascii=False)
+
+
+async def run():
+    print(f"{'gracze':>7} {'stara [ms]':>11} {'nowa [ms]':>10} {'nowa, zmiana stanu [ms]':>24} {'bajty/broadcast':>16}")
+    for size in ROOM_SIZES:
+        manager = RoomManager()
+        room, sockets = await build_room(manager, size)
+
+        start = time.process_time()
+        for _ in range(ITERATIONS):
+            legacy_broadcast(room, sockets)
+        legacy_ms = (time.process_time() - start) * 1000 / ITERATIONS
+
+        start = time.process_time()
+        for _ in range(ITERATIONS):
+            await manager.broadcast_room_state(room.room_name)
+            await asyncio.sleep(0)  # pozwala taskom wysyłającym opróżnić kolejki
+        cached_ms = (time.process_time() - start) * 1000 / ITERATIONS
+
+        start = time.process_time()
+        for _ in range(ITERATIONS):
+            room._touch()  # wymusza przebudowę snapshotu, jak po każdej zmianie stanu
+            await manager.broadcast_room_state(room.room_name)
+            await asyncio.sleep(0)
+        fresh_ms = (time.process_time() - start) * 1000 / ITERATIONS
+
+        per_broadcast = sum(ws.bytes_sent for ws in sockets) // (2 * ITERATIONS)
+        for queue in manager.outbound.values():
+            queue.close()
+        await asyncio.sleep(0)
+
+        print(f"{size:>7} {legacy_ms:>11.3f} {cached_ms:>10.3f} {fresh_ms:>24.3f} {per_broadcast:>16}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
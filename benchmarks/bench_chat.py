@@ -0,0 +1,65 @@
+"""
+Benchmark: czat w zatłoczonym lobby - ile ramek wysyła serwer i ile kosztuje to pętlę zdarzeń
+bez łączenia linii (okno 0 - każda linia osobno) i z oknami CHAT_DIGEST.
+
+Uruchamianie (z katalogu głównego repo):
+    python benchmarks/bench_chat.py
+"""
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_manager import RoomManager
+from pubsub import LOBBY_TOPIC
+from fakes import FakeWebSocket
+
+LOBBY_SIZE = 500
+LINES_PER_SECOND = 200  # łącznie od wszystkich piszących
+DURATION = 2.0  # sekundy
+WINDOWS = (0, 0.1, 0.25)
+
+
+async def run_window(window: float):
+    manager = RoomManager(chat_window=window)
+    sockets = []
+    for i in range(LOBBY_SIZE):
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        manager.active_connections[ws] = f"p{i}"
+        sockets.append(ws)
+    await asyncio.sleep(0.01)  # SOUND_MANIFEST z connect() nie wlicza się do wyniku
+    for ws in sockets:
+        ws.messages = ws.bytes_sent = 0
+
+    lines = int(LINES_PER_SECOND * DURATION)
+    started_cpu = time.process_time()
+    for i in range(lines):
+        if window:
+            manager.chat.post(LOBBY_TOPIC, f"p{i % LOBBY_SIZE}", f"wiadomość {i}")
+        else:
+            manager.bus.publish(LOBBY_TOPIC, {"type": "CHAT", "author": f"p{i % LOBBY_SIZE}",
+                                              "message": f"wiadomość {i}", "scope": "LOBBY"})
+        await asyncio.sleep(1 / LINES_PER_SECOND)
+    await asyncio.sleep(window + 0.05)
+    cpu_ms = (time.process_time() - started_cpu) * 1000
+
+    frames = sum(ws.messages for ws in sockets)
+    sent = sum(ws.bytes_sent for ws in sockets)
+    for queue in manager.outbound.values():
+        queue.close()
+    return lines, frames, sent, cpu_ms
+
+
+async def run():
+    print(f"lobby: {LOBBY_SIZE} graczy, {LINES_PER_SECOND} linii/s przez {DURATION:.0f} s\n")
+    print(f"{'okno [s]':>9} {'linie':>7} {'ramki':>9} {'ramki/gracz':>12} {'bajty':>11} {'CPU [ms]':>9}")
+    for window in WINDOWS:
+        lines, frames, sent, cpu_ms = await run_window(window)
+        print(f"{window:>9} {lines:>7} {frames:>9} {frames // LOBBY_SIZE:>12} {sent:>11} {cpu_ms:>9.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,455 @@
+"""
+Mikrobenchmarki gorących ścieżek silnika: GameEngine, RoomManager i MessageHandler
+na websocketach w pamięci (fakes.FakeWebSocket), dla różnych rozmiarów i liczby pokoi.
+
+Uruchamianie (z katalogu głównego repo):
+    python benchmarks/bench_engine.py                        # tabela
+    python benchmarks/bench_engine.py --json wyniki.json     # + wynik do porównań
+    python benchmarks/bench_engine.py --compare base.json    # porównanie; kod 1 przy regresji p50
+    python benchmarks/bench_engine.py --filter broadcast --quick
+
+Dla każdego scenariusza: operacje/s, p50/p99 czasu jednej operacji oraz alokacje na operację
+(`allocs` - netto przyrost bloków pamięci, `peak_kib` - szczyt tracemalloc w trakcie operacji).
+"""
+import os
+import sys
+import gc
+import json
+import time
+import asyncio
+import argparse
+import shutil
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_manager import RoomManager
+from message_handler import MessageHandler
+from game_engine import GameEngine
+from deck_registry import DeckRegistry
+from models import GameSettings
+from enums import Phase
+from fakes import FakeWebSocket
+
+ROOM_SIZES = (4, 10, 50)
+ROOM_COUNTS = (1, 10, 100)
+LOBBY_SIZES = (100, 1000)
+LOBBY_ROOM_COUNTS = (10, 1000)
+DECK_COPIES = 40  # deck "bench" = karty z decks/base.json powielone tyle razy (starcza na 50 graczy)
+DECKS = ["bench"]
+ALLOC_SAMPLES = 20
+
+
+def make_bench_decks() -> str:
+    """Katalog tymczasowy z dużym deckiem, żeby wyniki nie zależały od zawartości decks/."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, "decks", "base.json"), encoding='utf-8') as f:
+        base = json.load(f)
+    cards = {"white": [], "black": []}
+    for copy in range(DECK_COPIES):
+        for color in cards:
+            cards[color].extend(dict(card, id=f"{card['id']}_{copy}") for card in base["cards"][color])
+    directory = tempfile.mkdtemp(prefix="cah_bench_")
+    with open(os.path.join(directory, "bench.json"), 'w', encoding='utf-8') as f:
+        json.dump(dict(base, cards=cards), f, ensure_ascii=False)
+    return directory
+
+
+DECKS_DIR = make_bench_decks()
+REGISTRY = DeckRegistry(DECKS_DIR)
+
+
+def make_settings(name: str, size: int) -> GameSettings:
+    return GameSettings(name, None, size, 10, 10 ** 6, None, True, DECKS)
+
+
+def make_manager() -> RoomManager:
+    manager = RoomManager()
+    manager.deck_registry = REGISTRY
+    return manager
+
+
+def make_engine(size: int, name: str = "bench", registry: DeckRegistry = REGISTRY) -> GameEngine:
+    room = GameEngine("p0", make_settings(name, size), registry)
+    for i in range(size):
+        room.add_player(object(), f"p{i}", f"c{i}")
+    room.game_started = True
+    return room
+
+
+def ensure_cards(room: GameEngine):
+    # Długie przebiegi zużywają talie - wtedy nowa gra (poza pomiarem)
+    if len(room.black_pile) < 2 or len(room.white_pile) < len(room.players_data) * room.settings.hand_size:
+        room.reset_game()
+        room.game_started = True
+
+
+async def to_judging(room: GameEngine):
+    ensure_cards(room)
+    await room.start_round()
+    pick = room.current_black_card.pick_count
+    for ws, p in room.players_data.items():
+        if ws != room.czar_socket and ws not in room.round_submissions:
+            room.submit_cards(ws, list(p['hand'])[:pick])
+
+
+class Scenario:
+    """setup() przygotowuje stan (poza pomiarem), op() to mierzona operacja."""
+
+    def __init__(self, name: str, params: dict, setup, op, teardown=None):
+        self.name = name
+        self.params = params
+        self.setup = setup
+        self.op = op
+        self.teardown = teardown
+
+    @property
+    def key(self) -> str:
+        return self.name + "".join(f" {k}={v}" for k, v in self.params.items())
+
+
+async def drain():
+    # Pozwala taskom OutboundQueue opróżnić kolejki (poza pomiarem)
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def measure(scenario: Scenario, min_time: float, max_iterations: int) -> dict:
+    samples = []
+    gc.collect()
+    started = time.perf_counter()
+    while len(samples) < max_iterations and (time.perf_counter() - started < min_time or len(samples) < 5):
+        await scenario.setup()
+        t0 = time.perf_counter_ns()
+        await scenario.op()
+        samples.append(time.perf_counter_ns() - t0)
+        await drain()
+
+    # Osobny przebieg pod tracemalloc - jego narzut nie psuje czasów powyżej
+    allocs, peaks = [], []
+    tracemalloc.start()
+    for _ in range(min(ALLOC_SAMPLES, len(samples))):
+        await scenario.setup()
+        gc.collect()
+        tracemalloc.reset_peak()
+        before_mem = tracemalloc.get_traced_memory()[0]
+        before_blocks = sys.getallocatedblocks()
+        await scenario.op()
+        allocs.append(sys.getallocatedblocks() - before_blocks)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before_mem)
+        await drain()
+    tracemalloc.stop()
+
+    if scenario.teardown:
+        await scenario.teardown()
+
+    samples.sort()
+    total_s = sum(samples) / 1e9
+    return {
+        "name": scenario.name,
+        "params": scenario.params,
+        "iterations": len(samples),
+        "ops_per_s": round(len(samples) / total_s, 1) if total_s else None,
+        "p50_us": round(samples[len(samples) // 2] / 1000, 2),
+        "p99_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] / 1000, 2),
+        "allocs": sorted(allocs)[len(allocs) // 2],
+        "peak_kib": round(sorted(peaks)[len(peaks) // 2] / 1024, 1),
+    }
+
+
+# --- Scenariusze ---
+
+def engine_scenarios():
+    for size in ROOM_SIZES:
+        room = make_engine(size)
+
+        async def refill(room=room):
+            ensure_cards(room)
+        yield Scenario("engine.start_round", {"players": size}, refill, room.start_round)
+
+        async def submit_all(room=room):
+            pick = room.current_black_card.pick_count
+            for ws, p in list(room.players_data.items()):
+                if ws != room.czar_socket:
+                    room.submit_cards(ws, list(p['hand'])[:pick])
+        yield Scenario("engine.submit_cards (cała runda)", {"players": size}, setup_start_round(room), submit_all)
+
+        async def pick(room=room):
+            room.pick_winner(0)
+        yield Scenario("engine.pick_winner", {"players": size}, setup_judging(room), pick)
+
+        async def ready_all(room=room):
+            for ws in list(room.players_data):
+                await room.mark_player_ready(ws)
+        yield Scenario("engine.mark_player_ready (wszyscy)", {"players": size}, setup_summary(room), ready_all)
+
+
+def setup_start_round(room):
+    async def setup():
+        ensure_cards(room)
+        await room.start_round()
+    return setup
+
+
+def setup_judging(room):
+    async def setup():
+        await to_judging(room)
+    return setup
+
+
+def setup_summary(room):
+    async def setup():
+        await to_judging(room)
+        room.pick_winner(0)
+        assert room.phase == Phase.SUMMARY
+    return setup
+
+
+def deck_scenarios():
+    async def nothing():
+        pass
+
+    async def cold_json():
+        GameEngine("p0", make_settings("cold", 4), DeckRegistry(DECKS_DIR, compile_decks=False))
+    yield Scenario("deck.load (zimny rejestr, JSON)", {}, nothing, cold_json)
+
+    async def cold_compiled():
+        GameEngine("p0", make_settings("cold", 4), DeckRegistry(DECKS_DIR))
+    REGISTRY.get("bench")  # pierwsze wczytanie zapisuje skompilowany deck
+    yield Scenario("deck.load (zimny rejestr, .cahd)", {}, nothing, cold_compiled)
+
+    for count in ROOM_COUNTS:
+        async def warm(count=count):
+            for i in range(count):
+                GameEngine("p0", make_settings(f"warm{i}", 4), REGISTRY)
+        yield Scenario("deck.load (wspólny rejestr)", {"rooms": count}, nothing, warm)
+
+
+async def build_manager_room(manager: RoomManager, name: str, size: int, deltas: bool = False):
+    manager.create_room("p0", make_settings(name, size))
+    sockets = []
+    for i in range(size):
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        manager.active_connections[ws] = f"{name}_p{i}"
+        if deltas:
+            manager.delta_clients.add(ws)
+        await manager.join_room(ws, name, None, f"{name}_c{i}")
+        sockets.append(ws)
+    room = manager.rooms[name]
+    room.game_started = True
+    await to_judging(room)
+    return room, sockets
+
+
+async def close_manager(manager: RoomManager):
+    for queue in manager.outbound.values():
+        queue.close()
+    await asyncio.sleep(0)
+
+
+def manager_scenarios():
+    for size in ROOM_SIZES:
+        for deltas in (False, True):
+            manager = make_manager()
+            state = {}
+
+            async def setup(manager=manager, state=state, size=size, deltas=deltas):
+                if not state:
+                    state["room"], _ = await build_manager_room(manager, "bench", size, deltas)
+                    await manager.broadcast_room_state("bench")
+                    await drain()
+                state["room"]._touch()  # zmiana stanu -> pełna przebudowa snapshotu
+
+            async def op(manager=manager):
+                await manager.broadcast_room_state("bench")
+
+            async def teardown(manager=manager):
+                await close_manager(manager)
+
+            yield Scenario("room_manager.broadcast_room_state", {"players": size, "deltas": deltas},
+                           setup, op, teardown)
+
+    # Typowa drobna zmiana: jeden gracz klika "gotowy" (zmienia się jego am_i_ready i ready_status)
+    for size in ROOM_SIZES:
+        for deltas in (False, True):
+            manager = make_manager()
+            state = {}
+
+            async def setup(manager=manager, state=state, size=size, deltas=deltas):
+                if not state:
+                    state["room"], state["sockets"] = await build_manager_room(manager, "bench", size, deltas)
+                    await manager.broadcast_room_state("bench")
+                    await drain()
+                room, ws = state["room"], state["sockets"][0]
+                room.ready_players ^= {ws}
+                room._touch()
+
+            async def op(manager=manager):
+                await manager.broadcast_room_state("bench")
+
+            async def teardown(manager=manager):
+                await close_manager(manager)
+
+            yield Scenario("room_manager.broadcast_room_state (gotowy)", {"players": size, "deltas": deltas},
+                           setup, op, teardown)
+
+    for lobby in LOBBY_SIZES:
+        for rooms in LOBBY_ROOM_COUNTS:
+            manager = make_manager()
+            state = {}
+
+            async def setup(manager=manager, state=state, lobby=lobby, rooms=rooms):
+                if state:
+                    return
+                state["built"] = True
+                for i in range(rooms):
+                    manager.create_room("p0", make_settings(f"r{i}", 4))
+                for i in range(lobby):
+                    ws = FakeWebSocket()
+                    await manager.connect(ws)
+                    manager.active_connections[ws] = f"l{i}"
+                await drain()
+
+            async def players(manager=manager):
+                await manager.broadcast_lobby_players()
+
+            async def room_list(manager=manager):
+                await manager.broadcast_room_list()
+
+            async def teardown(manager=manager):
+                await close_manager(manager)
+
+            params = {"lobby": lobby, "rooms": rooms}
+            yield Scenario("room_manager.broadcast_lobby_players", params, setup, players)
+            yield Scenario("room_manager.broadcast_room_list", params, setup, room_list, teardown)
+
+
+def handler_scenarios():
+    for size in ROOM_SIZES:
+        manager = make_manager()
+        state = {}
+
+        async def setup(manager=manager, state=state, size=size):
+            if not state:
+                room, sockets = await build_manager_room(manager, "bench", size)
+                state["handler"] = MessageHandler(manager, sockets[0])
+
+        async def chat(state=state):
+            await state["handler"].handle({"type": "CHAT_MSG", "message": "benchmark"}, "c0")
+
+        async def teardown(manager=manager):
+            await close_manager(manager)
+
+        yield Scenario("message_handler.handle CHAT_MSG", {"players": size}, setup, chat, teardown)
+
+    for size in ROOM_SIZES:
+        manager = make_manager()
+        state = {}
+
+        async def setup(manager=manager, state=state, size=size):
+            if not state:
+                state["room"], sockets = await build_manager_room(manager, "bench", size)
+                state["handlers"] = {ws: MessageHandler(manager, ws) for ws in sockets}
+            room = state["room"]
+            if room.phase != Phase.SELECTING:
+                ensure_cards(room)
+                await room.start_round()
+            state["submitter"] = next(ws for ws in room.players_data
+                                      if ws != room.czar_socket and ws not in room.round_submissions)
+
+        async def submit(state=state):
+            room, ws = state["room"], state["submitter"]
+            cards = list(room.players_data[ws]['hand'])[:room.current_black_card.pick_count]
+            await state["handlers"][ws].handle({"type": "SUBMIT_CARDS", "cards": cards}, "c")
+
+        async def teardown(manager=manager):
+            await close_manager(manager)
+
+        yield Scenario("message_handler.handle SUBMIT_CARDS", {"players": size}, setup, submit, teardown)
+
+
+SUITES = (engine_scenarios, deck_scenarios, manager_scenarios, handler_scenarios)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline_path: str, threshold: float) -> int:
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r["key"]: r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\nPorównanie z {baseline_path} (próg {threshold:.0%}):")
+    for r in results:
+        base = baseline.get(r["key"])
+        if not base:
+            continue
+        ratio = r["p50_us"] / base["p50_us"] if base["p50_us"] else 1.0
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = "  <-- REGRESJA"
+            regressions += 1
+        print(f"  {r['key']:<70} p50 {base['p50_us']:>10.2f} -> {r['p50_us']:>10.2f} us ({ratio:5.2f}x){mark}")
+    return 1 if regressions else 0
+
+
+async def run(args) -> list:
+    results = []
+    print(f"{'scenariusz':<70} {'op/s':>10} {'p50 [us]':>10} {'p99 [us]':>10} {'allocs':>7} {'peak KiB':>9}")
+    for suite in SUITES:
+        for scenario in suite():
+            if args.filter and args.filter not in scenario.key:
+                if scenario.teardown:
+                    await scenario.teardown()
+                continue
+            r = await measure(scenario, args.min_time, args.max_iterations)
+            r["key"] = scenario.key
+            results.append(r)
+            print(f"{scenario.key:<70} {r['ops_per_s']:>10.0f} {r['p50_us']:>10.2f} {r['p99_us']:>10.2f} "
+                  f"{r['allocs']:>7} {r['peak_kib']:>9.1f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mikrobenchmarki silnika gry.")
+    parser.add_argument("--json", dest="json_path", help="zapisz wyniki (do porównań między commitami)")
+    parser.add_argument("--compare", help="plik JSON z wcześniejszego przebiegu")
+    parser.add_argument("--threshold", type=float, default=0.15, help="dopuszczalny wzrost p50 (ułamek)")
+    parser.add_argument("--filter", help="tylko scenariusze zawierające ten tekst")
+    parser.add_argument("--min-time", type=float, default=0.5, help="minimalny czas pomiaru scenariusza (s)")
+    parser.add_argument("--max-iterations", type=int, default=2000)
+    parser.add_argument("--quick", action="store_true", help="krótkie przebiegi (smoke test)")
+    args = parser.parse_args()
+    if args.quick:
+        args.min_time, args.max_iterations = 0.05, 50
+
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(DECKS_DIR, ignore_errors=True)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "results": results,
+            }, f, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        sys.exit(compare(results, args.compare, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
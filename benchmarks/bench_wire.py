@@ -0,0 +1,84 @@
+"""
+Benchmark: rozmiar i koszt kodowania wiadomości w JSON i MessagePack (podprotokoły "cah.json"/"cah.msgpack"),
+także po kompresji permessage-deflate (zlib z pełnym oknem 32 KiB i z małym oknem 1 KiB).
+
+Uruchamianie (z katalogu głównego repo):
+    python benchmarks/bench_wire.py
+
+Bez biblioteki msgpack wiersze MessagePack są pomijane.
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_manager import RoomManager
+from serialization import dumps, msgpack, packb
+from bench_broadcast import build_room
+
+ROOM_SIZES = (10, 50)
+LOBBY_ROOMS = 200
+ITERATIONS = 2000
+# wbits deflate: 15 = okno 32 KiB (domyślne), 10 = 1 KiB (mniej pamięci na połączenie, gorsza kompresja)
+WINDOW_BITS = (15, 10)
+
+
+def deflated(data: bytes, wbits: int) -> int:
+    # Jak permessage-deflate: surowy deflate, bez nagłówka zlib, zakończony flushem
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -wbits)
+    return len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+
+
+def per_call_us(func, arg) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func(arg)
+    return (time.perf_counter() - start) * 1e6 / ITERATIONS
+
+
+def formats():
+    yield "json", lambda obj: dumps(obj).encode("utf-8"), lambda data: json.loads(data)
+    if msgpack is not None:
+        yield "msgpack", packb, lambda data: msgpack.unpackb(data)
+
+
+async def sample_messages():
+    messages = []
+    for size in ROOM_SIZES:
+        manager = RoomManager()
+        room, sockets = await build_room(manager, size)
+        _, shared_state, _ = manager._get_room_snapshot(room)
+        message = {"type": "GAME_UPDATE", "v": room.state_version,
+                   **manager._player_view(room, sockets[0]), **shared_state}
+        messages.append((f"GAME_UPDATE players={size}", message))
+        for queue in manager.outbound.values():
+            queue.close()
+
+    rooms = [{"name": f"pokój {i}", "players": i % 10, "max": 10, "has_password": i % 7 == 0}
+             for i in range(LOBBY_ROOMS)]
+    players = [f"gracz_{i}" for i in range(LOBBY_ROOMS * 3)]
+    messages.append((f"ROOM_LIST rooms={LOBBY_ROOMS}", {"type": "ROOM_LIST", "rooms": rooms, "players": players}))
+    return messages
+
+
+async def run():
+    if msgpack is None:
+        print("Brak biblioteki msgpack - tylko JSON.\n")
+    window_headers = "".join(f"{f'deflate w{bits} [B]':>17}" for bits in WINDOW_BITS)
+    print(f"{'wiadomość':<28} {'format':<8} {'bajty':>8}{window_headers} {'encode [us]':>12} {'decode [us]':>12}")
+    for name, message in await sample_messages():
+        for fmt, encode, decode in formats():
+            data = encode(message)
+            sizes = "".join(f"{deflated(data, bits):>17}" for bits in WINDOW_BITS)
+            encode_us = per_call_us(encode, message)
+            decode_us = per_call_us(decode, data)
+            print(f"{name:<28} {fmt:<8} {len(data):>8}{sizes} {encode_us:>12.2f} {decode_us:>12.2f}")
+    await asyncio.sleep(0)
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,26 @@
+import json
+
+
+class FakeWebSocket:
+    """Zliczający websocket w pamięci - koduje jak Starlette, ale nic nie wysyła."""
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.messages = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data: str):
+        self.bytes_sent += len(data)
+        self.messages += 1
+
+    async def send_bytes(self, data: bytes):
+        self.bytes_sent += len(data)
+        self.messages += 1
+
+    async def send_json(self, data):
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+    async def close(self, code: int = 1000):
+        pass
@@ -5,6 +5,16 @@ import random
 import logging
 import time
 
+# Czasy "namysłu" bota (sekundy, rozkład jednostajny) - loadtest.py podmienia je przez think()
+THINK_TIMES = {
+    'connect': (1.0, 5.0),   # opóźnienie pierwszego połączenia
+    'submit': (2, 9),        # wybór kart
+    'pick': (3, 8),          # wybór zwycięzcy (car)
+    'ready': (2, 6),         # "gotowy" w podsumowaniu
+    'leave': (5, 12),        # wyjście po końcu gry
+    'rest': (60.0, 65.0),    # przerwa po wyjściu z pokoju
+}
+
 
 class GameBot:
     def __init__(self, nickname, server_url):
@@ -19,6 +29,10 @@ class GameBot:
 
         self.next_search_timestamp = 0
 
+        self.tick = 1.0  # co ile sekund bot patrzy na stan gry
+        self.search_interval = 3.0
+        self.reconnect_delay = 5
+
         self.logger = logging.getLogger(f"Bot_{nickname}")
         handler = logging.StreamHandler()
         formatter = logging.Formatter(f"%(asctime)s [{self.nickname}] %(message)s", datefmt="%H:%M:%S")
@@ -28,8 +42,17 @@ class GameBot:
         self.logger.setLevel(logging.INFO)
         self.logger.propagate = False
 
+    def think_time(self, action: str) -> float:
+        low, high = THINK_TIMES[action]
+        return random.uniform(low, high)
+
+    async def think(self, action: str) -> float:
+        delay = self.think_time(action)
+        await asyncio.sleep(delay)
+        return delay
+
     async def connect(self):
-        await asyncio.sleep(random.uniform(1.0, 5.0))
+        await self.think('connect')
 
         while True:
             try:
@@ -50,14 +73,14 @@ class GameBot:
                         await self.handle_message(message)
 
             except (websockets.ConnectionClosed, ConnectionRefusedError):
-                self.logger.warning("Brak połączenia. Ponawiam za 5s...")
+                self.logger.warning(f"Brak połączenia. Ponawiam za {self.reconnect_delay}s...")
             except Exception as e:
                 self.logger.error(f"Krytyczny błąd: {e}")
 
             if self.room_search_task: self.room_search_task.cancel()
             if self.game_loop_task: self.game_loop_task.cancel()
             self.current_room = None
-            await asyncio.sleep(5)
+            await asyncio.sleep(self.reconnect_delay)
 
     async def send_json(self, data):
         if self.ws:
@@ -83,7 +106,7 @@ class GameBot:
                 self.latest_state = data
 
             elif mtype == 'LEFT_ROOM':
-                cooldown = 60.0 + random.uniform(0, 5.0)
+                cooldown = self.think_time('rest')
                 self.next_search_timestamp = time.time() + cooldown
 
                 self.logger.info(f"Opuszczono pokój. Odpoczywam {cooldown:.1f}s zanim poszukam nowego...")
@@ -106,7 +129,7 @@ class GameBot:
                 else:
                     pass
 
-            await asyncio.sleep(3.0)
+            await asyncio.sleep(self.search_interval)
 
     async def try_join_room(self, rooms):
         available = [r for r in rooms if not r['has_password'] and r['players'] < r['max']]
@@ -118,7 +141,7 @@ class GameBot:
 
     async def game_logic_loop(self):
         while True:
-            await asyncio.sleep(1.0)
+            await asyncio.sleep(self.tick)
             if not self.latest_state or self.is_acting: continue
 
             try:
@@ -131,7 +154,7 @@ class GameBot:
                     self.is_acting = True
                     try:
                         winner = state.get('winner', '???')
-                        delay = random.uniform(5, 12)
+                        delay = self.think_time('leave')
                         self.logger.info(f"Koniec gry! Wygrał {winner}. Wychodzę za {delay:.1f}s")
                         await asyncio.sleep(delay)
                         await self.send_json({"type": "LEAVE_ROOM"})
@@ -142,7 +165,7 @@ class GameBot:
                 if phase == "SUMMARY" and not am_i_ready:
                     self.is_acting = True
                     try:
-                        await asyncio.sleep(random.uniform(2, 6))
+                        await self.think('ready')
                         if self.latest_state.get('phase') == "SUMMARY":
                             await self.send_json({"type": "PLAYER_READY"})
                             self.logger.info("Ready!")
@@ -155,7 +178,7 @@ class GameBot:
                     if subs and not state.get('winner'):
                         self.is_acting = True
                         try:
-                            await asyncio.sleep(random.uniform(3, 8))
+                            await self.think('pick')
                             fresh_subs = self.latest_state.get('submissions', [])
                             if fresh_subs:
                                 choice = random.choice(fresh_subs)
@@ -173,7 +196,7 @@ class GameBot:
                             pick = black_card.get('pick', 1)
                             hand = state.get('hand', [])
                             if len(hand) >= pick:
-                                await asyncio.sleep(random.uniform(2, 9))
+                                await self.think('submit')
                                 fresh_hand = self.latest_state.get('hand', [])
                                 if len(fresh_hand) >= pick:
                                     chosen = random.sample(fresh_hand, pick)
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BROADCAST_WINDOW = 0.03  # sekundy
+
+
+class BroadcastScheduler:
+    """
+    Zbiera prośby o broadcast (pokój / lobby) i wysyła je najwyżej raz na okno czasowe.
+    Kilka zmian w jednym oknie = jedna wiadomość do każdego odbiorcy.
+    """
+
+    def __init__(self, room_manager, window: float = DEFAULT_BROADCAST_WINDOW):
+        self.room_manager = room_manager
+        self.window = window
+
+        self._rooms = set()
+        self._room_counts = set()
+        self._lobby_players = False
+        self._room_list = False
+        self._flush_task = None
+
+        self.requested = 0
+        self.sent = 0
+
+    @property
+    def saved(self) -> int:
+        return self.requested - self.sent
+
+    def room_state(self, room_name: str):
+        self._rooms.add(room_name)
+        self._mark()
+
+    def room_count(self, room_name: str):
+        self._room_counts.add(room_name)
+        self._mark()
+
+    def lobby_players(self):
+        self._lobby_players = True
+        self._mark()
+
+    def room_list(self):
+        self._room_list = True
+        self._mark()
+
+    def stats(self) -> dict:
+        return {"requested": self.requested, "sent": self.sent, "saved": self.saved}
+
+    def _mark(self):
+        self.requested += 1
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        rooms, self._rooms = self._rooms, set()
+        room_counts, self._room_counts = self._room_counts, set()
+        lobby_players, self._lobby_players = self._lobby_players, False
+        room_list, self._room_list = self._room_list, False
+
+        rm = self.room_manager
+        for room_name in rooms:
+            await rm.broadcast_room_state(room_name)
+            self.sent += 1
+
+        # ROOM_LIST niesie i pokoje, i graczy lobby - zastępuje wszystkie mniejsze aktualizacje lobby
+        if room_list or (lobby_players and room_counts) or len(room_counts) > 1:
+            await rm.broadcast_room_list()
+            self.sent += 1
+        elif lobby_players:
+            await rm.broadcast_lobby_players()
+            self.sent += 1
+        elif room_counts:
+            await rm.broadcast_room_count(room_counts.pop())
+            self.sent += 1
+
+        logger.debug(f"Broadcast flush: {len(rooms)} pokoi, zaoszczędzono łącznie {self.saved} broadcastów.")
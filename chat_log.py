@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, List, Optional
+
+import metrics
+from pubsub import LOBBY_TOPIC
+
+logger = logging.getLogger(__name__)
+
+CHAT_HISTORY_SIZE = 50  # linii na temat (pokój / lobby) - tyle dostaje dołączający
+DEFAULT_CHAT_WINDOW = 0.25  # sekundy
+CHAT_MAX_CHARS = 500  # dłuższe wiadomości są ucinane (historia ma ograniczony rozmiar także w bajtach)
+
+
+class ChatLog:
+    """
+    Czat pokoi i lobby: ostatnie linie każdego tematu w buforze cyklicznym (historia dla dołączających)
+    i wysyłka z łączeniem. Pierwsza linia w cichym temacie wychodzi od razu jako CHAT; kolejne w ciągu
+    okna czekają i idą razem jednym CHAT_DIGEST - najwyżej jedna ramka na temat na okno.
+    """
+
+    def __init__(self, bus, window: float = DEFAULT_CHAT_WINDOW, history_size: int = CHAT_HISTORY_SIZE):
+        self.bus = bus
+        self.window = window
+        self.history_size = history_size
+        self._history: Dict[str, deque] = {}  # temat -> ostatnie linie
+        self._pending: Dict[str, List[dict]] = {}  # temat z otwartym oknem -> linie czekające na digest
+        self._flush_task = None
+
+    def post(self, topic: str, author: Optional[str], message) -> bool:
+        if not isinstance(message, str) or not message.strip():
+            return False
+        line = {"author": author, "message": message[:CHAT_MAX_CHARS]}
+        history = self._history.get(topic)
+        if history is None:
+            history = self._history[topic] = deque(maxlen=self.history_size)
+        history.append(line)
+        metrics.chat_lines.inc(_scope(topic))
+
+        pending = self._pending.get(topic)
+        if pending is None:
+            self._pending[topic] = []
+            self._publish(topic, {"type": "CHAT", **line})
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_later())
+        else:
+            pending.append(line)
+        return True
+
+    def history_message(self, topic: str) -> dict:
+        return self._with_scope(topic, {"type": "CHAT_HISTORY", "lines": list(self._history.get(topic, ()))})
+
+    def forget(self, topic: str):
+        self._history.pop(topic, None)
+        self._pending.pop(topic, None)
+
+    async def _flush_later(self):
+        try:
+            while self._pending:
+                await asyncio.sleep(self.window)
+                self.flush()
+        finally:
+            self._flush_task = None
+
+    def flush(self):
+        """Wysyła zebrane linie; temat bez nowych linii zamyka okno (następna linia znów pójdzie od razu)."""
+        pending, self._pending = self._pending, {}
+        for topic, lines in pending.items():
+            if not lines:
+                continue
+            self._pending[topic] = []
+            if len(lines) == 1:
+                self._publish(topic, {"type": "CHAT", **lines[0]})
+            else:
+                self._publish(topic, {"type": "CHAT_DIGEST", "lines": lines})
+
+    def _publish(self, topic: str, message: dict):
+        metrics.chat_frames.inc(_scope(topic))
+        self.bus.publish(topic, self._with_scope(topic, message))
+
+    @staticmethod
+    def _with_scope(topic: str, message: dict) -> dict:
+        if topic == LOBBY_TOPIC:
+            message["scope"] = "LOBBY"
+        return message
+
+
+def _scope(topic: str) -> str:
+    return "lobby" if topic == LOBBY_TOPIC else "room"
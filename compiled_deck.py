@@ -0,0 +1,218 @@
+"""
+Skompilowany format decków (`.cahd`): tablica napisów bez powtórzeń + rekordy kart o stałym rozmiarze.
+
+Plik jest otwierany przez mmap, więc procesy shardów współdzielą te same strony z cache systemu
+(zero kopiowania), a otwarcie decku to odczyt nagłówka. Karty (WhiteCard/BlackCard) powstają
+dopiero przy pierwszym użyciu danego indeksu.
+
+Kompilacja wszystkich decków z katalogu (normalnie rejestr robi to sam przy pierwszym wczytaniu):
+    python compiled_deck.py [katalog_decków]
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+from typing import Callable, List, Optional, Sequence
+
+from models import WhiteCard, BlackCard, FORM_ORDER
+
+MAGIC = b"CAHD"
+FORMAT_VERSION = 1
+EXTENSION = ".cahd"
+
+# magic, wersja, sha1 treści źródeł, sha1 sygnatury źródeł (ścieżka, mtime, rozmiar), napisy, białe, czarne
+HEADER = struct.Struct("<4sI20s20sIII")
+OFFSET = struct.Struct("<I")
+WHITE_RECORD = struct.Struct(f"<{len(FORM_ORDER)}II")  # formy, source_id
+BLACK_RECORD = struct.Struct("<III")  # raw_text, pick_count, source_id
+NO_STRING = 0xFFFFFFFF
+
+
+class CardTable(Sequence):
+    """
+    Karty decku po indeksie. Dla skompilowanych decków karta jest budowana przy pierwszym odczycie
+    i zapamiętywana - ten sam obiekt dla wszystkich pokoi w procesie (jak w sparsowanym decku).
+    """
+
+    def __init__(self, count: int, build: Optional[Callable[[int], object]] = None, cards=None):
+        self._cards = list(cards) if cards is not None else [None] * count
+        self._build = build
+        self._index = {id(c): i for i, c in enumerate(self._cards) if c is not None}
+
+    def __len__(self):
+        return len(self._cards)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self._cards)))]
+        card = self._cards[i]
+        if card is None:
+            i = range(len(self._cards))[i]
+            card = self._cards[i] = self._build(i)
+            self._index[id(card)] = i
+        return card
+
+    def index_of(self, card) -> Optional[int]:
+        return self._index.get(id(card))
+
+    def loaded(self) -> int:
+        """Ile kart zostało już zbudowanych."""
+        return len(self._index)
+
+
+class CardChain(Sequence):
+    """Talia master pokoju: tablice kart z kolejnych decków sklejone bez kopiowania."""
+
+    def __init__(self):
+        self._parts: List[tuple] = []  # (offset, CardTable)
+        self._length = 0
+
+    def extend(self, table: CardTable):
+        self._parts.append((self._length, table))
+        self._length += len(table)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._length))]
+        if i < 0:
+            i += self._length
+        for offset, table in reversed(self._parts):
+            if i >= offset:
+                if i - offset >= len(table):
+                    break
+                return table[i - offset]
+        raise IndexError(i)
+
+    def index_of(self, card) -> Optional[int]:
+        """Indeks karty w masterze (kartę musiał wcześniej zwrócić __getitem__)."""
+        for offset, table in self._parts:
+            i = table.index_of(card)
+            if i is not None:
+                return offset + i
+        return None
+
+
+def _source_id(value) -> Optional[str]:
+    # source_id bywa liczbą albo napisem - trzymamy go jako JSON, żeby wrócił w tym samym typie
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+
+def compile_deck(white: Sequence[WhiteCard], black: Sequence[BlackCard], content_hash: str, signature: tuple) -> bytes:
+    """Koduje sparsowane karty do formatu `.cahd`."""
+    strings: List[bytes] = []
+    string_ids = {}
+
+    def string_id(text: Optional[str]) -> int:
+        if text is None:
+            return NO_STRING
+        sid = string_ids.get(text)
+        if sid is None:
+            sid = string_ids[text] = len(strings)
+            strings.append(text.encode("utf-8"))
+        return sid
+
+    white_records = []
+    for card in white:
+        forms = [string_id(card.get_form(i)) for i in range(len(FORM_ORDER))]
+        white_records.append(WHITE_RECORD.pack(*forms, string_id(_source_id(card.source_id))))
+    black_records = [BLACK_RECORD.pack(string_id(card.raw_text), card.pick_count, string_id(_source_id(card.source_id)))
+                     for card in black]
+
+    offsets, position = [], 0
+    for data in strings:
+        offsets.append(OFFSET.pack(position))
+        position += len(data)
+    offsets.append(OFFSET.pack(position))
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, bytes.fromhex(content_hash), signature_hash(signature),
+                         len(strings), len(white_records), len(black_records))
+    return b"".join([header, *offsets, *white_records, *black_records, *strings])
+
+
+def signature_hash(signature: tuple) -> bytes:
+    return hashlib.sha1(repr(signature).encode("utf-8")).digest()
+
+
+def write_compiled(path: str, data: bytes):
+    """Zapis atomowy: inne procesy widzą stary albo nowy plik, nigdy połowę."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class CompiledDeckFile:
+    """Otwarty (zmapowany) plik `.cahd`. Nie kopiuje danych - napisy są dekodowane przy budowaniu karty."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, content_hash, self.signature_hash,
+             self.string_count, self.white_count, self.black_count) = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"{path}: nieznany format decku")
+            self.content_hash = content_hash.hex()
+            self._offsets = HEADER.size
+            self._white = self._offsets + OFFSET.size * (self.string_count + 1)
+            self._black = self._white + WHITE_RECORD.size * self.white_count
+            self._strings = self._black + BLACK_RECORD.size * self.black_count
+            if self._strings + self._string_offset(self.string_count) != len(self._map):
+                raise ValueError(f"{path}: uszkodzony plik decku")
+        except (ValueError, struct.error):
+            self._map.close()
+            raise
+        self.size = len(self._map)
+
+    def _string_offset(self, sid: int) -> int:
+        return OFFSET.unpack_from(self._map, self._offsets + OFFSET.size * sid)[0]
+
+    def string(self, sid: int) -> Optional[str]:
+        if sid == NO_STRING:
+            return None
+        start = self._strings + self._string_offset(sid)
+        end = self._strings + self._string_offset(sid + 1)
+        return self._map[start:end].decode("utf-8")
+
+    def _source_id(self, sid: int):
+        text = self.string(sid)
+        return None if text is None else json.loads(text)
+
+    def white_card(self, i: int) -> WhiteCard:
+        *forms, source_id = WHITE_RECORD.unpack_from(self._map, self._white + WHITE_RECORD.size * i)
+        card = WhiteCard.from_json({"forms": [self.string(sid) for sid in forms]})
+        card.source_id = self._source_id(source_id)
+        return card
+
+    def black_card(self, i: int) -> BlackCard:
+        raw_text, pick_count, source_id = BLACK_RECORD.unpack_from(self._map, self._black + BLACK_RECORD.size * i)
+        card = BlackCard.from_json({"template": self.string(raw_text)})
+        card.pick_count = pick_count
+        card.source_id = self._source_id(source_id)
+        return card
+
+    def white_table(self) -> CardTable:
+        return CardTable(self.white_count, self.white_card)
+
+    def black_table(self) -> CardTable:
+        return CardTable(self.black_count, self.black_card)
+
+
+def compiled_path(compiled_dir: str, deck_name: str) -> str:
+    return os.path.join(compiled_dir, f"{deck_name}{EXTENSION}")
+
+
+if __name__ == "__main__":
+    from deck_registry import DeckRegistry, DECKS_DIR
+
+    registry = DeckRegistry(sys.argv[1] if len(sys.argv) > 1 else DECKS_DIR)
+    for deck_name in sorted(registry.deck_names()):
+        deck = registry.get(deck_name)
+        print(f"{deck_name}: {len(deck.white)} w, {len(deck.black)} b"
+              f" -> {compiled_path(registry.compiled_dir, deck_name)}")
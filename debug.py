@@ -41,5 +41,7 @@ def check_deck(filename):
 
 
 if __name__ == "__main__":
-    check_deck("decks/base.white")
-    check_deck("decks/base.black")
\ No newline at end of file
+    # Pełne sprawdzenie wszystkich decków (JSON i legacy) - patrz deck_preflight.py
+    import sys
+    from deck_preflight import main
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
@@ -0,0 +1,303 @@
+"""
+Sprawdzanie decków przed startem serwera: wszystkie pliki `.json` i legacy `.white`/`.black`
+z katalogu decków, równolegle w puli procesów. Wynik jest zapamiętywany po hashu treści pliku,
+więc przy kolejnym starcie sprawdzane są tylko zmienione decki.
+
+Z linii poleceń (kod wyjścia 1, jeśli jakiś deck ma błędy):
+    python deck_preflight.py [katalog_decków] [--no-cache] [--workers N]
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple
+
+from models import FORM_ORDER, FORM_INDEX
+from deck_registry import DECKS_DIR, COMPILED_SUBDIR, DECK_EXTENSIONS
+from compiled_deck import write_compiled
+
+logger = logging.getLogger(__name__)
+
+# Zmienić przy każdej zmianie reguł - stary cache przestaje wtedy pasować
+PREFLIGHT_VERSION = 1
+CACHE_FILE = "preflight.json"
+# Poniżej tylu plików do sprawdzenia start puli procesów kosztuje więcej niż samo sprawdzanie
+POOL_MIN_FILES = 16
+
+ERROR = "error"
+WARNING = "warning"
+
+TAG_RE = re.compile(r'<([A-Z]+)>')  # jak w BlackCard
+
+
+class Problem(NamedTuple):
+    severity: str  # ERROR / WARNING
+    where: str  # np. "white[3] (w0004)"
+    message: str
+
+    def __str__(self):
+        return f"{self.where}: {self.message}"
+
+
+class DeckPreflightError(Exception):
+    """Co najmniej jeden deck ma błędy - serwer nie startuje (CAH_DECK_PREFLIGHT=strict)."""
+
+    def __init__(self, results: Dict[str, List[Problem]]):
+        self.results = results
+        super().__init__(format_report(results, errors_only=True))
+
+
+def _card_where(kind: str, index: int, card) -> str:
+    card_id = card.get('id') if isinstance(card, dict) else None
+    return f"{kind}[{index}]" + (f" ({card_id})" if card_id is not None else "")
+
+
+def _check_template(where: str, template: str, problems: List[Problem]) -> list:
+    tags = TAG_RE.findall(template)
+    for tag in tags:
+        if f"<{tag}>" not in FORM_INDEX:
+            problems.append(Problem(ERROR, where, f"nieznany przypadek <{tag}> (dozwolone: {', '.join(FORM_ORDER)})"))
+    return tags
+
+
+def _check_white(where: str, card, problems: List[Problem]):
+    forms = card.get('forms') if isinstance(card, dict) else None
+    if isinstance(forms, dict):
+        missing = [k for k in FORM_ORDER if not isinstance(forms.get(k), str) or not forms[k].strip()]
+        if len(missing) == len(FORM_ORDER):
+            problems.append(Problem(ERROR, where, "karta bez tekstu"))
+        elif missing:
+            problems.append(Problem(ERROR, where, f"brak form: {', '.join(missing)}"))
+        unknown = sorted(set(forms) - set(FORM_ORDER))
+        if unknown:
+            problems.append(Problem(WARNING, where, f"nieznane formy (ignorowane): {', '.join(unknown)}"))
+    elif isinstance(forms, list):
+        if len(forms) not in (1, len(FORM_ORDER)):
+            problems.append(Problem(ERROR, where, f"{len(forms)} form zamiast 1 lub {len(FORM_ORDER)}"))
+        elif not all(isinstance(f, str) and f.strip() for f in forms):
+            problems.append(Problem(ERROR, where, "puste formy"))
+    else:
+        problems.append(Problem(ERROR, where, "brak pola 'forms'"))
+
+
+def _check_black(where: str, card, problems: List[Problem]):
+    if not isinstance(card, dict):
+        problems.append(Problem(ERROR, where, "karta nie jest obiektem"))
+        return
+    template = card.get('template') or card.get('raw_text')
+    if not isinstance(template, str) or not template.strip():
+        problems.append(Problem(ERROR, where, "brak pola 'template'"))
+        return
+
+    tags = _check_template(where, template, problems)
+    slots = card.get('slots')
+    if slots is not None:
+        if not isinstance(slots, list):
+            problems.append(Problem(ERROR, where, "'slots' nie jest listą"))
+            slots = None
+        elif slots != tags:
+            problems.append(Problem(ERROR, where, f"'slots' {slots} nie zgadzają się z szablonem {tags}"))
+
+    # Silnik liczy pick z 'slots' (albo z placeholderów szablonu); 'pick' w pliku musi się z tym zgadzać
+    expected_pick = max(1, len(slots) if slots else len(tags))
+    pick = card.get('pick')
+    if pick is not None and pick != expected_pick:
+        problems.append(Problem(ERROR, where, f"'pick' = {pick}, a karta ma {expected_pick} slot(y)"))
+
+
+def check_card(kind: str, index: int, card, seen_ids: set) -> List[Problem]:
+    """Problemy jednej karty z `cards.white` / `cards.black` (też dla uploadu strumieniowego, karta po karcie)."""
+    problems: List[Problem] = []
+    where = _card_where(kind, index, card)
+    (_check_white if kind == "white" else _check_black)(where, card, problems)
+    card_id = card.get('id') if isinstance(card, dict) else None
+    if card_id is not None:
+        if card_id in seen_ids:
+            problems.append(Problem(WARNING, where, f"powtórzone id {card_id!r}"))
+        seen_ids.add(card_id)
+    return problems
+
+
+def _check_json(data: bytes) -> List[Problem]:
+    problems: List[Problem] = []
+    try:
+        deck = json.loads(data.decode('utf-8'))
+    except UnicodeDecodeError:
+        return [Problem(ERROR, "plik", "kodowanie inne niż UTF-8")]
+    except ValueError as e:
+        return [Problem(ERROR, "plik", f"niepoprawny JSON: {e}")]
+
+    cards = deck.get('cards') if isinstance(deck, dict) else None
+    if not isinstance(cards, dict):
+        return [Problem(ERROR, "plik", "brak obiektu 'cards'")]
+
+    seen_ids = set()
+    for kind in ("white", "black"):
+        items = cards.get(kind, [])
+        if not isinstance(items, list):
+            problems.append(Problem(ERROR, f"cards.{kind}", "nie jest listą"))
+            continue
+        for i, card in enumerate(items):
+            problems.extend(check_card(kind, i, card, seen_ids))
+
+    if not cards.get('white') and not cards.get('black'):
+        problems.append(Problem(WARNING, "plik", "deck nie ma kart"))
+    return problems
+
+
+def _check_lines(data: bytes, black: bool) -> List[Problem]:
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        return [Problem(ERROR, "plik", "kodowanie inne niż UTF-8")]
+
+    problems: List[Problem] = []
+    for line_num, line in enumerate(text.splitlines(), 1):
+        raw = line.strip()
+        if not raw:
+            continue
+        where = f"linia {line_num}"
+        if black:
+            _check_template(where, raw, problems)
+            continue
+        parts = [p.strip() for p in raw.split('|')]
+        if len(parts) not in (1, len(FORM_ORDER)):
+            problems.append(Problem(ERROR, where, f"{len(parts)} form zamiast 1 lub {len(FORM_ORDER)}"))
+        elif not all(parts):
+            problems.append(Problem(ERROR, where, "puste formy"))
+    return problems
+
+
+def check_deck_data(path: str, data: bytes) -> List[Problem]:
+    """Problemy jednego pliku decku (bez czytania z dysku - do testów i puli procesów)."""
+    if path.endswith(".json"):
+        return _check_json(data)
+    return _check_lines(data, black=path.endswith(".black"))
+
+
+def _check_file(path: str) -> List[tuple]:
+    # Uruchamiane w puli procesów - zwraca zwykłe krotki
+    with open(path, 'rb') as f:
+        return [tuple(p) for p in check_deck_data(path, f.read())]
+
+
+def _load_cache(cache_path: str) -> dict:
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != PREFLIGHT_VERSION:
+        return {}
+    return cache.get("results", {})
+
+
+def _save_cache(cache_path: str, results: dict):
+    data = json.dumps({"version": PREFLIGHT_VERSION, "results": results}, ensure_ascii=False)
+    try:
+        write_compiled(cache_path, data.encode('utf-8'))
+    except OSError as e:
+        logger.warning(f"Preflight decków: nie udało się zapisać cache: {e}")
+
+
+def deck_files(decks_dir: str) -> List[str]:
+    try:
+        names = sorted(os.listdir(decks_dir))
+    except OSError:
+        return []
+    return [os.path.join(decks_dir, n) for n in names if n.endswith(DECK_EXTENSIONS)]
+
+
+def preflight(decks_dir: str = DECKS_DIR, use_cache: bool = True, workers: int = None) -> Dict[str, List[Problem]]:
+    """
+    Sprawdza wszystkie decki z katalogu. Zwraca {ścieżka: problemy} dla każdego pliku.
+    Pliki o treści już sprawdzonej (ten sam hash) biorą wynik z cache.
+    """
+    started = time.perf_counter()
+    cache_path = os.path.join(decks_dir, COMPILED_SUBDIR, CACHE_FILE)
+    cache = _load_cache(cache_path) if use_cache else {}
+
+    hashes, results, pending = {}, {}, []
+    for path in deck_files(decks_dir):
+        try:
+            with open(path, 'rb') as f:
+                content_hash = hashlib.sha1(f.read()).hexdigest()
+        except OSError as e:
+            results[path] = [Problem(ERROR, "plik", f"nie da się odczytać: {e}")]
+            continue
+        hashes[path] = content_hash
+        if content_hash in cache:
+            results[path] = [Problem(*p) for p in cache[content_hash]]
+        else:
+            pending.append(path)
+
+    workers = workers or os.cpu_count() or 1
+    if len(pending) >= POOL_MIN_FILES and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            checked = pool.map(_check_file, pending, chunksize=max(1, len(pending) // (4 * workers)))
+            for path, problems in zip(pending, checked):
+                results[path] = [Problem(*p) for p in problems]
+    else:
+        for path in pending:
+            results[path] = [Problem(*p) for p in _check_file(path)]
+
+    if use_cache and pending:
+        _save_cache(cache_path, {hashes[p]: [list(pr) for pr in results[p]] for p in hashes})
+
+    logger.info(f"Preflight decków: {len(results)} plików ({len(pending)} sprawdzonych, reszta z cache) "
+                f"w {(time.perf_counter() - started) * 1000:.0f} ms.")
+    return results
+
+
+def has_errors(problems: List[Problem]) -> bool:
+    return any(p.severity == ERROR for p in problems)
+
+
+def format_report(results: Dict[str, List[Problem]], errors_only: bool = False) -> str:
+    lines = []
+    for path, problems in sorted(results.items()):
+        shown = [p for p in problems if p.severity == ERROR or not errors_only]
+        if not shown:
+            continue
+        lines.append(f"{path}:")
+        lines.extend(f"  {'❌' if p.severity == ERROR else '⚠️'} {p}" for p in shown)
+    return "\n".join(lines)
+
+
+def check_decks(decks_dir: str = DECKS_DIR, strict: bool = True) -> Dict[str, List[Problem]]:
+    """Preflight przy starcie serwera: loguje problemy; w trybie strict błędy zatrzymują start."""
+    results = preflight(decks_dir)
+    report = format_report(results)
+    if report:
+        logger.warning(f"Preflight decków - problemy:\n{report}")
+    if strict and any(has_errors(p) for p in results.values()):
+        raise DeckPreflightError(results)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Sprawdza decki (JSON i legacy .white/.black).")
+    parser.add_argument("decks_dir", nargs="?", default=DECKS_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="sprawdź wszystko, bez cache wyników")
+    parser.add_argument("--workers", type=int, default=None, help="liczba procesów (domyślnie liczba rdzeni)")
+    args = parser.parse_args(argv)
+
+    results = preflight(args.decks_dir, use_cache=not args.no_cache, workers=args.workers)
+    for path in sorted(results):
+        if not results[path]:
+            print(f"✅ {path}")
+    report = format_report(results)
+    if report:
+        print(report)
+    errors = sum(has_errors(p) for p in results.values())
+    print(f"\n{len(results)} plików, {errors} z błędami.")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+import os
+import json
+import hashlib
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import metrics
+from models import WhiteCard, BlackCard
+from compiled_deck import CardTable, CompiledDeckFile, compile_deck, compiled_path, write_compiled, signature_hash
+
+logger = logging.getLogger(__name__)
+
+DECKS_DIR = "decks"
+# Skompilowane decki (.cahd, mmap) - podkatalog ukryty, żeby nie trafiał na listę decków
+COMPILED_SUBDIR = ".compiled"
+DECK_EXTENSIONS = (".json", ".white", ".black")
+# Przybliżony budżet pamięci na sparsowane decki (w bajtach).
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+
+class Deck:
+    """Deck: niemutowalne szablony kart współdzielone przez wszystkie pokoje."""
+
+    def __init__(self, name: str, white: CardTable, black: CardTable,
+                 source_paths: Tuple[str, ...], signature: tuple, content_hash: str,
+                 size_estimate: Optional[int] = None):
+        self.name = name
+        self.white = white
+        self.black = black
+        self.source_paths = source_paths
+        self.signature = signature  # (path, mtime_ns, size) dla każdego pliku źródłowego
+        self.content_hash = content_hash
+        self.size_estimate = self._estimate_size() if size_estimate is None else size_estimate
+
+    def _estimate_size(self) -> int:
+        size = 0
+        for c in self.white:
+            size += 200 + sum(len(f) * 2 for f in c.forms)
+        for c in self.black:
+            size += 200 + len(c.raw_text) * 4
+        return size
+
+
+class DeckRegistry:
+    """
+    Procesowy rejestr decków. Każdy plik jest parsowany raz, a wynik jest współdzielony
+    przez wszystkie pokoje. Wpis jest unieważniany, gdy zmieni się mtime/rozmiar pliku
+    (a potem jego hash), a najdawniej używane decki są wyrzucane po przekroczeniu budżetu.
+
+    Sparsowany deck jest zapisywany w formacie skompilowanym (compiled_deck.py); kolejne procesy
+    i restarty otwierają go przez mmap zamiast parsować JSON-a.
+    """
+
+    def __init__(self, decks_dir: str = DECKS_DIR, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 compile_decks: bool = True):
+        self.decks_dir = decks_dir
+        self.memory_budget = memory_budget
+        self.compile_decks = compile_decks
+        self.compiled_dir = os.path.join(decks_dir, COMPILED_SUBDIR)
+        self._decks: "OrderedDict[str, Deck]" = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+
+    def get(self, deck_name: str) -> Optional[Deck]:
+        paths = self._source_paths(deck_name)
+        if not paths:
+            return None
+
+        signature = self._signature(paths)
+        with self._lock:
+            deck = self._decks.get(deck_name)
+            if deck and deck.signature == signature:
+                self._decks.move_to_end(deck_name)
+                return deck
+
+        started = time.perf_counter()
+        # Skompilowany plik z tą samą sygnaturą źródeł - nie trzeba nawet czytać JSON-a
+        deck = self._open_compiled(deck_name, paths, signature)
+        if deck is None:
+            raw = self._read_sources(paths)
+            content_hash = hashlib.sha1(b"\0".join(raw)).hexdigest()
+
+            with self._lock:
+                deck = self._decks.get(deck_name)
+                if deck and deck.content_hash == content_hash:
+                    # Plik został "dotknięty", ale treść się nie zmieniła - nie parsujemy ponownie.
+                    deck.signature = signature
+                    self._decks.move_to_end(deck_name)
+                    return deck
+
+            deck = self._open_compiled(deck_name, paths, signature, content_hash)
+            if deck is None:
+                deck = self._compile(self._parse(deck_name, paths, raw, signature, content_hash))
+        metrics.deck_load_seconds.observe(time.perf_counter() - started)
+
+        with self._lock:
+            old = self._decks.pop(deck_name, None)
+            if old:
+                self._memory_used -= old.size_estimate
+            self._decks[deck_name] = deck
+            self._memory_used += deck.size_estimate
+            self._evict()
+        return deck
+
+    def invalidate(self, deck_name: Optional[str] = None):
+        with self._lock:
+            if deck_name is None:
+                self._decks.clear()
+                self._memory_used = 0
+            else:
+                old = self._decks.pop(deck_name, None)
+                if old:
+                    self._memory_used -= old.size_estimate
+
+    def memory_used(self) -> int:
+        return self._memory_used
+
+    def deck_names(self) -> set:
+        try:
+            files = os.listdir(self.decks_dir)
+        except OSError:
+            return set()
+        return {os.path.splitext(f)[0] for f in files if f.endswith(DECK_EXTENSIONS)}
+
+    def _evict(self):
+        # Zawsze zostawiamy co najmniej ostatnio użyty deck.
+        while self._memory_used > self.memory_budget and len(self._decks) > 1:
+            name, deck = self._decks.popitem(last=False)
+            self._memory_used -= deck.size_estimate
+            logger.info(f"Rejestr decków: wyrzucono '{name}' (budżet pamięci).")
+
+    def _source_paths(self, deck_name: str) -> Tuple[str, ...]:
+        json_path = os.path.join(self.decks_dir, f"{deck_name}.json")
+        if os.path.exists(json_path):
+            return (json_path,)
+        legacy = (os.path.join(self.decks_dir, f"{deck_name}.white"),
+                  os.path.join(self.decks_dir, f"{deck_name}.black"))
+        return tuple(p for p in legacy if os.path.exists(p))
+
+    @staticmethod
+    def _signature(paths) -> tuple:
+        sig = []
+        for p in paths:
+            try:
+                st = os.stat(p)
+                sig.append((p, st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append((p, None, None))
+        return tuple(sig)
+
+    @staticmethod
+    def _read_sources(paths) -> list:
+        raw = []
+        for p in paths:
+            try:
+                with open(p, 'rb') as f:
+                    raw.append(f.read())
+            except OSError:
+                raw.append(b"")
+        return raw
+
+    def _open_compiled(self, deck_name, paths, signature, content_hash: Optional[str] = None) -> Optional[Deck]:
+        """Deck ze skompilowanego pliku, jeśli pasuje do źródeł (sygnaturą albo - gdy podany - hashem treści)."""
+        if not self.compile_decks:
+            return None
+        try:
+            compiled = CompiledDeckFile(compiled_path(self.compiled_dir, deck_name))
+        except (OSError, ValueError):
+            return None
+        if content_hash is None:
+            if compiled.signature_hash != signature_hash(signature):
+                return None
+        elif compiled.content_hash != content_hash:
+            return None
+        return Deck(deck_name, compiled.white_table(), compiled.black_table(), tuple(paths), signature,
+                    compiled.content_hash, size_estimate=compiled.size)
+
+    def _compile(self, deck: Deck) -> Deck:
+        if not self.compile_decks:
+            return deck
+        data = compile_deck(deck.white, deck.black, deck.content_hash, deck.signature)
+        try:
+            write_compiled(compiled_path(self.compiled_dir, deck.name), data)
+        except OSError as e:
+            # Np. katalog tylko do odczytu albo plik zmapowany przez inny proces (Windows) - zostaje sparsowany deck
+            logger.warning(f"Rejestr decków: nie udało się zapisać skompilowanego '{deck.name}': {e}")
+            return deck
+        return self._open_compiled(deck.name, deck.source_paths, deck.signature, deck.content_hash) or deck
+
+    def _parse(self, deck_name, paths, raw, signature, content_hash) -> Deck:
+        white_items, black_items = [], []
+        for path, data in zip(paths, raw):
+            if path.endswith(".json"):
+                w, b = self._parse_json_deck(data)
+                white_items.extend(w)
+                black_items.extend(b)
+            elif path.endswith(".white"):
+                white_items.extend(self._parse_lines(data, WhiteCard))
+            elif path.endswith(".black"):
+                black_items.extend(self._parse_lines(data, BlackCard))
+
+        logger.info(f"Rejestr decków: sparsowano '{deck_name}' ({len(white_items)} w, {len(black_items)} b).")
+        return Deck(deck_name, CardTable(len(white_items), cards=white_items),
+                    CardTable(len(black_items), cards=black_items), tuple(paths), signature, content_hash)
+
+    @staticmethod
+    def _parse_lines(data: bytes, cls):
+        items = []
+        for line in data.decode('utf-8', errors='ignore').splitlines():
+            if line.strip(): items.append(cls(line))
+        return items
+
+    @staticmethod
+    def _parse_json_deck(data: bytes):
+        # Błędy treści zgłasza preflight (deck_preflight.py) przy starcie; tu tylko log i co się da wczytać
+        white_items = []
+        black_items = []
+        try:
+            deck = json.loads(data.decode('utf-8'))
+            cards = deck.get('cards', {})
+            for w in cards.get('white', []):
+                try:
+                    white_items.append(WhiteCard.from_json(w))
+                except Exception:
+                    logger.warning(f"Rejestr decków: niepoprawna biała karta {w.get('id')!r}, wczytana awaryjnie.")
+                    # fallback: construct from joined forms
+                    forms = w.get('forms')
+                    if isinstance(forms, dict):
+                        parts = [forms.get(k, '') for k in ["M","D","C","B","N","MSC","W"]]
+                        white_items.append(WhiteCard('|'.join(parts)))
+            for b in cards.get('black', []):
+                try:
+                    black_items.append(BlackCard.from_json(b))
+                except Exception:
+                    logger.warning(f"Rejestr decków: niepoprawna czarna karta {b.get('id')!r}, wczytana awaryjnie.")
+                    tmpl = b.get('template') or b.get('raw_text') or ''
+                    black_items.append(BlackCard(tmpl))
+        except Exception as e:
+            logger.error(f"Rejestr decków: nie udało się wczytać decku ({e!r}) - "
+                         f"wczytano {len(white_items)} w, {len(black_items)} b.")
+        return white_items, black_items
+
+
+deck_registry = DeckRegistry()
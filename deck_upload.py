@@ -0,0 +1,213 @@
+"""
+Upload decku przez HTTP (PUT /admin/decks/<nazwa>): treść jest sprawdzana w trakcie odbierania,
+karta po karcie, i od razu zapisywana do pliku tymczasowego - w pamięci nigdy nie ma całego decku.
+Poprawny plik zastępuje `decks/<nazwa>.json` atomowo (os.replace), a rejestr wczytuje nową wersję.
+Pokoje w trakcie gry zostają przy starej wersji; nowa trafia do nich przy starcie następnej gry.
+"""
+import os
+import re
+import json
+import uuid
+import codecs
+import asyncio
+import logging
+from typing import AsyncIterable, List, Optional
+
+from deck_preflight import Problem, ERROR, WARNING, check_card
+from deck_registry import DeckRegistry, deck_registry as shared_deck_registry
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_BYTES = 32 * 1024 * 1024
+MAX_VALUE_CHARS = 1024 * 1024  # najdłuższa pojedyncza karta / wartość w JSON-ie
+MAX_ERRORS = 50  # po tylu błędach kart przerywamy odbieranie
+
+DECK_NAME_RE = re.compile(r"[^\W_][\w\- ]{0,63}")
+
+# Struktura decku przechodzona token po tokenie; wszystko inne (karty, meta) dekodowane w całości przez json
+_WALKED = {(), ("cards",), ("cards", "white"), ("cards", "black")}
+_CARD_PATHS = {("cards", "white", "*"): "white", ("cards", "black", "*"): "black"}
+_TOKEN_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]:,]|[^\s{}\[\]:,"]+')
+_WHITESPACE_RE = re.compile(r'\s*')
+_decoder = json.JSONDecoder()
+
+
+class UploadRejected(Exception):
+    def __init__(self, message: str, problems: Optional[List[Problem]] = None, status: int = 400):
+        super().__init__(message)
+        self.problems = problems or []
+        self.status = status
+
+
+class DeckStreamValidator:
+    """
+    Przyrostowy parser JSON-a decku. Szkielet (obiekt główny, `cards`, listy `white`/`black`)
+    jest przechodzony token po tokenie, a każda karta dekodowana osobno (json.raw_decode)
+    i sprawdzana regułami preflightu. Pamięć: bieżący fragment wejścia + jedna karta.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._stack: List[list] = []  # [typ "{" / "[", bieżący klucz]
+        self._expect = "value"
+        self._seen_ids = set()
+        self.counts = {"white": 0, "black": 0}
+        self.problems: List[Problem] = []
+        self.error_count = 0
+        self.has_cards = False
+
+    def feed(self, chunk: bytes):
+        try:
+            self._buffer += self._decoder.decode(chunk)
+        except UnicodeDecodeError:
+            raise UploadRejected("Plik nie jest zapisany w UTF-8.")
+        self._scan(final=False)
+
+    def finish(self):
+        try:
+            self._buffer += self._decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            raise UploadRejected("Plik nie jest zapisany w UTF-8.")
+        self._scan(final=True)
+        if self._expect != "done":
+            raise UploadRejected("Niekompletny JSON.")
+        if not self.has_cards:
+            raise UploadRejected("Brak obiektu 'cards'.")
+        if not any(self.counts.values()):
+            self.problems.append(Problem(WARNING, "plik", "deck nie ma kart"))
+
+    def _scan(self, final: bool):
+        buffer, pos = self._buffer, 0
+        while True:
+            pos = _WHITESPACE_RE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            if self._expect in ("value", "value_or_end") and buffer[pos] != "]" and self._path() not in _WALKED:
+                try:
+                    value, end = _decoder.raw_decode(buffer, pos)
+                except ValueError as e:
+                    # Karta urwana na granicy kawałka - czekamy na resztę (chyba że to już koniec albo za dużo danych)
+                    if final or len(buffer) - pos > MAX_VALUE_CHARS:
+                        raise UploadRejected(f"Niepoprawny JSON: {e}.")
+                    break
+                if end == len(buffer) and not final and not isinstance(value, (dict, list)):
+                    break  # liczba / literał może mieć ciąg dalszy
+                self._value(value)
+                pos = end
+                continue
+
+            match = _TOKEN_RE.match(buffer, pos)
+            if match is None or (match.end() == len(buffer) and not final and buffer[pos] not in '{}[]:,"'):
+                if final or len(buffer) - pos > MAX_VALUE_CHARS:
+                    raise UploadRejected("Niepoprawny JSON (niezamknięty napis?).")
+                break
+            self._token(match.group())
+            pos = match.end()
+        self._buffer = buffer[pos:]
+
+    def _path(self) -> tuple:
+        return tuple(key if kind == "{" else "*" for kind, key in self._stack)
+
+    def _token(self, token: str):
+        expect = self._expect
+        if expect in ("value", "value_or_end"):
+            if token == "]" and expect == "value_or_end":
+                self._close()
+            else:
+                self._open(token)
+        elif expect in ("key", "key_or_end"):
+            if token == "}" and expect == "key_or_end":
+                self._close()
+            elif token[0] == '"':
+                self._stack[-1][1] = self._literal(token)
+                self._expect = "colon"
+            else:
+                raise UploadRejected("Niepoprawny JSON: oczekiwano klucza.")
+        elif expect == "colon":
+            if token != ":":
+                raise UploadRejected("Niepoprawny JSON: oczekiwano ':'.")
+            self._expect = "value"
+        elif expect == "comma_or_end":
+            kind = self._stack[-1][0]
+            if token == ",":
+                self._expect = "key" if kind == "{" else "value"
+            elif token == ("}" if kind == "{" else "]"):
+                self._close()
+            else:
+                raise UploadRejected("Niepoprawny JSON: oczekiwano ',' albo końca.")
+        else:
+            raise UploadRejected("Niepoprawny JSON: dane po końcu dokumentu.")
+
+    def _open(self, token: str):
+        # Tylko elementy szkieletu - każdy musi być obiektem albo listą
+        path = self._path()
+        if path == () and token != "{":
+            raise UploadRejected("Deck musi być obiektem JSON.")
+        if path == ("cards",):
+            if token != "{":
+                raise UploadRejected("'cards' musi być obiektem.")
+            self.has_cards = True
+        if path in (("cards", "white"), ("cards", "black")) and token != "[":
+            raise UploadRejected(f"'cards.{path[1]}' musi być listą.")
+        self._stack.append([token, None])
+        self._expect = "key_or_end" if token == "{" else "value_or_end"
+
+    def _close(self):
+        self._stack.pop()
+        self._value_done()
+
+    def _value(self, value):
+        kind = _CARD_PATHS.get(self._path())
+        if kind:
+            problems = check_card(kind, self.counts[kind], value, self._seen_ids)
+            self.problems.extend(problems)
+            self.error_count += sum(p.severity == ERROR for p in problems)
+            self.counts[kind] += 1
+            if self.error_count >= MAX_ERRORS:
+                raise UploadRejected(f"Przerwano po {MAX_ERRORS} błędach.", self.problems)
+        self._value_done()
+
+    def _value_done(self):
+        self._expect = "comma_or_end" if self._stack else "done"
+
+    @staticmethod
+    def _literal(token: str):
+        try:
+            return json.loads(token)
+        except ValueError:
+            raise UploadRejected(f"Niepoprawny JSON: {token[:40]!r}.")
+
+
+async def ingest_deck(name: str, chunks: AsyncIterable[bytes], registry: DeckRegistry = None) -> dict:
+    """Odbiera, sprawdza i podmienia deck `name`. Rzuca UploadRejected; plik docelowy zmienia się tylko po sukcesie."""
+    registry = registry or shared_deck_registry
+    if not DECK_NAME_RE.fullmatch(name):
+        raise UploadRejected("Niepoprawna nazwa decku (litery, cyfry, '_', '-', spacja; do 64 znaków).")
+
+    target = os.path.join(registry.decks_dir, f"{name}.json")
+    tmp = os.path.join(registry.decks_dir, f".{name}.{uuid.uuid4().hex}.upload")
+    validator = DeckStreamValidator()
+    received = 0
+    try:
+        with open(tmp, "wb") as f:
+            async for chunk in chunks:
+                received += len(chunk)
+                if received > MAX_UPLOAD_BYTES:
+                    raise UploadRejected(f"Plik większy niż {MAX_UPLOAD_BYTES // (1024 * 1024)} MiB.", status=413)
+                validator.feed(chunk)
+                f.write(chunk)
+            validator.finish()
+        if validator.error_count:
+            raise UploadRejected("Deck ma błędy.", validator.problems)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    # Rejestr od razu wczytuje (i kompiluje) nową wersję; shardy wykryją zmianę pliku przy następnym get()
+    registry.invalidate(name)
+    await asyncio.to_thread(registry.get, name)
+    logger.info(f"Upload decku '{name}': {validator.counts['white']} w, {validator.counts['black']} b, {received} B.")
+    return {"deck": name, "bytes": received, **validator.counts, "warning_count": len(validator.problems),
+            "warnings": [str(p) for p in validator.problems[:MAX_ERRORS]]}
@@ -0,0 +1,63 @@
+import random
+from typing import Dict, List, Optional
+
+
+class DrawPile:
+    """
+    Stos kart (indeksów w masterze) tasowany leniwie: każde dobranie to jeden krok Fishera-Yatesa,
+    a przestawione pozycje trzymamy w słowniku - nowy stos nic nie kosztuje, nawet dla tysięcy kart.
+    Zagrane karty trafiają na `discard`; gdy stos się skończy, odrzucone są tasowane w nowy stos.
+
+    Kolejność zależy tylko od ziarna, więc do zapisu wystarczy (ziarno, liczba dobranych) i baza
+    stosu (None = wszystkie karty; zmienia się tylko przy przetasowaniu odrzuconych).
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.discard: List[int] = []
+        self.reset()
+
+    def reset(self, base: Optional[List[int]] = None, seed: Optional[int] = None):
+        """Nowy stos: wszystkie karty (base=None) albo podane, w nowej losowej kolejności."""
+        self.base = base
+        self.remaining = self.size if base is None else len(base)
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.drawn = 0
+        self._rng = random.Random(self.seed)
+        self._swaps: Dict[int, int] = {}  # pozycja -> pozycja w bazie, tylko tam, gdzie coś przestawiono
+
+    def __len__(self):
+        """Ile kart można jeszcze dobrać (razem z odrzuconymi)."""
+        return self.remaining + len(self.discard)
+
+    def draw(self) -> Optional[int]:
+        if not self.remaining:
+            if not self.discard:
+                return None
+            base, self.discard = self.discard, []
+            self.reset(base)
+
+        last = self.remaining - 1
+        j = self._rng.randrange(self.remaining)
+        position = self._swaps.get(j, j)
+        if j != last:
+            self._swaps[j] = self._swaps.pop(last, last)
+        else:
+            self._swaps.pop(last, None)
+        self.remaining = last
+        self.drawn += 1
+        return position if self.base is None else self.base[position]
+
+    def cards(self) -> List[int]:
+        """Karty, które zostały na stosie (bez odrzuconych)."""
+        positions = [self._swaps.get(i, i) for i in range(self.remaining)]
+        return positions if self.base is None else [self.base[p] for p in positions]
+
+    @classmethod
+    def restore(cls, size: int, base: Optional[List[int]], seed: int, drawn: int) -> "DrawPile":
+        """Odtwarza stos z (baza, ziarno, liczba dobranych) - powtarza losowania, O(drawn)."""
+        pile = cls(size)
+        pile.reset(base, seed)
+        for _ in range(drawn):
+            pile.draw()
+        return pile
@@ -5,4 +5,8 @@ class Phase(str, Enum):
     SELECTING = "SELECTING"
     JUDGING = "JUDGING"
     SUMMARY = "SUMMARY"
-    GAME_OVER = "GAME_OVER"
\ No newline at end of file
+    GAME_OVER = "GAME_OVER"
+
+class OverflowPolicy(str, Enum):
+    DROP_SUPERSEDED = "DROP_SUPERSEDED"  # wyrzuć starsze pełne stany, zostaw najnowszy
+    DISCONNECT = "DISCONNECT"  # rozłącz klienta, który nie nadąża
\ No newline at end of file
@@ -1,147 +1,332 @@
-import os
+import time
 import random
 import logging
-import asyncio
+from dataclasses import asdict
 
-from models import GameSettings, WhiteCard, BlackCard
+import metrics
+from models import GameSettings
+from deck_registry import DeckRegistry, deck_registry as shared_deck_registry
+from compiled_deck import CardChain
+from draw_pile import DrawPile
 from enums import Phase
 from locales import TEXTS
+from sessions import public_id
 
 logger = logging.getLogger(__name__)
 
 
+class VacantSeat:
+    """
+    Miejsce gracza bez połączenia (odtworzone po restarcie serwera albo trzymane po zerwanym połączeniu)
+    - czeka, aż gracz wróci. Do trzymanego miejsca wraca się tylko z podpisanym tokenem (RESUME),
+    do odtworzonego (restored) także z samym connection_id.
+    """
+
+    def __init__(self, connection_id, restored: bool = False):
+        self.connection_id = connection_id
+        self.restored = restored
+
+    def __repr__(self):
+        return f"VacantSeat({self.connection_id})"
+
+
 class GameEngine:
-    def __init__(self, owner_name: str, settings: GameSettings):
+    def __init__(self, owner_name: str, settings: GameSettings, deck_registry: DeckRegistry = None):
         self.owner_name = owner_name
+        self.deck_registry = deck_registry or shared_deck_registry
         self.room_name = settings.name
         self.settings = settings  # dict: max_players, hand_size, win_score, timeout, decks
 
-        self.white_deck_master = []
-        self.black_deck_master = []
-
+        # Szablony kart są współdzielone; runtime ID białej karty to jej indeks w white_deck_master.
         # 1. Ładowanie Masterów
-        self._load_selected_decks(settings.decks)
+        self._load_selected_decks([self.deck_registry.get(name) for name in settings.decks])
 
         self.game_started = False
         self.phase = Phase.LOBBY
         self.current_black_card = None
+        self._black_card_id = None  # indeks current_black_card w black_deck_master
         self.czar_socket = None
         self.winner_nick = None
 
         self.round_number = 0
+        self.round_started = None  # time.monotonic() rozdania kart w bieżącej rundzie (metryki)
         self.sound_callback = None  # async func(room_name, sound_prefix)
 
-        # 2. Inicjalizacja pustych talii roboczych
-        self.white_deck = []
-        self.black_deck = []
+        # 2. Stosy do dobierania (indeksy w masterach, tasowane leniwie) i karty zagrane w bieżącej rundzie
+        self.white_pile = DrawPile(len(self.white_deck_master))
+        self.black_pile = DrawPile(len(self.black_deck_master))
+        self._played_white = []  # trafiają na stos odrzuconych na początku następnej rundy
 
-        self.players_data = {}  # ws -> {nick, hand, score, id}
+        self.players_data = {}  # ws -> {nick, hand (dict ID karty -> None, w kolejności dobierania), score, id}
         self.round_submissions = {}
         self.judging_order = []
+        self._submission_texts = None  # cache wyrenderowanych zgłoszeń dla bieżącej rundy
         self.ready_players = set()
         self.winning_submission_index = -1
 
-        self._timeout_task = None
-        self.broadcast_callback = None
+        # Liczniki do sprawdzania końca fazy w O(1) - aktualizowane przy wejściu/wyjściu/zgłoszeniu/gotowości
+        self._holding = 0  # gracze z niepustą ręką
+        self._ready_holding = 0  # gotowi gracze z niepustą ręką
+        self._submitted_empty = 0  # gracze, którzy w tej rundzie zgłosili karty i zostali z pustą ręką
+
+        self.deadlines = None  # DeadlineScheduler (wspólny dla pokoi, ustawia RoomManager)
+        self.chat_callback = None  # func(room_name, message)
+        self.broadcast_callback = None  # func(room_name) - oznacza pokój do rozesłania stanu
+
+        # Zwiększane przy każdej zmianie stanu widocznej dla graczy (cache snapshotów w RoomManager).
+        self.state_version = 0
 
         # 3. Kopiowanie kart z Master do Active (pierwsze tasowanie)
         self.reset_game()
 
-    def _load_selected_decks(self, selected_decks):
-        for deck_name in selected_decks:
-            json_path = f"decks/{deck_name}.json"
-            w_path = f"decks/{deck_name}.white"
-            b_path = f"decks/{deck_name}.black"
-            if os.path.exists(json_path):
-                # load from unified JSON
-                w, b = self._load_json_deck(json_path)
-                self.white_deck_master.extend(w)
-                self.black_deck_master.extend(b)
-            else:
-                if os.path.exists(w_path): self.white_deck_master.extend(self._load_file(w_path, WhiteCard))
-                if os.path.exists(b_path): self.black_deck_master.extend(self._load_file(b_path, BlackCard))
+    def _load_selected_decks(self, decks):
+        # Szablony kart są współdzielone przez wszystkie pokoje (rejestr parsuje każdy deck raz).
+        # Mastery sklejają tablice kart z rejestru bez kopiowania (karty decku skompilowanego powstają przy użyciu).
+        self.white_deck_master = CardChain()
+        self.black_deck_master = CardChain()
+        self.deck_hashes = []  # hash treści każdego wybranego decka (None = brak pliku)
+        for deck in decks:
+            self.deck_hashes.append(deck.content_hash if deck else None)
+            if deck:
+                self.white_deck_master.extend(deck.white)
+                self.black_deck_master.extend(deck.black)
 
         logger.info(
             f"Pokój '{self.room_name}': Załadowano {len(self.white_deck_master)} w, {len(self.black_deck_master)} b.")
 
-    @staticmethod
-    def _load_file(path, cls):
-        items = []
-        try:
-            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    if line.strip(): items.append(cls(line))
-        except Exception:
-            pass
-        return items
-
-    def _load_json_deck(self, path):
-        white_items = []
-        black_items = []
-        try:
-            import json
-            from models import WhiteCard, BlackCard
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            cards = data.get('cards', {})
-            for w in cards.get('white', []):
-                try:
-                    white_items.append(WhiteCard.from_json(w))
-                except Exception:
-                    # fallback: construct from joined forms
-                    forms = w.get('forms')
-                    if isinstance(forms, dict):
-                        parts = [forms.get(k, '') for k in ["M","D","C","B","N","MSC","W"]]
-                        white_items.append(WhiteCard('|'.join(parts)))
-            for b in cards.get('black', []):
-                try:
-                    black_items.append(BlackCard.from_json(b))
-                except Exception:
-                    tmpl = b.get('template') or b.get('raw_text') or ''
-                    black_items.append(BlackCard(tmpl))
-        except Exception:
-            pass
-        return white_items, black_items
+    def refresh_decks(self) -> bool:
+        """
+        Przed startem gry: przejmuje nowe wersje decków z rejestru (np. po uploadzie).
+        Gra w toku zostaje przy swoich kartach - tylko w lobby, kiedy nikt nie ma kart w ręce.
+        """
+        if self.game_started:
+            return False
+        decks = [self.deck_registry.get(name) for name in self.settings.decks]
+        if [deck.content_hash if deck else None for deck in decks] == self.deck_hashes:
+            return False
+        self._load_selected_decks(decks)
+        self.white_pile = DrawPile(len(self.white_deck_master))
+        self.black_pile = DrawPile(len(self.black_deck_master))
+        self._played_white = []
+        self._black_card_id = None
+        self._touch()
+        return True
 
     def reset_game(self):
         self.game_started = False
         self.phase = Phase.LOBBY
         self.current_black_card = None
+        self._black_card_id = None
         self.czar_socket = None
         self.winner_nick = None
         self.round_number = 0
 
-        # Kopiowanie i tasowanie
-        self.white_deck = self.white_deck_master.copy()
-        self.black_deck = self.black_deck_master.copy()
-        random.shuffle(self.white_deck)
-        random.shuffle(self.black_deck)
+        # Wszystkie karty wracają na stosy - tasowanie dzieje się dopiero przy dobieraniu
+        self.white_pile.discard = []
+        self.white_pile.reset()
+        self.black_pile.discard = []
+        self.black_pile.reset()
+        self._played_white = []
 
         for p in self.players_data.values():
             p['score'] = 0
-            p['hand'] = []
+            p['hand'] = {}
 
         self.round_submissions = {}
         self.judging_order = []
+        self._submission_texts = None
         self.ready_players = set()
-        self._cancel_timeout()
+        self._holding = self._ready_holding = self._submitted_empty = 0
+        self._cancel_deadline()
+        self._touch()
+
+    def _touch(self):
+        self.state_version += 1
 
     def add_player(self, ws, nick, connection_id):
-        self.players_data[ws] = {'nick': nick, 'hand': [], 'score': 0, 'id': connection_id}
+        self.players_data[ws] = {'nick': nick, 'hand': {}, 'score': 0, 'id': connection_id,
+                                 'public_id': public_id(connection_id)}
+        self._touch()
 
     def remove_player(self, ws):
         """ Usuwa gracza z pokoju. Zwraca True jeśli pokój jest teraz pusty i powinien zostać usunięty."""
         if ws in self.players_data:
             p = self.players_data[ws]
             del self.players_data[ws]
+            if p['hand']:
+                self._holding -= 1
+                if ws in self.ready_players: self._ready_holding -= 1
+                self.white_pile.discard.extend(p['hand'])
+            elif ws in self.round_submissions:
+                self._submitted_empty -= 1
             self.ready_players.discard(ws)
             
             if p['nick'] == self.owner_name: self.owner_name = None
             if ws == self.czar_socket: self.czar_socket = None
             if ws in self.round_submissions: del self.round_submissions[ws]
+            self._touch()
 
         return len(self.players_data) == 0
 
+    # --- SNAPSHOTY (persistence.RoomStore) ---
+
+    def snapshot_state(self) -> dict:
+        """
+        Stan pokoju do zapisu: karty jako indeksy w masterach, gracze po connection_id.
+        Ze stosów tylko (ziarno, liczba dobranych) - bazę stosu zapisuje snapshot_piles przy każdej zmianie ziarna.
+        Stos odrzuconych da się odtworzyć: to karty, których nie ma ani na stosie, ani w grze.
+        """
+        white = self.white_deck_master.index_of
+        seats = {ws: p['id'] for ws, p in self.players_data.items()}
+
+        return {
+            "settings": asdict(self.settings),
+            "decks": list(self.deck_hashes),
+            "owner": self.owner_name,
+            "started": self.game_started,
+            "phase": self.phase.value,
+            "round": self.round_number,
+            "winner": self.winner_nick,
+            "winning_index": self.winning_submission_index,
+            "version": self.state_version,
+            "pile_seeds": [self.white_pile.seed, self.black_pile.seed],
+            "pile_drawn": [self.white_pile.drawn, self.black_pile.drawn],
+            "black_card": self._black_card_id,
+            "players": [[p['id'], p['nick'], list(p['hand']), p['score']] for p in self.players_data.values()],
+            "czar": seats.get(self.czar_socket),
+            "ready": [seats[ws] for ws in self.ready_players if ws in seats],
+            "submissions": [[seats.get(ws), [white(c) for c in cards]]
+                            for ws, cards in self.round_submissions.items()],
+            "judging": [[seats.get(ws), [white(c) for c in cards]] for ws, cards in self.judging_order],
+        }
+
+    def snapshot_piles(self) -> dict:
+        return {"white": self.white_pile.base, "black": self.black_pile.base}
+
+    @classmethod
+    def restore(cls, state: dict, piles: dict, deck_registry: DeckRegistry = None):
+        """Odtwarza pokój ze snapshotu. Gracze dostają VacantSeat do czasu powrotu. None, jeśli decki się zmieniły."""
+        engine = cls(state["owner"], GameSettings(**state["settings"]), deck_registry)
+        if engine.deck_hashes != state["decks"]:
+            return None
+
+        white, black = engine.white_deck_master, engine.black_deck_master
+        engine.game_started = state["started"]
+        engine.phase = Phase(state["phase"])
+        engine.round_number = state["round"]
+        engine.winner_nick = state["winner"]
+        engine.winning_submission_index = state["winning_index"]
+        engine.state_version = state["version"]
+        if state["black_card"] is not None:
+            engine._black_card_id = state["black_card"]
+            engine.current_black_card = black[state["black_card"]]
+
+        seats = {}
+        for connection_id, nick, hand, score in state["players"]:
+            seat = seats[connection_id] = VacantSeat(connection_id, restored=True)
+            engine.players_data[seat] = {'nick': nick, 'hand': dict.fromkeys(hand), 'score': score, 'id': connection_id,
+                                         'public_id': public_id(connection_id)}
+        engine.czar_socket = seats.get(state["czar"])
+        engine.ready_players = {seats[c] for c in state["ready"] if c in seats}
+        # Zgłoszenia graczy, którzy już wyszli, zostają jako "duchy" (seat spoza players_data)
+        engine.round_submissions = {seats.get(c) or VacantSeat(c): [white[i] for i in ids]
+                                    for c, ids in state["submissions"]}
+        engine.judging_order = [(seats.get(c) or VacantSeat(c), [white[i] for i in ids])
+                                for c, ids in state["judging"]]
+        engine._played_white = list({i for _, ids in state["submissions"] + state["judging"] for i in ids})
+        engine._restore_piles(state, piles)
+        engine._recount()
+        return engine
+
+    def _restore_piles(self, state: dict, piles: dict):
+        (white_seed, black_seed), (white_drawn, black_drawn) = state["pile_seeds"], state["pile_drawn"]
+        self.white_pile = DrawPile.restore(len(self.white_deck_master), piles["white"], white_seed, white_drawn)
+        self.black_pile = DrawPile.restore(len(self.black_deck_master), piles["black"], black_seed, black_drawn)
+
+        # Odrzucone = karty, których nie ma na stosie ani w grze (ręce, zgłoszenia, czarna karta na stole)
+        in_play = set(self.white_pile.cards()).union(self._played_white)
+        for p in self.players_data.values():
+            in_play.update(p['hand'])
+        self.white_pile.discard = [i for i in range(len(self.white_deck_master)) if i not in in_play]
+        in_play = set(self.black_pile.cards())
+        in_play.add(self._black_card_id)
+        self.black_pile.discard = [i for i in range(len(self.black_deck_master)) if i not in in_play]
+
+    def _recount(self):
+        """Liczniki faz od zera (po odtworzeniu pokoju) - w trakcie gry są tylko aktualizowane."""
+        holding = [ws for ws, p in self.players_data.items() if p['hand']]
+        self._holding = len(holding)
+        self._ready_holding = sum(1 for ws in holding if ws in self.ready_players)
+        self._submitted_empty = sum(1 for ws in self.round_submissions
+                                    if ws in self.players_data and not self.players_data[ws]['hand'])
+
+    def ready_status(self):
+        """(gotowi, wszyscy) - liczą się gracze z kartami na ręce, a gdy nikt ich nie ma, wszyscy."""
+        if self._holding:
+            return self._ready_holding, self._holding
+        return len(self.ready_players), len(self.players_data)
+
+    def submissions_needed(self) -> int:
+        """Ilu graczy (poza carem) musi zgłosić karty: ci z kartami na ręce i ci, którzy już zgłosili."""
+        czar = self.players_data.get(self.czar_socket)
+        return self._holding + self._submitted_empty - (1 if czar and czar['hand'] else 0)
+
+    def vacant_seats(self):
+        return [ws for ws in self.players_data if isinstance(ws, VacantSeat)]
+
+    def find_vacant_seat(self, connection_id):
+        for ws in self.players_data:
+            if isinstance(ws, VacantSeat) and ws.connection_id == connection_id:
+                return ws
+        return None
+
+    def find_restored_seat(self, connection_id):
+        """Miejsce odtworzone po restarcie - jedyne, które można zająć samym connection_id (JOIN_ROOM)."""
+        seat = self.find_vacant_seat(connection_id)
+        return seat if seat is not None and seat.restored else None
+
+    def find_seat(self, connection_id):
+        """Miejsce (połączenie albo VacantSeat) gracza o danym connection_id."""
+        for ws, p in self.players_data.items():
+            if p['id'] == connection_id:
+                return ws
+        return None
+
+    def take_seat(self, seat: VacantSeat, ws):
+        """Gracz wrócił (po restarcie / RESUME) - przepinamy jego miejsce (ręka, punkty, zgłoszenie) na nowe połączenie."""
+        self._move_seat(seat, ws)
+
+    def hold_seat(self, ws) -> VacantSeat:
+        """Zerwane połączenie: miejsce gracza zostaje w pokoju jako VacantSeat, do powrotu albo do wyrzucenia."""
+        seat = VacantSeat(self.players_data[ws]['id'])
+        self._move_seat(ws, seat)
+        return seat
+
+    def _move_seat(self, old, new):
+        def swap(s):
+            return new if s is old else s
+
+        self.players_data = {swap(s): p for s, p in self.players_data.items()}
+        self.round_submissions = {swap(s): cards for s, cards in self.round_submissions.items()}
+        self.judging_order = [(swap(s), cards) for s, cards in self.judging_order]
+        self.czar_socket = swap(self.czar_socket)
+        if old in self.ready_players:
+            self.ready_players.discard(old)
+            self.ready_players.add(new)
+        self._touch()
+
+    def resume_deadlines(self):
+        """Po odtworzeniu pokoju termin bieżącej fazy liczymy od nowa."""
+        if self.phase == Phase.SELECTING:
+            self._set_deadline(self.settings.timeout, self._on_selecting_timeout)
+        elif self.phase == Phase.JUDGING:
+            self._set_deadline(self.settings.judging_timeout, self._on_judging_timeout)
+        elif self.phase == Phase.SUMMARY:
+            self._set_deadline(self.settings.summary_timeout, self._on_summary_timeout)
+
+    def get_white_card(self, card_id: int):
+        return self.white_deck_master[card_id]
+
     def is_password_correct(self, password: str):
         return not self.settings.has_password() or self.settings.password == password
 
@@ -149,12 +334,21 @@ class GameEngine:
         return self.settings.anyone_can_start or self.owner_name is None or self.owner_name == nick
 
     async def start_round(self):
-        self._cancel_timeout()
+        self._cancel_deadline()
 
-        if not self.black_deck:
+        # Karty z poprzedniej rundy idą na stosy odrzuconych (wrócą po przetasowaniu)
+        if self._black_card_id is not None:
+            self.black_pile.discard.append(self._black_card_id)
+            self._black_card_id = None
+        self.white_pile.discard.extend(self._played_white)
+        self._played_white = []
+
+        black_card_id = self.black_pile.draw()
+        if black_card_id is None:
             logger.info(f"Pokój '{self.room_name}': Brak czarnych kart. Koniec gry.")
             self.phase = Phase.GAME_OVER
             self.winner_nick = TEXTS["MSG_DECK_EMPTY"]
+            self._touch()
             return
 
         # Dźwięki rundy
@@ -164,17 +358,28 @@ class GameEngine:
             await self.sound_callback(self.room_name, prefix)
 
         # Dobieramy czarną kartę
-        self.current_black_card = self.black_deck.pop()
+        self._black_card_id = black_card_id
+        self.current_black_card = self.black_deck_master[black_card_id]
         self.phase = Phase.SELECTING
+        self.round_started = time.monotonic()
         self.round_submissions = {}
         self.judging_order = []
+        self._submission_texts = None
         self.ready_players = set()
+        self._ready_holding = self._submitted_empty = 0
 
         hand_limit = int(self.settings.hand_size)
 
+        holding = 0
         for ws, p_data in self.players_data.items():
-            while len(p_data['hand']) < hand_limit and self.white_deck:
-                p_data['hand'].append(self.white_deck.pop())
+            hand = p_data['hand']
+            while len(hand) < hand_limit:
+                card_id = self.white_pile.draw()
+                if card_id is None: break
+                hand[card_id] = None
+            if hand: holding += 1
+        self._holding = holding
+        self._touch()
 
         active = list(self.players_data.keys())
         if not active:
@@ -188,73 +393,117 @@ class GameEngine:
                 self.czar_socket = active[(curr_idx + 1) % len(active)]
             except ValueError:
                 self.czar_socket = random.choice(active)
+        self._touch()
 
-        timeout_sec = self.settings.timeout
-        if timeout_sec and timeout_sec > 0:
-            self._timeout_task = asyncio.create_task(
-                self._round_timeout_logic(timeout_sec)
-            )
+        self._set_deadline(self.settings.timeout, self._on_selecting_timeout)
 
-    async def _round_timeout_logic(self, seconds):
-        try:
-            await asyncio.sleep(seconds)
-            if self.phase == Phase.SELECTING:
-                logger.info(f"Pokój '{self.room_name}': {TEXTS['MSG_TIMEOUT']}")
-                await self._force_resolve_round()
-        except asyncio.CancelledError:
-            pass
+    # --- TERMINY FAZ (SELECTING / JUDGING / SUMMARY) ---
+
+    def _set_deadline(self, seconds, callback):
+        self._cancel_deadline()
+        if self.deadlines and seconds and seconds > 0:
+            self.deadlines.schedule(self, seconds, callback)
+
+    def _cancel_deadline(self):
+        if self.deadlines:
+            self.deadlines.cancel(self)
+
+    async def _on_selecting_timeout(self):
+        if self.phase != Phase.SELECTING: return
+        logger.info(f"Pokój '{self.room_name}': {TEXTS['MSG_TIMEOUT']}")
+        await self._force_resolve_round()
 
     async def _force_resolve_round(self):
         pick = self.current_black_card.pick_count
-        updated = False
 
-        for ws, p_data in self.players_data.items():
+        for ws, p_data in list(self.players_data.items()):
             if ws == self.czar_socket: continue
             if ws not in self.round_submissions:
                 if len(p_data['hand']) >= pick:
-                    random_pick = random.sample(p_data['hand'], pick)
+                    random_pick = random.sample(list(p_data['hand']), pick)
                     # Używamy internal logic, żeby nie duplikować kodu
-                    self.submit_cards(ws, [c.id for c in random_pick])
-                    updated = True
+                    self.submit_cards(ws, random_pick)
+
+        # Ktoś nie miał dość kart - oceniamy to, co jest, albo od razu kolejna runda
+        if self.phase == Phase.SELECTING:
+            if self.round_submissions:
+                self._start_judging()
+            else:
+                await self.start_round()
+
+        if self.broadcast_callback:
+            self.broadcast_callback(self.room_name)
+
+    async def _on_judging_timeout(self):
+        if self.phase != Phase.JUDGING: return
+        logger.info(f"Pokój '{self.room_name}': {TEXTS['MSG_TIMEOUT']}")
+
+        if not self.judging_order:
+            await self.start_round()
+        else:
+            winner_nick = self.pick_winner(random.randrange(len(self.judging_order)))
+            if winner_nick:
+                await self.announce_winner(winner_nick)
 
         if self.broadcast_callback:
-            await self.broadcast_callback(self.room_name)
+            self.broadcast_callback(self.room_name)
 
-    def _cancel_timeout(self):
-        if self._timeout_task:
-            self._timeout_task.cancel()
-            self._timeout_task = None
+    async def _on_summary_timeout(self):
+        if self.phase != Phase.SUMMARY: return
+        # Automatyczne "gotowy" dla wszystkich, którzy nie zdążyli
+        await self.start_round()
+        if self.broadcast_callback:
+            self.broadcast_callback(self.room_name)
 
     def submit_cards(self, ws, card_ids):
         player = self.players_data.get(ws)
         if not player or ws == self.czar_socket: return False
 
-        id_map = {c.id: c for c in player['hand']}
-        selected = [id_map[cid] for cid in card_ids if cid in id_map]
+        hand = player['hand']
+        selected = []
+        for cid in card_ids:
+            if isinstance(cid, int) and cid in hand and cid not in selected:
+                selected.append(cid)
         if len(selected) != self.current_black_card.pick_count: return False
 
-        self.round_submissions[ws] = selected
-        for c in selected: player['hand'].remove(c)
-
-        needed = 0
-        for s, p_data in self.players_data.items():
-            if s == self.czar_socket: continue
-            if len(p_data['hand']) > 0 or s in self.round_submissions: needed += 1
-
-        if len(self.round_submissions) >= needed:
-            self._cancel_timeout()
-            self.phase = Phase.JUDGING
-            lst = list(self.round_submissions.items())
-            random.shuffle(lst)
-            self.judging_order = lst
+        self.round_submissions[ws] = [self.white_deck_master[cid] for cid in selected]
+        for cid in selected: del hand[cid]
+        self._played_white.extend(selected)
+        if not hand:
+            self._holding -= 1
+            self._submitted_empty += 1
+            if ws in self.ready_players: self._ready_holding -= 1
+        self._touch()
+
+        if len(self.round_submissions) >= self.submissions_needed():
+            self._start_judging()
             return True
         return False
 
+    def _start_judging(self):
+        self.phase = Phase.JUDGING
+        lst = list(self.round_submissions.items())
+        random.shuffle(lst)
+        self.judging_order = lst
+        self._submission_texts = None
+        self._touch()
+        self._set_deadline(self.settings.judging_timeout, self._on_judging_timeout)
+
+    def get_submission_texts(self):
+        """Wyrenderowane zgłoszenia (w kolejności judging_order), liczone raz na rundę."""
+        if self._submission_texts is None:
+            card = self.current_black_card
+            self._submission_texts = [card.fill_blanks(cards) for _, cards in self.judging_order]
+        return self._submission_texts
+
     def pick_winner(self, index):
         try:
             index = int(index)
             winner_ws, _ = self.judging_order[index]
             self.winning_submission_index = index
+            if self.round_started is not None:
+                metrics.round_seconds.observe(time.monotonic() - self.round_started)
+                self.round_started = None
 
             winner_nick = TEXTS["MSG_GHOST"]
             if winner_ws in self.players_data:
@@ -265,21 +514,31 @@ class GameEngine:
             if self.players_data.get(winner_ws, {}).get('score', 0) >= win_score:
                 self.phase = Phase.GAME_OVER
                 self.winner_nick = winner_nick
+                self._cancel_deadline()
             else:
                 self.phase = Phase.SUMMARY
+                self._set_deadline(self.settings.summary_timeout, self._on_summary_timeout)
+            self._touch()
             return winner_nick
         except:
             return None
 
-    async def mark_player_ready(self, ws):
-        if ws in self.players_data: self.ready_players.add(ws)
-
-        relevant = [s for s, p in self.players_data.items() if len(p['hand']) > 0]
-        if not relevant: relevant = list(self.players_data.keys())
+    async def announce_winner(self, winner_nick: str):
+        """Zwycięzca rundy na czacie pokoju (+ dźwięk na koniec gry) - tak samo po wyborze cara i po timeoucie."""
+        if self.chat_callback:
+            self.chat_callback(self.room_name, TEXTS["MSG_WINNER"].format(nick=winner_nick))
+        if self.phase == Phase.GAME_OVER and self.sound_callback:
+            await self.sound_callback(self.room_name, "win")
 
-        ready_rel = [s for s in self.ready_players if s in relevant]
+    async def mark_player_ready(self, ws):
+        if ws in self.players_data:
+            if ws not in self.ready_players:
+                self.ready_players.add(ws)
+                if self.players_data[ws]['hand']: self._ready_holding += 1
+            self._touch()
 
-        if len(ready_rel) == len(relevant) and len(relevant) > 0:
+        ready, total = self.ready_status()
+        if ready == total and total > 0:
             await self.start_round()
             return True
         return False
\ No newline at end of file
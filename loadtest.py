@@ -0,0 +1,324 @@
+"""
+Generator obciążenia: tysiące wirtualnych graczy (GameBot) w jednej pętli zdarzeń na proces,
+opcjonalnie w kilku procesach (po jednym na rdzeń).
+
+Przykład (serwer uruchomiony osobno, np. `CAH_RELOAD=0 CAH_RATE_LIMITS=0 python run.py` - wszystkie boty
+łączą się z jednego adresu, więc z limitami serwer odrzuciłby większość połączeń):
+    python loadtest.py --bots 2000 --processes 4 --room-size 6 --think exp --think-mean 3 --duration 120
+
+Raport co --interval sekund: połączenia, wiadomości/s, bajty/s i percentyle opóźnienia
+"akcja -> następny GAME_UPDATE" widziane przez klienta; na koniec także opóźnienie widziane
+przez serwer (GET /stats).
+"""
+import json
+import math
+import time
+import random
+import asyncio
+import logging
+import argparse
+import multiprocessing
+import urllib.request
+from queue import Empty
+
+from bot import GameBot
+from metrics import LatencyHistogram
+
+ACTIONS = {'CREATE_ROOM', 'JOIN_ROOM', 'START_GAME', 'SUBMIT_CARDS', 'PICK_WINNER', 'PLAYER_READY'}
+COUNTERS = ('connects', 'disconnects', 'msgs_in', 'msgs_out', 'bytes_in', 'games_started', 'errors')
+
+
+class ThinkTime:
+    """Rozkład czasu namysłu wirtualnego gracza o zadanej średniej (sekundy)."""
+
+    def __init__(self, distribution: str, mean: float):
+        self.distribution = distribution
+        self.mean = mean
+
+    def sample(self) -> float:
+        mean = self.mean
+        if mean <= 0:
+            return 0.0
+        match self.distribution:
+            case 'fixed':
+                return mean
+            case 'uniform':
+                return random.uniform(0, 2 * mean)
+            case 'exp':
+                return random.expovariate(1 / mean)
+            case 'lognormal':
+                sigma = 0.75
+                return random.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+        raise ValueError(f"Nieznany rozkład: {self.distribution}")
+
+
+class LoadStats:
+    """Liczniki i histogram opóźnień jednego procesu; wysyłane do rodzica co interwał i zerowane."""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.reset()
+
+    def reset(self):
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self.latency.reset()
+
+    def to_dict(self, connected: int) -> dict:
+        data = {name: getattr(self, name) for name in COUNTERS}
+        data["connected"] = connected
+        data["latency"] = self.latency.to_dict()
+        return data
+
+
+class LoadBot(GameBot):
+    """GameBot z konfigurowalnym namysłem, zakładaniem pokoi, startem gry, churnem i pomiarem opóźnień."""
+
+    def __init__(self, nickname, server_url, config, stats: LoadStats, owner: bool):
+        super().__init__(nickname, server_url)
+        self.logger.setLevel(logging.WARNING)
+        self.config = config
+        self.stats = stats
+        self.owner = owner  # tryb "owner": ten bot zakłada pokój i startuje grę
+        self.think_dist = ThinkTime(config.think, config.think_mean)
+        self.tick = config.tick
+        self.search_interval = config.search_interval
+        self.reconnect_delay = config.reconnect_delay
+
+        self.connected = False
+        self._action_sent = None
+        self._rooms_created = 0
+        self._starting = False
+        self._join_pending_until = 0  # nie wysyłamy kolejnego JOIN/CREATE, zanim serwer odpowie na poprzedni
+
+    def think_time(self, action: str) -> float:
+        if action == 'connect':
+            return random.uniform(0, self.config.ramp)
+        if action == 'rest':
+            return self.config.rest
+        return self.think_dist.sample()
+
+    async def send_json(self, data):
+        self.stats.msgs_out += 1
+        if data.get('type') in ACTIONS:
+            self._action_sent = time.perf_counter()
+        await super().send_json(data)
+
+    async def handle_message(self, message):
+        stats = self.stats
+        stats.msgs_in += 1
+        stats.bytes_in += len(message)
+        # Serwer koduje kompaktowo z "type" na początku - bez parsowania wiemy, że to stan gry
+        if message.startswith('{"type":"GAME_') and self._action_sent is not None:
+            stats.latency.observe(time.perf_counter() - self._action_sent)
+            self._action_sent = None
+        elif message.startswith('{"type":"ERROR"'):
+            stats.errors += 1
+
+        await super().handle_message(message)
+        if message.startswith('{"type":"JOIN_ROOM_OK"'):
+            self._join_pending_until = 0
+        elif message.startswith('{"type":"ERROR"'):
+            # Np. pokój pełny - lista była nieaktualna, spróbujemy przy następnym wyszukiwaniu
+            self._join_pending_until = time.time() + self.search_interval
+
+        state = self.latest_state
+        if (state and state.get('phase') == 'LOBBY' and state.get('can_start_game') and not self._starting
+                and len(state.get('players_list', [])) >= self.config.room_size):
+            self._starting = True
+            asyncio.create_task(self._start_game())
+
+    async def _start_game(self):
+        try:
+            await self.think('start')
+            if self.latest_state and self.latest_state.get('phase') == 'LOBBY':
+                await self.send_json({"type": "START_GAME"})
+                self.stats.games_started += 1
+        finally:
+            self._starting = False
+
+    async def loop_search_rooms(self):
+        # Startowane przez GameBot.connect przy każdym (ponownym) połączeniu
+        self.connected = True
+        self.stats.connects += 1
+        churn = asyncio.create_task(self._churn(self.ws)) if self.config.churn > 0 else None
+        try:
+            await super().loop_search_rooms()
+        finally:
+            self.connected = False
+            self.stats.disconnects += 1
+            if churn: churn.cancel()
+
+    async def _churn(self, websocket):
+        # Średnio co --churn sekund gracz zrywa połączenie i łączy się od nowa
+        await asyncio.sleep(random.expovariate(1 / self.config.churn))
+        await websocket.close()
+
+    async def try_join_room(self, rooms):
+        now = time.time()
+        if now < self._join_pending_until:
+            return
+        self._join_pending_until = now + 2.0
+
+        available = [r for r in rooms if not r['has_password'] and r['players'] < r['max']]
+        create = self.owner if self.config.rooms == 'owner' else not available
+        if create:
+            await self._create_room()
+            return
+        if self.config.rooms == 'owner':
+            available = [r for r in available if r['name'].startswith(self.config.prefix)]
+        if not available:
+            return
+        if self.config.join == 'fill':
+            # Jeden z kilku najpełniejszych - inaczej wszyscy naraz pchają się do tego samego pokoju
+            target = random.choice(sorted(available, key=lambda r: r['players'], reverse=True)[:4])
+        else:
+            target = random.choice(available)
+        await self.send_json({"type": "JOIN_ROOM", "name": target['name'], "password": ""})
+
+    async def _create_room(self):
+        self._rooms_created += 1
+        await self.send_json({"type": "CREATE_ROOM", "settings": {
+            "name": f"{self.config.prefix}{self.nickname}-{self._rooms_created}",
+            "password": None,
+            "max_players": self.config.room_size,
+            "hand_size": self.config.hand_size,
+            "win_score": self.config.win_score,
+            "timeout": self.config.round_timeout or None,
+            "anyone_can_start": False,
+            "decks": self.config.decks,
+        }})
+
+
+async def run_worker(index: int, config, results):
+    stats = LoadStats()
+    url = f"ws://{config.host}:{config.port}/ws"
+    count = config.bots // config.processes + (1 if index < config.bots % config.processes else 0)
+    bots = [LoadBot(f"lt{index}_{i}", url, config, stats, owner=(i % config.room_size == 0))
+            for i in range(count)]
+    tasks = [asyncio.create_task(bot.connect()) for bot in bots]
+
+    try:
+        while True:
+            await asyncio.sleep(config.interval)
+            results.put((index, stats.to_dict(sum(b.connected for b in bots))))
+            stats.reset()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def worker_main(index: int, config, results):
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        asyncio.run(run_worker(index, config, results))
+    except KeyboardInterrupt:
+        pass
+
+
+def fetch_server_stats(config):
+    try:
+        with urllib.request.urlopen(f"http://{config.host}:{config.port}/stats", timeout=5) as response:
+            return json.loads(response.read())
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def format_line(elapsed, window, latency, seconds) -> str:
+    summary = latency.summary()
+    return (f"[{elapsed:6.1f}s] połączeni={window['connected']:5d}  "
+            f"in={window['msgs_in'] / seconds:8.0f} msg/s ({window['bytes_in'] / seconds / 1024:8.1f} KiB/s)  "
+            f"out={window['msgs_out'] / seconds:6.0f} msg/s  "
+            f"akcja->stan p50={summary['p50_ms']:.1f}ms p90={summary['p90_ms']:.1f}ms p99={summary['p99_ms']:.1f}ms  "
+            f"błędy={window['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generator obciążenia serwera (wirtualni gracze GameBot).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2137)
+    parser.add_argument("--bots", type=int, default=500)
+    parser.add_argument("--processes", type=int, default=1, help="procesy (pętle zdarzeń) z botami")
+    parser.add_argument("--duration", type=float, default=60, help="czas testu w sekundach")
+    parser.add_argument("--interval", type=float, default=5, help="co ile sekund raport")
+    parser.add_argument("--ramp", type=float, default=10, help="boty łączą się losowo w ciągu tylu sekund")
+    parser.add_argument("--think", choices=("fixed", "uniform", "exp", "lognormal"), default="uniform")
+    parser.add_argument("--think-mean", type=float, default=2.0, help="średni czas namysłu (s)")
+    parser.add_argument("--tick", type=float, default=0.25, help="co ile sekund bot patrzy na stan gry")
+    parser.add_argument("--rooms", choices=("owner", "organic"), default="owner",
+                        help="owner: co --room-size-ty bot zakłada pokój; organic: pokój zakłada ten, kto nie znajdzie wolnego")
+    parser.add_argument("--join", choices=("random", "fill"), default="fill",
+                        help="random: losowy wolny pokój; fill: najpełniejszy wolny pokój")
+    parser.add_argument("--room-size", type=int, default=6)
+    parser.add_argument("--hand-size", type=int, default=10)
+    parser.add_argument("--win-score", type=int, default=5)
+    parser.add_argument("--round-timeout", type=int, default=0, help="limit czasu rundy (0 = brak)")
+    parser.add_argument("--decks", nargs="+", default=["base"])
+    parser.add_argument("--churn", type=float, default=0, help="średnia długość sesji w s (0 = bez rozłączeń)")
+    parser.add_argument("--rest", type=float, default=2.0, help="przerwa po wyjściu z pokoju (s)")
+    parser.add_argument("--search-interval", type=float, default=1.0)
+    parser.add_argument("--reconnect-delay", type=float, default=1.0)
+    parser.add_argument("--prefix", default="lt-", help="prefiks nazw pokoi zakładanych przez test")
+    parser.add_argument("--json", dest="json_path", help="zapisz podsumowanie do pliku JSON")
+    config = parser.parse_args()
+    config.processes = max(1, min(config.processes, config.bots))
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    workers = [ctx.Process(target=worker_main, args=(i, config, results), daemon=True)
+               for i in range(config.processes)]
+    for w in workers:
+        w.start()
+
+    total = LatencyHistogram()
+    totals = {name: 0 for name in COUNTERS}
+    started = time.time()
+    print(f"Test: {config.bots} botów w {config.processes} procesach -> {config.host}:{config.port}, {config.duration:.0f}s")
+
+    try:
+        pending = {}
+        while time.time() - started < config.duration:
+            try:
+                index, data = results.get(timeout=0.5)
+            except Empty:
+                continue
+            pending[index] = data
+            if len(pending) < config.processes:
+                continue
+
+            window = {name: sum(d[name] for d in pending.values()) for name in COUNTERS + ("connected",)}
+            latency = LatencyHistogram()
+            for d in pending.values():
+                latency.merge(LatencyHistogram.from_dict(d["latency"]))
+            pending = {}
+
+            total.merge(latency)
+            for name in COUNTERS:
+                totals[name] += window[name]
+            print(format_line(time.time() - started, window, latency, config.interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for w in workers:
+            w.terminate()
+
+    elapsed = time.time() - started
+    summary = {
+        "bots": config.bots,
+        "processes": config.processes,
+        "duration_s": round(elapsed, 1),
+        "msgs_in_per_s": round(totals["msgs_in"] / elapsed, 1),
+        "msgs_out_per_s": round(totals["msgs_out"] / elapsed, 1),
+        "bytes_in_per_s": round(totals["bytes_in"] / elapsed, 1),
+        "totals": totals,
+        "client_latency": total.summary(),
+        "server": fetch_server_stats(config),
+    }
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    if config.json_path:
+        with open(config.json_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -94,6 +94,12 @@ TEXTS = {
     "ERR_WRONG_PASS": "Błędne hasło",
     "ERR_NO_ROOM": "Obóz nie istnieje",
     "ERR_NICK_TAKEN": "Nick zajęty!",
+    "ERR_RATE_LIMITED": "Zwolnij! Za dużo wiadomości naraz.",
+    "ERR_SERVER_FULL": "Serwer jest pełny, spróbuj za chwilę.",
+    "ERR_TOO_MANY_CONNECTIONS": "Za dużo połączeń z tego adresu.",
+    "ERR_TOO_MANY_ROOMS": "Osiągnięto limit obozów na serwerze.",
+    "ERR_BAD_MESSAGE": "Serwer nie mógł obsłużyć tej wiadomości.",
+    "ERR_SESSION_EXPIRED": "Nie udało się wrócić na miejsce - sesja wygasła.",
     "MSG_WINNER": "Wygrywa: {nick}!",
     "MSG_TIMEOUT": "TIMEOUT! Automatyczny wybór.",
     "MSG_DECK_EMPTY": "Koniec kart!",
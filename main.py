@@ -1,26 +1,74 @@
 import logging
 import json
+import hmac
 import uuid
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, Response
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Header, Request
+from fastapi.responses import HTMLResponse, Response, JSONResponse
 from fastapi.staticfiles import StaticFiles
 
-from models import GameSettings
 from room_manager import RoomManager
+from sharding import ShardedRoomManager
+from persistence import RoomStore
 from message_handler import MessageHandler
 import asyncio
+import signal
 import run as run_cfg
+import metrics
+import profiler
+import deck_preflight
+import deck_upload
 from enums import Phase
 from locales import TEXTS
+from serialization import choose_subprotocol
+from rate_limit import RateLimiter, ERR_RATE_LIMITED, ERR_TOO_MANY_ROOMS
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S")
 logger = logging.getLogger("CAH_Main")
 
+ERR_BAD_MESSAGE = "ERR_BAD_MESSAGE"
+
 app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/decks", StaticFiles(directory="decks"), name="decks")
 
-room_manager = RoomManager()
+# CAH_SHARDS > 1: pokoje w osobnych procesach, ten proces jest tylko bramką (lobby + połączenia)
+# CAH_ROOMS_DB: plik z zapisem pokoi (przetrwają restart / auto-reload); pusty = tylko w pamięci
+slow_message_threshold = run_cfg.SLOW_MESSAGE_MS / 1000
+session_options = dict(session_grace=run_cfg.SESSION_GRACE, session_secret=run_cfg.SESSION_SECRET.encode("utf-8") or None)
+if run_cfg.SHARDS > 1:
+    room_manager = ShardedRoomManager(run_cfg.SHARDS, store_path=run_cfg.ROOMS_DB or None,
+                                      slow_message_threshold=slow_message_threshold, **session_options)
+else:
+    room_manager = RoomManager(store=RoomStore(run_cfg.ROOMS_DB) if run_cfg.ROOMS_DB else None,
+                               slow_message_threshold=slow_message_threshold, **session_options)
+metrics.registry.add_collector(room_manager.collect_metrics)
+# Limity wiadomości na połączenie / adres IP i limity połączeń (CAH_RATE_LIMITS=0 wyłącza wszystko)
+rate_limiter = RateLimiter(run_cfg.RATE_LIMITS, run_cfg.IP_RATE_LIMITS, run_cfg.MAX_CONNECTIONS,
+                           run_cfg.MAX_CONNECTIONS_PER_IP, run_cfg.MAX_ROOMS) if run_cfg.RATE_LIMITS_ENABLED else None
+
+
+@app.on_event("startup")
+async def register_signal_handlers():
+    # SIGHUP -> ponowne przeskanowanie static/sounds bez restartu serwera (niedostępne na Windows)
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, room_manager.reload_sounds)
+    except (NotImplementedError, AttributeError, RuntimeError):
+        pass
+
+@app.on_event("startup")
+async def check_decks():
+    # Preflight decków (wyniki z cache dla niezmienionych plików); w trybie strict błędy przerywają start
+    if run_cfg.DECK_PREFLIGHT != "off":
+        await asyncio.to_thread(deck_preflight.check_decks, strict=run_cfg.DECK_PREFLIGHT == "strict")
+
+@app.on_event("startup")
+async def start_room_manager():
+    # Odtworzenie zapisanych pokoi / uruchomienie shardów
+    await room_manager.start()
+
+@app.on_event("shutdown")
+async def stop_room_manager():
+    await room_manager.stop()
 
 @app.get("/")
 async def get():
@@ -32,55 +80,103 @@ async def get_locales():
     js_content = f"const TEXTS = {json.dumps(TEXTS)};"
     return Response(content=js_content, media_type="application/javascript")
 
+@app.get("/stats")
+async def get_stats():
+    # Liczniki serwera (połączenia, pokoje, opóźnienie akcja -> stan gry) - czyta je m.in. loadtest.py
+    return room_manager.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    # Format tekstowy Prometheusa (w trybie shardów zsumowany ze wszystkich procesów)
+    return Response(content=await room_manager.metrics_text(), media_type="text/plain; version=0.0.4")
+
+def is_admin(token: str) -> bool:
+    return bool(run_cfg.ADMIN_TOKEN) and hmac.compare_digest(token, run_cfg.ADMIN_TOKEN)
+
+@app.get("/admin/slow")
+async def get_slow_messages(x_admin_token: str = Header("")):
+    # Ostatnie wiadomości obsługiwane dłużej niż CAH_SLOW_MESSAGE_MS (typ, pokój, gracz, czas)
+    if not is_admin(x_admin_token):
+        return Response(status_code=403)
+    return await room_manager.slow_message_report()
+
+@app.get("/admin/profile")
+async def get_profile(seconds: float = 10, interval: float = profiler.DEFAULT_INTERVAL,
+                      x_admin_token: str = Header("")):
+    # Próbkowanie stosów pętli zdarzeń przez `seconds` s, wynik dla flamegraph.pl / speedscope
+    if not is_admin(x_admin_token):
+        return Response(status_code=403)
+    try:
+        stacks = await room_manager.profile(seconds, interval)
+    except profiler.ProfilerBusy:
+        return Response(content="Profiler już działa.\n", status_code=409, media_type="text/plain")
+    return Response(content=stacks, media_type="text/plain")
+
+@app.put("/admin/decks/{name}")
+async def upload_deck(name: str, request: Request, x_admin_token: str = Header("")):
+    # Upload decku (sprawdzany w trakcie odbierania); pokoje dostają nową wersję przy starcie następnej gry
+    if not is_admin(x_admin_token):
+        return Response(status_code=403)
+    try:
+        return await deck_upload.ingest_deck(name, request.stream())
+    except deck_upload.UploadRejected as e:
+        return JSONResponse({"error": str(e), "problems": [str(p) for p in e.problems]}, status_code=e.status)
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     handler = MessageHandler(room_manager, websocket)
+    subprotocol = choose_subprotocol(websocket.scope.get("subprotocols", []))
+    ip = websocket.client.host if websocket.client else "?"
 
-    await room_manager.connect(websocket)
-    connection_id = str(uuid.uuid4())
+    refused = rate_limiter.open(websocket, ip) if rate_limiter else None
+    if refused:
+        # Akceptujemy tylko po to, żeby klient dostał powód; 1013 = "spróbuj później"
+        await websocket.accept(subprotocol=subprotocol)
+        await websocket.send_text(json.dumps(error_message(refused), ensure_ascii=False))
+        await websocket.close(code=1013)
+        return
 
     try:
-        while True:
-            data = await websocket.receive_json()
-            message_type = data.get('type')
-
-            match message_type:
-                case 'GET_ROOMS':
-                    await room_manager.send_room_list(websocket)
+        await room_manager.connect(websocket, subprotocol)
+        connection_id = str(uuid.uuid4())
 
-                case 'GET_DECKS':
-                    decks = room_manager.get_deck_list()
-                    await websocket.send_json({"type": "DECK_LIST", "decks": decks})
-
-                case 'SET_NICK':
-                    await handler.set_nick(data.get('nickname'))
-
-                case 'CHAT_MSG':
-                    await handler.send_chat_message(data.get('message'))
-
-                case 'CREATE_ROOM':
-                    settings = GameSettings(**data['settings'])
-                    await handler.create_room(settings, connection_id)
-
-                case 'JOIN_ROOM':
-                    await handler.join_room(data['name'], data.get('password', None), connection_id)
-
-                case 'START_GAME':
-                    await handler.start_game()
-
-                case 'SUBMIT_CARDS':
-                    await handler.submit_cards(data['cards'])
-
-                case 'PICK_WINNER':
-                    await handler.pick_winner(data['index'])
+        while True:
+            try:
+                data = await websocket.receive_json()
+            except ValueError:  # ramka, która nie jest JSON-em
+                data = None
+            message_type = data.get('type') if isinstance(data, dict) else None
+            if rate_limiter:
+                allowed, notify = rate_limiter.check(websocket, message_type)
+                if not allowed:
+                    if notify:
+                        room_manager.send(websocket, error_message(ERR_RATE_LIMITED))
+                    continue
+            if not isinstance(data, dict):
+                room_manager.send(websocket, error_message(ERR_BAD_MESSAGE))
+                continue
+            if (message_type == 'CREATE_ROOM' and rate_limiter
+                    and not rate_limiter.room_allowed(room_manager.room_count())):
+                room_manager.send(websocket, error_message(ERR_TOO_MANY_ROOMS))
+                continue
+            try:
+                await room_manager.handle_message(handler, data, connection_id)
+            except Exception:
+                # Zła wiadomość (brak pól, złe typy) nie może zerwać pętli - gracz zostałby w pokoju bez połączenia
+                logger.exception(f"Błąd obsługi wiadomości {message_type!r}")
+                room_manager.send(websocket, error_message(ERR_BAD_MESSAGE))
 
-                case 'PLAYER_READY':
-                    await handler.set_ready()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        try:
+            await room_manager.remove_player(websocket, remove_connection=True)
+        finally:
+            if rate_limiter:
+                rate_limiter.close(websocket)
 
-                case 'LEAVE_ROOM':
-                    await handler.leave_room()
 
-    except WebSocketDisconnect:
-        await room_manager.remove_player(websocket, remove_connection=True)
+def error_message(code: str) -> dict:
+    return {"type": "ERROR", "code": code, "message": TEXTS[code]}
 
 
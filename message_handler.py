@@ -1,31 +1,81 @@
 from fastapi import WebSocket
 from enums import Phase
+from locales import TEXTS
 from models import GameSettings
 from room_manager import RoomManager
+from pubsub import LOBBY_TOPIC, room_topic
 
 class MessageHandler:
     def __init__(self, room_manager: RoomManager, websocket: WebSocket):
         self.room_manager = room_manager
         self.websocket = websocket
 
+    async def handle(self, data: dict, connection_id: str):
+        message_type = data.get('type')
+
+        match message_type:
+            case 'GET_ROOMS':
+                await self.room_manager.send_room_list(self.websocket)
+
+            case 'GET_DECKS':
+                await self.send_deck_list()
+
+            case 'SET_NICK':
+                await self.set_nick(data.get('nickname'))
+
+            case 'CHAT_MSG':
+                await self.send_chat_message(data.get('message'))
+
+            case 'CREATE_ROOM':
+                settings = GameSettings(**data['settings'])
+                await self.create_room(settings, connection_id)
+
+            case 'RESUME':
+                await self.resume(data.get('token'))
+
+            case 'JOIN_ROOM':
+                await self.join_room(data.get('name'), data.get('password', None), connection_id, data.get('connection_id'))
+
+            case 'START_GAME':
+                await self.start_game()
+
+            case 'SUBMIT_CARDS':
+                await self.submit_cards(data['cards'])
+
+            case 'PICK_WINNER':
+                await self.pick_winner(data['index'])
+
+            case 'PLAYER_READY':
+                await self.set_ready()
+
+            case 'LEAVE_ROOM':
+                await self.leave_room()
+
+            case 'ENABLE_DELTAS':
+                await self.enable_deltas()
+
+            case 'RESYNC':
+                await self.resync()
+
+    async def send_deck_list(self):
+        await self._send_to_self({"type": "DECK_LIST", "decks": self.room_manager.get_deck_list()})
+
     async def send_chat_message(self, message, nick = None):
         room = self._get_player_room()
         nick = nick if nick else self._get_player_nick()
 
-        if room:
-            await self._broadcast_to_room(room, {"type": "CHAT", "author": nick, "message": message})
-        else:
-            await self._broadcast_to_all({"type": "CHAT", "author": nick, "message": message, "scope": "LOBBY"})
+        self.room_manager.chat.post(room_topic(room.room_name) if room else LOBBY_TOPIC, nick, message)
 
     async def set_nick(self, nick: str):
         if nick:
             self.room_manager.active_connections[self.websocket] = nick
 
-            await self.websocket.send_json({"type": "NICK_OK"})
+            await self._send_to_self({"type": "NICK_OK"})
             # Send full ROOM_LIST only to this new client in lobby
             await self.room_manager.send_room_list(self.websocket)
+            self.room_manager.send_chat_history(self.websocket, LOBBY_TOPIC)
             # Notify lobby clients about updated player list
-            await self.room_manager.broadcast_lobby_players()
+            self.room_manager.schedule_lobby_players()
             
             # Dźwięk powitalny w lobby
             await self.room_manager.broadcast_lobby_sound("welcome")
@@ -34,23 +84,42 @@ class MessageHandler:
         owner_name = self._get_player_nick()
         success = self.room_manager.create_room(owner_name, settings)
         if success:
-            await self.room_manager.broadcast_room_list()
+            self.room_manager.schedule_room_list()
             await self.join_room(settings.name, settings.password, connection_id)
         else:
             await self._send_to_self({"type": "ERROR", "message": "Pokój o tej nazwie już istnieje!"})
 
-    async def join_room(self, name, password, connection_id):
-        result = await self.room_manager.join_room(self.websocket, name, password, connection_id)
+    async def join_room(self, name, password, connection_id, rejoin_id=None):
+        result = await self.room_manager.join_room(self.websocket, name, password, connection_id, rejoin_id)
         if result == "OK":
-            await self._send_to_self({"type": "JOIN_ROOM_OK", "room": name, "connection_id": connection_id})
-            await self.room_manager.broadcast_room_state(name)
+            # Po odzyskaniu miejsca gracz zachowuje swoje stare connection_id
+            player = self._get_player_room().players_data[self.websocket]
+            connection_id = player['id']
+            await self._send_to_self({"type": "JOIN_ROOM_OK", "room": name, "connection_id": connection_id,
+                                      "player_id": player['public_id'],
+                                      "session": self.room_manager.sessions.issue(name, connection_id)})
+            self.room_manager.send_chat_history(self.websocket, room_topic(name))
+            self.room_manager.schedule_room_state(name)
             # Update lobby clients with changed player count for this room
-            await self.room_manager.broadcast_room_count(name)
+            self.room_manager.schedule_room_count(name)
             # Also update lobby's player list
-            await self.room_manager.broadcast_lobby_players()
+            self.room_manager.schedule_lobby_players()
         else:
             await self._send_to_self({"type": "ERROR", "message": result})
 
+    async def resume(self, token):
+        # Powrót po zerwanym połączeniu: to samo miejsce i jeden pełny stan dla tego gracza, bez broadcastów do pokoju
+        result = await self.room_manager.resume_session(self.websocket, token)
+        if result != "OK":
+            await self._send_to_self({"type": "ERROR", "code": result, "message": TEXTS[result]})
+            return
+        room = self._get_player_room()
+        player = room.players_data[self.websocket]
+        await self._send_to_self({"type": "RESUME_OK", "room": room.room_name, "nick": self._get_player_nick(),
+                                  "connection_id": player['id'], "player_id": player['public_id']})
+        self.room_manager.send_room_state_to(self.websocket)
+        self.room_manager.schedule_lobby_players()
+
     async def start_game(self):
         room = self._get_player_room()
         if room.game_started:
@@ -65,38 +134,43 @@ class MessageHandler:
             await self._send_to_self({"type": "ERROR", "message": "ERR_MIN_PLAYERS"})
             return
 
+        room.refresh_decks()  # nowa wersja decku (upload) trafia do pokoju dopiero przy starcie gry
         room.game_started = True
         await room.start_round()
-        await self.room_manager.broadcast_room_state(room.room_name)
+        self.room_manager.schedule_room_state(room.room_name)
 
     async def submit_cards(self, cards):
         room = self._get_player_room()
 
         if room.phase == Phase.SELECTING and room.submit_cards(self.websocket, cards):
-            await self.room_manager.broadcast_room_state(room.room_name)
+            self.room_manager.schedule_room_state(room.room_name)
 
     async def pick_winner(self, winner):
         room = self._get_player_room()
         if room.phase == Phase.JUDGING and self.websocket == room.czar_socket:
             winner_nick = room.pick_winner(winner)
             if winner_nick:
-                await self.send_chat_message(f"Wygrywa: {winner_nick}", "SYSTEM")
-                
-                if room.phase == Phase.GAME_OVER:
-                    await self.room_manager.broadcast_sound_to_room(room.room_name, "win")
-                    
-                await self.room_manager.broadcast_room_state(room.room_name)
+                await room.announce_winner(winner_nick)
+                self.room_manager.schedule_room_state(room.room_name)
 
     async def set_ready(self):
         room = self._get_player_room()
         if room.phase == Phase.SUMMARY:
             await room.mark_player_ready(self.websocket)
-            await self.room_manager.broadcast_room_state(room.room_name)
+            self.room_manager.schedule_room_state(room.room_name)
+
+    async def enable_deltas(self):
+        self.room_manager.delta_clients.add(self.websocket)
+
+    async def resync(self):
+        # Klient wykrył lukę w wersjach GAME_DELTA - wysyłamy mu pełny stan
+        self.room_manager.send_room_state_to(self.websocket)
 
     #poprawka pisana na kolanie, nie mam tu dostępu do mojego ide i klepię w chujowniku ms windows
     async def leave_room(self):
         await self.room_manager.remove_player(self.websocket, remove_connection=False)
         await self._send_to_self({"type": "LEFT_ROOM"})
+        self.room_manager.send_chat_history(self.websocket, LOBBY_TOPIC)
 
     def _get_player_nick(self):
         return self.room_manager.active_connections.get(self.websocket)
@@ -108,23 +182,18 @@ class MessageHandler:
         return self._get_room(self._get_player_room_name())
 
     async def _broadcast_to_all(self, message):
-        for ws in list(self.room_manager.active_connections.keys()):
-            if self.room_manager.player_room_map.get(ws) is None:
-                await self._send(ws, message)
+        self.room_manager.bus.publish(LOBBY_TOPIC, message)
 
     async def _broadcast_to_room(self, room, message):
         if room:
-            for ws in list(room.players_data):
-                await self._send(ws, message)
+            self.room_manager.bus.publish(room_topic(room.room_name), message)
 
     async def _send_to_self(self, message):
-        await self._send(self.websocket, message)
+        self._send(self.websocket, message)
 
-    async def _send(self, ws, message):
-        try:
-            await ws.send_json(message)
-        except Exception:
-            pass
+    def _send(self, ws, message, kind=None):
+        # Tylko kolejkowanie - wysyłką zajmuje się task połączenia (outbound.OutboundQueue)
+        self.room_manager.send(ws, message, kind)
 
     def _get_room(self, room_name):
         return self.room_manager.rooms.get(room_name)
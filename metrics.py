@@ -0,0 +1,281 @@
+import bisect
+from typing import Dict, List
+
+# Granice kubełków (sekundy): od 0.1 ms co 2^(1/4) (~19%) do ~100 s.
+LATENCY_BUCKETS = tuple(0.0001 * 2 ** (i / 4) for i in range(81))
+
+
+class LatencyHistogram:
+    """
+    Histogram opóźnień o stałych kubełkach: observe() to jeden bisect, a histogramy
+    z kilku procesów łączy się przez zsumowanie liczników (merge).
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts: List[int] = [0] * (len(bounds) + 1)  # ostatni kubełek: powyżej najwyższej granicy
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def percentile(self, p: float) -> float:
+        """Górna granica kubełka, w którym wypada p-ty percentyl (0-100)."""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return self.bounds[min(i, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+    def summary(self) -> dict:
+        """Podsumowanie w milisekundach."""
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p90_ms": round(self.percentile(90) * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+        }
+
+    def to_dict(self) -> dict:
+        return {"counts": self.counts, "count": self.count, "total": self.total}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        hist = cls()
+        hist.counts = list(data["counts"])
+        hist.count = data["count"]
+        hist.total = data["total"]
+        return hist
+
+
+# --- Metryki w formacie Prometheusa (GET /metrics) ---
+
+# Kubełki liczby odbiorców broadcastu: 1, 2, 4, ... 4096
+RECIPIENT_BUCKETS = tuple(2 ** i for i in range(13))
+INF_LABEL = 'le="+Inf"'
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values: Dict[tuple, float] = {}
+
+    def empty(self):
+        return type(self)(self.name, self.help, self.labels)
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def to_dict(self) -> list:
+        return [[list(k), v] for k, v in self.values.items()]
+
+    def merge_dict(self, data: list):
+        for key, value in data:
+            self.inc(*key, amount=value)
+
+    def lines(self):
+        for key, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Wartości ustawiane w chwili odczytu (MetricsRegistry.add_collector) - nic nie kosztują między odczytami."""
+    kind = "gauge"
+
+    def set(self, *label_values, value: float):
+        self.values[label_values] = value
+
+    def clear(self):
+        self.values = {}
+
+
+class Histogram:
+    """
+    Histogram z etykietami na LatencyHistogram. Na zewnątrz wystawiamy co `export_every`-tą granicę
+    (liczniki są skumulowane, więc rzadsze kubełki nadal są dokładne).
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), bounds=LATENCY_BUCKETS, export_every: int = 4):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.bounds = bounds
+        self.export_every = export_every
+        self.values: Dict[tuple, LatencyHistogram] = {}
+
+    def empty(self):
+        return Histogram(self.name, self.help, self.labels, self.bounds, self.export_every)
+
+    def observe(self, value: float, *label_values):
+        hist = self.values.get(label_values)
+        if hist is None:
+            hist = self.values[label_values] = LatencyHistogram(self.bounds)
+        hist.observe(value)
+
+    def bind(self, hist: LatencyHistogram, *label_values):
+        """Wystawia istniejący histogram (np. RoomManager.action_latency) pod tą nazwą."""
+        self.values[label_values] = hist
+
+    def to_dict(self) -> list:
+        return [[list(k), h.to_dict()] for k, h in self.values.items()]
+
+    def merge_dict(self, data: list):
+        for key, hist in data:
+            key = tuple(key)
+            if key not in self.values:
+                self.values[key] = LatencyHistogram(self.bounds)
+            self.values[key].merge(LatencyHistogram.from_dict(hist))
+
+    def lines(self):
+        exported = set(range(0, len(self.bounds), self.export_every))
+        for key, hist in self.values.items():
+            cumulative = 0
+            for i, count in enumerate(hist.counts[:-1]):
+                cumulative += count
+                if i in exported:
+                    le = f'le="{_format_value(self.bounds[i])}"'
+                    yield f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(self.labels, key, INF_LABEL)} {hist.count}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(hist.total)}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {hist.count}"
+
+
+class MetricsRegistry:
+    """
+    Wszystkie metryki procesu. Zapis to słownik + bisect, a cała praca (gauge, formatowanie tekstu)
+    dzieje się dopiero przy odczycie, więc zbieranie może być włączone na stałe.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self._collectors = []
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels=()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels=()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels=(), bounds=LATENCY_BUCKETS,
+                  export_every: int = 4) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, bounds, export_every))
+
+    def add_collector(self, collector):
+        """collector() ustawia gauge tuż przed odczytem (np. liczba pokoi)."""
+        self._collectors.append(collector)
+
+    def collect(self):
+        for collector in self._collectors:
+            collector()
+
+    def to_dict(self) -> dict:
+        """Stan wszystkich metryk (do przesłania z procesu sharda do bramki)."""
+        self.collect()
+        return {name: metric.to_dict() for name, metric in self.metrics.items()}
+
+    def render(self, remote=()) -> str:
+        """Format tekstowy Prometheusa; `remote` - wyniki to_dict() z innych procesów, dodawane do naszych."""
+        self.collect()
+        merged = self
+        if remote:
+            merged = MetricsRegistry()
+            for metric in self.metrics.values():
+                merged._register(metric.empty()).merge_dict(metric.to_dict())
+            for data in remote:
+                for name, values in data.items():
+                    if name in merged.metrics:
+                        merged.metrics[name].merge_dict(values)
+
+        out = []
+        for metric in merged.metrics.values():
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.lines())
+        return "\n".join(out) + "\n"
+
+
+registry = MetricsRegistry()
+
+messages_received = registry.counter(
+    "cah_messages_received_total", "Wiadomości od klientów wg typu", ("type",))
+message_seconds = registry.histogram(
+    "cah_message_handling_seconds", "Czas obsługi wiadomości od klienta wg typu", ("type",))
+broadcast_seconds = registry.histogram(
+    "cah_broadcast_seconds", "Czas rozesłania jednej wiadomości do odbiorców wg typu", ("type",))
+broadcast_recipients = registry.histogram(
+    "cah_broadcast_recipients", "Liczba odbiorców jednego broadcastu wg typu", ("type",),
+    bounds=RECIPIENT_BUCKETS, export_every=1)
+slow_messages = registry.counter(
+    "cah_slow_messages_total", "Wiadomości obsługiwane dłużej niż próg wolnych wiadomości", ("type",))
+sent_bytes = registry.counter(
+    "cah_sent_bytes_total", "Wysłane dane wg formatu, przed kompresją permessage-deflate (json: liczone w znakach)",
+    ("format",))
+rate_limited = registry.counter(
+    "cah_rate_limited_total", "Wiadomości odrzucone przez limity (scope: connection / ip)", ("type", "scope"))
+connections_rejected = registry.counter(
+    "cah_connections_rejected_total", "Połączenia odrzucone przez limity (server_full / per_ip)", ("reason",))
+send_failures = registry.counter(
+    "cah_send_failures_total", "Nieudane wysyłki do klientów (error - wyjątek gniazda, slow_client - "
+    "rozłączenie za przepełnioną kolejkę)", ("reason",))
+chat_lines = registry.counter(
+    "cah_chat_lines_total", "Linie czatu wg zasięgu (room / lobby)", ("scope",))
+chat_frames = registry.counter(
+    "cah_chat_frames_total", "Broadcasty czatu (CHAT / CHAT_DIGEST) wg zasięgu - mniej niż linii dzięki łączeniu",
+    ("scope",))
+sessions = registry.counter(
+    "cah_sessions_total", "Miejsca po zerwanym połączeniu: held (trzymane), resumed (RESUME), expired (po okresie "
+    "łaski), rejected (RESUME z nieważnym tokenem)", ("event",))
+messages_dropped = registry.counter(
+    "cah_messages_dropped_total", "Wiadomości wyrzucone z kolejek wychodzących (zastąpione nowszym stanem)")
+action_latency = registry.histogram(
+    "cah_action_latency_seconds", "Akcja gracza -> wysłany mu nowy stan gry")
+connections = registry.gauge("cah_connections", "Otwarte połączenia WebSocket")
+rooms = registry.gauge("cah_rooms", "Pokoje")
+players = registry.gauge("cah_players", "Gracze w pokojach wg fazy gry", ("phase",))
+deck_load_seconds = registry.histogram(
+    "cah_deck_load_seconds", "Wczytanie i sparsowanie decka (tylko chybienia w rejestrze)")
+round_seconds = registry.histogram(
+    "cah_round_duration_seconds", "Czas rundy: od rozdania kart do wyboru zwycięzcy")
@@ -1,80 +1,117 @@
 import re
-import uuid
+import sys
 from typing import List
 from dataclasses import dataclass
 
+FORM_ORDER = ('M', 'D', 'C', 'B', 'N', 'MSC', 'W')
+FORM_INDEX = {f'<{k}>': i for i, k in enumerate(FORM_ORDER)}
+
+
+def _intern_forms(parts) -> tuple:
+    """Interned formy; jeśli wszystkie są identyczne, trzymamy tylko jedną."""
+    forms = tuple(sys.intern(str(p)) for p in parts)
+    if len(forms) < 7 or all(f is forms[0] for f in forms):
+        return forms[:1] or ('',)
+    return forms[:7]
+
+
 class WhiteCard:
+    """
+    Niemutowalny szablon białej karty (flyweight) - współdzielony przez wszystkie pokoje.
+    Runtime ID nadaje dopiero pokój (indeks karty w jego talii master).
+    """
+    __slots__ = ('forms', 'source_id')
+
     def __init__(self, raw_line: str):
         parts = [p.strip() for p in raw_line.strip().split('|')]
         base_word = parts[0] if parts else "???"
-        self.forms = parts if len(parts) >= 7 else [base_word] * 7
-        self.id = str(uuid.uuid4())
-        self.text = self.forms[0]  # Dla łatwego dostępu
+        self.forms = _intern_forms(parts if len(parts) >= 7 else [base_word])
         self.source_id = None
 
+    @property
+    def text(self) -> str:
+        return self.forms[0]
+
     def get_nominative(self) -> str:
         return self.forms[0]
 
+    def get_form(self, index: int) -> str:
+        forms = self.forms
+        return forms[index] if len(forms) > 1 else forms[0]
+
     def get_form_by_tag(self, tag: str) -> str:
-        mapping = {'<M>': 0, '<D>': 1, '<C>': 2, '<B>': 3, '<N>': 4, '<MSC>': 5, '<W>': 6}
-        return self.forms[mapping.get(tag, 0)]
+        return self.get_form(FORM_INDEX.get(tag, 0))
 
     @classmethod
     def from_json(cls, data: dict):
         # data expected to have 'forms' dict or list
         forms_data = data.get('forms')
         if isinstance(forms_data, dict):
-            order = ['M', 'D', 'C', 'B', 'N', 'MSC', 'W']
-            parts = [forms_data.get(k, '') for k in order]
+            parts = [forms_data.get(k, '') for k in FORM_ORDER]
         elif isinstance(forms_data, list):
             parts = forms_data
         else:
             parts = [''] * 7
 
-        obj = cls('|'.join(parts))
-        # Runtime ID MUSI być unikalne per instancja karty (żeby UI i backend nie miały kolizji).
+        obj = cls.__new__(cls)
         # Jeśli w JSON jest "id", zachowujemy je tylko informacyjnie jako source_id.
         obj.source_id = data.get('id')
-        obj.forms = parts
-        obj.text = obj.forms[0] if obj.forms else ''
+        obj.forms = _intern_forms(parts)
         return obj
 
 
 class BlackCard:
+    """
+    Czarna karta skompilowana raz przy ładowaniu decku: `literals` to kawałki tekstu między
+    placeholderami, a `slot_forms` to indeksy przypadków (FORM_ORDER) dla kolejnych slotów.
+    """
+    __slots__ = ('raw_text', 'literals', 'slot_forms', 'display_text', 'pick_count', 'source_id')
+
+    BLANK = '__________'
+    EMPTY_SLOT = '____'
+
     def __init__(self, raw_text: str):
         self.raw_text = raw_text.strip()
-        self.tags = re.findall(r'<[A-Z]+>', self.raw_text)
-        self.pick_count = max(1, len(self.tags))
-        self.id = str(uuid.uuid4())
         self.source_id = None
+        self._compile(None)
+
+    def _compile(self, slots):
+        parts = re.split(r'(<[A-Z]+>)', self.raw_text)
+        self.literals = tuple(sys.intern(p) for p in parts[0::2])
+        tags = parts[1::2]
+        self.slot_forms = tuple(FORM_INDEX.get(t, 0) for t in tags)
+        self.display_text = self.BLANK.join(self.literals)
+        self.pick_count = max(1, len(slots) if slots else len(tags))
 
     def get_display_text(self) -> str:
-        return re.sub(r'<[A-Z]+>', '__________', self.raw_text)
+        return self.display_text
 
     def fill_blanks(self, white_cards: List[WhiteCard]) -> str:
-        text = self.raw_text
-        for i, tag in enumerate(self.tags):
+        literals = self.literals
+        if not self.slot_forms:
+            if white_cards:
+                return f"{literals[0]} <b>{white_cards[0].get_nominative()}</b>"
+            return literals[0]
+
+        out = [literals[0]]
+        for i, form_idx in enumerate(self.slot_forms):
             if i < len(white_cards):
-                text = text.replace(tag, f"<b>{white_cards[i].get_form_by_tag(tag)}</b>", 1)
-        if len(self.tags) == 0 and white_cards:
-            text += f" <b>{white_cards[0].get_nominative()}</b>"
-        return re.sub(r'<[A-Z]+>', '____', text)
+                out.append(f"<b>{white_cards[i].get_form(form_idx)}</b>")
+            else:
+                out.append(self.EMPTY_SLOT)
+            out.append(literals[i + 1])
+        return ''.join(out)
 
     @classmethod
     def from_json(cls, data: dict):
         # data expected to have 'template' and optionally 'slots'
         raw = data.get('template') or data.get('raw_text') or ''
-        obj = cls(raw)
-        if data.get('id'):
-            obj.id = data['id']
-
+        obj = cls.__new__(cls)
+        obj.raw_text = raw.strip()
         obj.source_id = data.get('id')
 
-        # if slots provided, ensure tags reflect them
         slots = data.get('slots')
-        if isinstance(slots, list) and slots:
-            obj.tags = [f"<{s}>" for s in slots]
-            obj.pick_count = max(1, len(obj.tags))
+        obj._compile(slots if isinstance(slots, list) else None)
         return obj
 
 
@@ -88,6 +125,8 @@ class GameSettings:
     timeout: int | None # in seconds
     anyone_can_start: bool
     decks: List[str]
+    judging_timeout: int | None = 120  # czas na wybór zwycięzcy, potem losowy wybór
+    summary_timeout: int | None = 60  # czas na "gotowy" w podsumowaniu, potem kolejna runda
 
     def has_password(self):
         return self.password is not None and self.password != ''
@@ -0,0 +1,127 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+
+import metrics
+from enums import OverflowPolicy
+from metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_LIMIT = 64
+DEFAULT_OVERFLOW_POLICY = OverflowPolicy.DROP_SUPERSEDED
+
+# Wiadomości niosące stan - nowsza unieważnia starsze z tej samej grupy.
+# Po wyrzuceniu GAME_UPDATE/GAME_DELTA klient dostaje pełny stan (state_dropped) albo sam prosi o RESYNC.
+SUPERSEDE_GROUPS = {
+    "GAME_UPDATE": "GAME",
+    "GAME_DELTA": "GAME",
+    "ROOM_LIST": "ROOM_LIST",
+    "LOBBY_PLAYERS": "LOBBY_PLAYERS",
+}
+
+# Kod zamknięcia dla klienta, który nie nadąża z odbiorem (policy violation).
+CLOSE_CODE_TOO_SLOW = 1008
+CLOSE_CODE_REPLACED = 4001  # miejsce gracza przejęło nowe połączenie (RESUME) - klient nie wznawia sam
+
+
+class OutboundQueue:
+    """
+    Ograniczona kolejka wychodząca jednego połączenia, opróżniana przez własny task.
+    Broadcasty tylko wrzucają tu gotowy tekst, więc wolny klient nie blokuje reszty pokoju.
+    """
+
+    def __init__(self, websocket, limit: int = DEFAULT_QUEUE_LIMIT,
+                 policy: OverflowPolicy = DEFAULT_OVERFLOW_POLICY, latency: Optional[LatencyHistogram] = None):
+        self.websocket = websocket
+        self.limit = limit
+        self.policy = policy
+        self.dropped = 0
+        self.closed = False
+        self.state_dropped = False  # wyrzucono stan gry - następny musi być pełny
+
+        # Opóźnienie "akcja gracza -> wysłany stan gry" (RoomManager.track_action ustawia początek)
+        self.latency = latency
+        self.action_started = None
+
+        self._pending = deque()  # (kind, text)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+
+    def put(self, text: str, kind: Optional[str] = None) -> bool:
+        if self.closed:
+            return False
+
+        if len(self._pending) >= self.limit and not self._make_room(kind):
+            logger.warning(f"Klient {self._peer()} nie nadąża ({len(self._pending)} wiadomości w kolejce) - rozłączam.")
+            metrics.send_failures.inc("slow_client")
+            self.disconnect()
+            return False
+
+        self._pending.append((kind, text))
+        self._wakeup.set()
+        return True
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _make_room(self, kind) -> bool:
+        group = SUPERSEDE_GROUPS.get(kind)
+        if self.policy != OverflowPolicy.DROP_SUPERSEDED or group is None:
+            return False
+        before = len(self._pending)
+        self._pending = deque(item for item in self._pending if SUPERSEDE_GROUPS.get(item[0]) != group)
+        dropped = before - len(self._pending)
+        self.dropped += dropped
+        if dropped:
+            metrics.messages_dropped.inc(amount=dropped)
+        if dropped and group == "GAME":
+            self.state_dropped = True
+        return len(self._pending) < self.limit
+
+    async def _writer(self):
+        try:
+            while True:
+                while not self._pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                kind, text = self._pending.popleft()
+                if isinstance(text, bytes):
+                    await self.websocket.send_bytes(text)
+                    metrics.sent_bytes.inc("msgpack", amount=len(text))
+                else:
+                    await self.websocket.send_text(text)
+                    metrics.sent_bytes.inc("json", amount=len(text))
+                if self.action_started is not None and SUPERSEDE_GROUPS.get(kind) == "GAME":
+                    if self.latency is not None:
+                        self.latency.observe(time.perf_counter() - self.action_started)
+                    self.action_started = None
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug(f"Wysyłka do {self._peer()} nieudana: {e}")
+            metrics.send_failures.inc("error")
+            self.closed = True
+            self._pending.clear()
+
+    def close(self):
+        self.closed = True
+        self._pending.clear()
+        self._task.cancel()
+
+    def disconnect(self, code: int = CLOSE_CODE_TOO_SLOW):
+        """Zamyka gniazdo; pętla odbiorcza w main dostanie WebSocketDisconnect i posprząta gracza."""
+        self.close()
+        asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def _peer(self):
+        client = getattr(self.websocket, 'client', None)
+        return f"{client.host}:{client.port}" if client else repr(self.websocket)
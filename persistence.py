@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from serialization import dumps
+from state_delta import diff_state, apply_ops
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join("data", "rooms.db")
+DEFAULT_FLUSH_INTERVAL = 0.5  # sekundy - tyle najwyżej tracimy przy awarii
+DEFAULT_SNAPSHOT_EVERY = 50  # wpisów dziennika na pokój, po których zapisujemy pełny snapshot
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (room TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS journal (id INTEGER PRIMARY KEY, room TEXT NOT NULL, ops TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS journal_room ON journal (room);
+"""
+
+
+class RoomStore:
+    """
+    Trwały zapis pokoi w SQLite (WAL): pełny snapshot pokoju co jakiś czas, a pomiędzy nimi dziennik
+    zmian (operacje diff_state na snapshot_state). Stan zbieramy na pętli zdarzeń raz na okno
+    (flush_interval), a zapis całej paczki - jedna transakcja, jeden fsync - robi osobny wątek.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 snapshot_every: int = DEFAULT_SNAPSHOT_EVERY):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="room-store")
+        self._rooms: Dict[str, object] = {}  # room_name -> GameEngine (wszystkie zapisywane pokoje)
+        self._dirty: Dict[str, object] = {}
+        self._forgotten = set()
+        self._persisted: Dict[str, dict] = {}  # room_name -> ostatnio zapisany snapshot_state
+        self._journal_len: Dict[str, int] = {}
+        self._flush_task = None
+        self._write_failed = False
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(SCHEMA)
+
+    def load(self) -> List[Tuple[str, dict, dict]]:
+        """Wszystkie zapisane pokoje naraz: [(nazwa, stan po dzienniku, stosy kart)]."""
+        started = time.perf_counter()
+        snapshots = {}
+        for room, data in self._conn.execute("SELECT room, data FROM snapshots"):
+            snapshots[room] = json.loads(data)
+        for room, ops in self._conn.execute("SELECT room, ops FROM journal ORDER BY id"):
+            snapshot = snapshots.get(room)
+            if snapshot:
+                snapshot["state"] = apply_ops(snapshot["state"], json.loads(ops))
+                self._journal_len[room] = self._journal_len.get(room, 0) + 1
+
+        result = []
+        for room, snapshot in snapshots.items():
+            self._persisted[room] = snapshot["state"]
+            result.append((room, snapshot["state"], snapshot["piles"]))
+        logger.info(f"Magazyn pokoi: wczytano {len(result)} pokoi w {time.perf_counter() - started:.2f}s.")
+        return result
+
+    def mark_dirty(self, room):
+        self._forgotten.discard(room.room_name)
+        self._rooms[room.room_name] = room
+        self._dirty[room.room_name] = room
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    def forget(self, room_name: str):
+        self._rooms.pop(room_name, None)
+        self._dirty.pop(room_name, None)
+        self._persisted.pop(room_name, None)
+        self._journal_len.pop(room_name, None)
+        self._forgotten.add(room_name)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.flush_interval)
+        finally:
+            self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        batch = self._collect()
+        if batch[0] or batch[1] or batch[2]:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write, batch)
+
+    def close(self):
+        """Ostatni zapis przy wyłączaniu serwera (synchronicznie)."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._conn is None:
+            return
+        self._executor.submit(self._write, self._collect())
+        self._executor.shutdown(wait=True)
+        self._conn.close()
+        self._conn = None
+
+    def _collect(self):
+        # Na pętli zdarzeń: tylko zrzut stanu do słowników i diff - zapis na dysk robi wątek
+        snapshots, journal = [], []
+        if self._write_failed:
+            # Poprzednia paczka przepadła - dziennik nie ma już wspólnej bazy, zapisujemy wszystko od nowa
+            self._write_failed = False
+            self._persisted.clear()
+            self._dirty = dict(self._rooms)
+        dirty, self._dirty = self._dirty, {}
+        forgotten, self._forgotten = list(self._forgotten), set()
+
+        for name, room in dirty.items():
+            state = room.snapshot_state()
+            prev = self._persisted.get(name)
+            # Nowe ziarno stosu = nowa baza stosu (przetasowane odrzucone), której dziennik nie niesie
+            if (prev is None or self._journal_len.get(name, 0) >= self.snapshot_every
+                    or prev.get("pile_seeds") != state["pile_seeds"]):
+                snapshots.append((name, dumps({"state": state, "piles": room.snapshot_piles()})))
+                self._journal_len[name] = 0
+            else:
+                ops = diff_state(prev, state)
+                if not ops:
+                    continue
+                journal.append((name, dumps(ops)))
+                self._journal_len[name] = self._journal_len.get(name, 0) + 1
+            self._persisted[name] = state
+        return snapshots, journal, forgotten
+
+    def _write(self, batch):
+        snapshots, journal, forgotten = batch
+        conn = self._conn
+        try:
+            conn.execute("BEGIN")
+            conn.executemany("DELETE FROM snapshots WHERE room = ?", [(n,) for n in forgotten])
+            conn.executemany("DELETE FROM journal WHERE room = ?",
+                             [(n,) for n, _ in snapshots] + [(n,) for n in forgotten])
+            conn.executemany("INSERT OR REPLACE INTO snapshots (room, data) VALUES (?, ?)", snapshots)
+            conn.executemany("INSERT INTO journal (room, ops) VALUES (?, ?)", journal)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            logger.exception("Magazyn pokoi: zapis nie powiódł się")
+            self._write_failed = True
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
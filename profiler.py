@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter
+from typing import Tuple
+
+DEFAULT_INTERVAL = 0.005  # sekundy między próbkami
+MIN_INTERVAL = 0.001
+MAX_SECONDS = 60
+
+_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Inny profil jest właśnie zbierany (naraz tylko jeden na proces)."""
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _stack(frame) -> Tuple[str, ...]:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return tuple(names)
+
+
+def _sample(thread_id: int, seconds: float, interval: float) -> Counter:
+    # Działa w osobnym wątku: co `interval` zagląda w bieżący stos wątku pętli zdarzeń
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stacks[_stack(frame)] += 1
+        del frame
+        time.sleep(interval)
+    return stacks
+
+
+def collapse(stacks: Counter, root: str = "") -> str:
+    """Format "collapsed stacks" (flamegraph.pl, speedscope): `ramka;ramka;... liczba_próbek`."""
+    prefix = f"{root};" if root else ""
+    lines = [f"{prefix}{';'.join(stack)} {count}" for stack, count in stacks.most_common()]
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+async def profile_loop(seconds: float, interval: float = DEFAULT_INTERVAL, root: str = "") -> str:
+    """
+    Próbkuje stos wątku, na którym działa bieżąca pętla zdarzeń, przez `seconds` sekund.
+    Pętla w tym czasie pracuje normalnie - próbki zbiera osobny wątek.
+    """
+    interval = max(interval, MIN_INTERVAL)
+    seconds = min(max(seconds, interval), MAX_SECONDS)
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        stacks = await asyncio.to_thread(_sample, threading.get_ident(), seconds, interval)
+    finally:
+        _lock.release()
+    return collapse(stacks, root)
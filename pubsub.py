@@ -0,0 +1,76 @@
+import time
+import logging
+from typing import Callable, Dict, Optional, Set
+
+import metrics
+from serialization import dumps, packb, json_to_msgpack, BINARY_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+LOBBY_TOPIC = "lobby"
+
+
+def room_topic(room_name: str) -> str:
+    return f"room:{room_name}"
+
+
+class PubSub:
+    """
+    Wewnętrzna szyna tematów. Zapis/wypis to O(1), a publish koduje wiadomość raz
+    i wrzuca ją tylko do kolejek subskrybentów danego tematu.
+    """
+
+    def __init__(self, send: Callable, binary_clients: Optional[Set] = None):
+        self._send = send  # send(ws, text, kind) - np. RoomManager.send
+        self._binary = binary_clients if binary_clients is not None else set()  # klienci "cah.msgpack"
+        self._topics: Dict[str, Dict[object, None]] = {}  # temat -> subskrybenci (w kolejności zapisu)
+        self._subscriptions: Dict[object, Set[str]] = {}  # ws -> tematy
+
+    def subscribe(self, ws, topic: str):
+        self._topics.setdefault(topic, {})[ws] = None
+        self._subscriptions.setdefault(ws, set()).add(topic)
+
+    def unsubscribe(self, ws, topic: str):
+        subscribers = self._topics.get(topic)
+        if subscribers is not None:
+            subscribers.pop(ws, None)
+            if not subscribers:
+                del self._topics[topic]
+        topics = self._subscriptions.get(ws)
+        if topics is not None:
+            topics.discard(topic)
+            if not topics:
+                del self._subscriptions[ws]
+
+    def unsubscribe_all(self, ws):
+        for topic in list(self._subscriptions.get(ws, ())):
+            self.unsubscribe(ws, topic)
+
+    def subscribers(self, topic: str):
+        return list(self._topics.get(topic, ()))
+
+    def count(self, topic: str) -> int:
+        return len(self._topics.get(topic, ()))
+
+    def publish(self, topic: str, message, kind: Optional[str] = None) -> int:
+        """Wysyła do wszystkich subskrybentów tematu. Zwraca liczbę odbiorców."""
+        subscribers = self._topics.get(topic)
+        if not subscribers:
+            return 0
+        started = time.perf_counter()
+        original = message
+        if isinstance(message, dict):
+            kind = message.get("type")
+            message = dumps(message)
+        packed = None  # wersja MessagePack - kodowana raz, tylko jeśli ktoś jej potrzebuje
+        binary = kind in BINARY_MESSAGES and self._binary
+        for ws in list(subscribers):
+            if binary and ws in self._binary:
+                if packed is None:
+                    packed = packb(original) if isinstance(original, dict) else json_to_msgpack(message)
+                self._send(ws, packed, kind)
+            else:
+                self._send(ws, message, kind)
+        metrics.broadcast_seconds.observe(time.perf_counter() - started, kind)
+        metrics.broadcast_recipients.observe(len(subscribers), kind)
+        return len(subscribers)
@@ -0,0 +1,129 @@
+import time
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+# Limit: (żetony na sekundę, pojemność kubełka). Klucz "*" = wszystkie wiadomości łącznie.
+Limit = Tuple[float, float]
+ANY = "*"
+
+ERR_RATE_LIMITED = "ERR_RATE_LIMITED"
+ERR_SERVER_FULL = "ERR_SERVER_FULL"
+ERR_TOO_MANY_CONNECTIONS = "ERR_TOO_MANY_CONNECTIONS"
+ERR_TOO_MANY_ROOMS = "ERR_TOO_MANY_ROOMS"
+
+# Kubełki adresu IP przeżywają jego ostatnie połączenie (inaczej reconnect zerowałby limit)
+IP_IDLE_SECONDS = 300
+PRUNE_EVERY = 1000  # co tyle nowych połączeń sprzątamy nieaktywne adresy
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class _Buckets:
+    """Kubełki jednego połączenia albo jednego adresu IP, tworzone przy pierwszej wiadomości danego typu."""
+    __slots__ = ('limits', 'buckets', 'refused')
+
+    def __init__(self, limits: Dict[str, Limit]):
+        self.limits = limits
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.refused = False  # ERR_RATE_LIMITED wysyłamy raz na serię odrzuconych wiadomości
+
+    def take(self, key: str, now: float) -> bool:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            limit = self.limits.get(key)
+            if limit is None:
+                return True
+            bucket = self.buckets[key] = TokenBucket(*limit, now)
+        return bucket.take(now)
+
+
+class RateLimiter:
+    """
+    Limity wiadomości od klientów (token bucket) - osobno na połączenie i na adres IP,
+    dla każdego typu wiadomości i dla wszystkich łącznie (ANY). Do tego limity połączeń
+    (łącznie na serwer i na jeden adres IP) i liczby pokoi.
+    """
+
+    def __init__(self, limits: Dict[str, Limit], ip_limits: Dict[str, Limit],
+                 max_connections: int, max_connections_per_ip: int, max_rooms: int):
+        self.limits = limits
+        self.ip_limits = ip_limits
+        self.max_connections = max_connections
+        self.max_connections_per_ip = max_connections_per_ip
+        self.max_rooms = max_rooms
+        self._connections: Dict[object, Tuple[str, _Buckets]] = {}  # ws -> (ip, kubełki)
+        self._ips: Dict[str, list] = {}  # ip -> [liczba połączeń, kubełki, ostatnia aktywność]
+        self._opened = 0
+
+    def open(self, websocket, ip: str) -> Optional[str]:
+        """
+        Rezerwuje miejsce dla nowego połączenia; kod błędu, jeśli go nie przyjmujemy, inaczej None.
+        Sprawdzenie i rezerwacja bez await pomiędzy - równoległe handshake'i nie przekroczą limitów.
+        Przyjęte połączenie trzeba potem zwolnić przez close().
+        """
+        if len(self._connections) >= self.max_connections:
+            metrics.connections_rejected.inc("server_full")
+            return ERR_SERVER_FULL
+        entry = self._ips.get(ip)
+        if entry and entry[0] >= self.max_connections_per_ip:
+            metrics.connections_rejected.inc("per_ip")
+            return ERR_TOO_MANY_CONNECTIONS
+
+        self._opened += 1
+        if self._opened % PRUNE_EVERY == 0:
+            self._prune(time.monotonic())
+        if entry is None:
+            entry = self._ips[ip] = [0, _Buckets(self.ip_limits), 0.0]
+        entry[0] += 1
+        self._connections[websocket] = (ip, _Buckets(self.limits))
+        return None
+
+    def close(self, websocket):
+        ip, _ = self._connections.pop(websocket, (None, None))
+        entry = self._ips.get(ip)
+        if entry:
+            entry[0] -= 1
+            entry[2] = time.monotonic()
+
+    def _prune(self, now: float):
+        idle = [ip for ip, entry in self._ips.items() if entry[0] <= 0 and now - entry[2] > IP_IDLE_SECONDS]
+        for ip in idle:
+            del self._ips[ip]
+
+    def check(self, websocket, message_type: Optional[str]) -> Tuple[bool, bool]:
+        """
+        (czy przepuścić wiadomość, czy odpowiedzieć ERR_RATE_LIMITED). Błąd wysyłamy tylko
+        przy pierwszej odrzuconej wiadomości z serii, żeby nie odpowiadać na każdy spam.
+        """
+        ip, own = self._connections[websocket]
+        per_ip = self._ips[ip][1]
+        now = time.monotonic()
+        kind = message_type if message_type in self.limits or message_type in self.ip_limits else ANY
+
+        for scope, buckets in (("connection", own), ("ip", per_ip)):
+            if not (buckets.take(ANY, now) and (kind == ANY or buckets.take(kind, now))):
+                metrics.rate_limited.inc(kind, scope)
+                notify, own.refused = not own.refused, True
+                return False, notify
+        own.refused = False
+        return True, False
+
+    def room_allowed(self, room_count: int) -> bool:
+        return room_count < self.max_rooms
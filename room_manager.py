@@ -1,55 +1,341 @@
 import os
 import glob
 import logging
-import random
 import time
+from collections import deque
+from functools import partial
 from typing import Dict, Optional
 from fastapi import WebSocket
 
-from game_engine import GameEngine
+from game_engine import GameEngine, VacantSeat
+from deck_registry import deck_registry
 from models import GameSettings
-from enums import Phase
+from enums import Phase, OverflowPolicy
 from locales import TEXTS
+from serialization import (dumps, dumps_fields, packb, pack_fields, pack_map, json_to_msgpack,
+                           BINARY_MESSAGES, SUBPROTOCOL_MSGPACK)
+from state_delta import diff_state
+from pubsub import PubSub, LOBBY_TOPIC, room_topic
+from sound_manifest import SoundManifest
+from timers import DeadlineScheduler
+from broadcast_scheduler import BroadcastScheduler, DEFAULT_BROADCAST_WINDOW
+from chat_log import ChatLog, DEFAULT_CHAT_WINDOW
+from outbound import OutboundQueue, DEFAULT_QUEUE_LIMIT, DEFAULT_OVERFLOW_POLICY, CLOSE_CODE_REPLACED
+from persistence import RoomStore
+from sessions import SessionSigner, DEFAULT_SESSION_GRACE, ERR_SESSION_EXPIRED
+import metrics
+import profiler
+from metrics import LatencyHistogram
 
 logger = logging.getLogger(__name__)
 
+# Tyle sekund po restarcie czekamy na powrót graczy do odtworzonych pokoi.
+VACANT_SEAT_GRACE = 120
+
+# Obsługa wiadomości dłuższa niż tyle sekund trafia do logu wolnych wiadomości (GET /admin/slow)
+DEFAULT_SLOW_MESSAGE_THRESHOLD = 0.05
+SLOW_MESSAGE_LOG_SIZE = 200
+
+# Akcje, dla których mierzymy czas do wysłania graczowi nowego stanu gry (/stats, loadtest.py)
+ACTION_MESSAGES = {'CREATE_ROOM', 'JOIN_ROOM', 'START_GAME', 'SUBMIT_CARDS', 'PICK_WINNER', 'PLAYER_READY'}
+
+# Typy obsługiwane przez MessageHandler - reszta trafia do metryk jako "unknown" (typ przysyła klient)
+CLIENT_MESSAGES = ACTION_MESSAGES | {'GET_ROOMS', 'GET_DECKS', 'SET_NICK', 'CHAT_MSG', 'LEAVE_ROOM',
+                                     'ENABLE_DELTAS', 'RESYNC', 'RESUME'}
+
+
+def message_label(message_type) -> str:
+    return message_type if message_type in CLIENT_MESSAGES else "unknown"
+
 
 class RoomManager:
-    def __init__(self):
+    def __init__(self, outbound_limit: int = DEFAULT_QUEUE_LIMIT,
+                 overflow_policy: OverflowPolicy = DEFAULT_OVERFLOW_POLICY,
+                 broadcast_window: float = DEFAULT_BROADCAST_WINDOW,
+                 store: Optional[RoomStore] = None,
+                 slow_message_threshold: float = DEFAULT_SLOW_MESSAGE_THRESHOLD,
+                 chat_window: float = DEFAULT_CHAT_WINDOW,
+                 session_grace: float = DEFAULT_SESSION_GRACE,
+                 session_secret: Optional[bytes] = None):
         self.rooms: Dict[str, GameEngine] = {}
         self.player_room_map: Dict[WebSocket, str] = {}
         self.active_connections: Dict[WebSocket, Optional[str]] = {}
+        self.deck_registry = deck_registry
+        self._room_snapshots: Dict[str, tuple] = {}  # room_name -> (room, state_version, stan, zakodowany fragment)
+
+        # Protokół delt: co ostatnio rozesłano w pokoju i jaką wersję ma każdy klient
+        self.delta_clients = set()
+        self._room_sent: Dict[str, tuple] = {}  # room_name -> (room, state_version, wspólny stan)
+        self._client_state: Dict[WebSocket, tuple] = {}  # ws -> (state_version, pola gracza, klucz pól)
+
+        # Klienci z podprotokołem "cah.msgpack": GAME_UPDATE i ROOM_LIST dostają binarnie
+        self.binary_clients = set()
+        self._room_packed: Dict[str, tuple] = {}  # room_name -> (room, state_version, liczba pól, fragment msgpack)
+
+        # Kolejki wychodzące - każde połączenie ma własny task wysyłający
+        self.outbound: Dict[WebSocket, OutboundQueue] = {}
+        self.outbound_limit = outbound_limit
+        self.overflow_policy = overflow_policy
+        self.action_latency = LatencyHistogram()
+
+        # Ostatnie wolne wiadomości: kto, w jakim pokoju, jaki typ i ile trwała obsługa
+        self.slow_message_threshold = slow_message_threshold
+        self.slow_messages = deque(maxlen=SLOW_MESSAGE_LOG_SIZE)
+
+        # Szyna tematów: "lobby" (połączenia poza pokojami) i "room:<nazwa>" (gracze pokoju)
+        self.bus = PubSub(self.send, self.binary_clients)
+
+        # Broadcasty stanu są łączone i wysyłane najwyżej raz na okno (schedule_*)
+        self.scheduler = BroadcastScheduler(self, broadcast_window)
+
+        # Czat: historia pokoi i lobby dla dołączających, linie z jednego okna łączone w CHAT_DIGEST
+        self.chat = ChatLog(self.bus, chat_window)
+
+        # Jeden zegar terminów faz (SELECTING/JUDGING/SUMMARY) dla wszystkich pokoi
+        self.deadlines = DeadlineScheduler()
+
+        # Dźwięki: manifest budowany raz przy starcie
+        self.sound_manifest = SoundManifest()
+
+        # Zapis pokoi na dysk (odtwarzane po restarcie); None = tylko w pamięci
+        self.store = store
+
+        # Wznawianie sesji: po zerwanym połączeniu miejsce gracza czeka session_grace sekund na RESUME
+        self.sessions = SessionSigner(session_secret)
+        self.session_grace = session_grace
 
         # Anti-spam dla lobby
         self.last_lobby_sound_time = 0
         self.lobby_sound_cooldown = 2.0  # sekundy
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
+    async def start(self):
+        if self.store:
+            self.store.open()
+            self.restore_rooms()
+
+    async def stop(self):
+        if self.store:
+            self.store.close()
+
+    def restore_rooms(self):
+        """Odtwarza pokoje zapisane przed restartem. Gracze odzyskują miejsca, dołączając z tym samym connection_id."""
+        for room_name, state, piles in self.store.load():
+            try:
+                engine = GameEngine.restore(state, piles, self.deck_registry)
+            except Exception:
+                logger.exception(f"Nie udało się odtworzyć pokoju '{room_name}'")
+                engine = None
+            if engine is None:
+                logger.warning(f"Pokój '{room_name}' nie został odtworzony (zmienione decki lub uszkodzony zapis).")
+                self.store.forget(room_name)
+                continue
+
+            self._register_room(engine)
+            engine.resume_deadlines()
+            # Kto nie wróci w VACANT_SEAT_GRACE, traci miejsce - jak po zerwanym połączeniu (_hold_seat)
+            for seat in engine.vacant_seats():
+                self.deadlines.schedule((engine, "seat", seat.connection_id), VACANT_SEAT_GRACE,
+                                        partial(self._drop_held_seat, engine, seat.connection_id))
+        self.schedule_room_list()
+
+    async def connect(self, websocket: WebSocket, subprotocol: Optional[str] = None):
+        await websocket.accept(subprotocol=subprotocol)
+        if subprotocol == SUBPROTOCOL_MSGPACK:
+            self.binary_clients.add(websocket)
         self.active_connections[websocket] = None
+        self.outbound[websocket] = OutboundQueue(websocket, self.outbound_limit, self.overflow_policy,
+                                                 self.action_latency)
+        self.bus.subscribe(websocket, LOBBY_TOPIC)
+        self.send(websocket, self.sound_manifest.message, "SOUND_MANIFEST")
+
+    async def handle_message(self, handler, data: dict, connection_id: str):
+        """Obsługa wiadomości od klienta (w trybie shardów nadpisywane - patrz sharding.py)."""
+        message_type = data.get('type')
+        self.track_action(handler.websocket, message_type)
+        metrics.messages_received.inc(message_label(message_type))
+        await self.timed_handle(handler, data, connection_id)
+
+    async def timed_handle(self, handler, data: dict, connection_id: str):
+        room_name = self.player_room_map.get(handler.websocket)
+        started = time.perf_counter()
+        try:
+            await handler.handle(data, connection_id)
+        finally:
+            elapsed = time.perf_counter() - started
+            label = message_label(data.get('type'))
+            metrics.message_seconds.observe(elapsed, label)
+            if elapsed >= self.slow_message_threshold:
+                # Pokój sprzed obsługi, a dla CREATE_ROOM/JOIN_ROOM - ten, do którego gracz właśnie wszedł
+                self._record_slow_message(handler.websocket, label, elapsed,
+                                          room_name or self.player_room_map.get(handler.websocket))
+
+    def _record_slow_message(self, websocket: WebSocket, message_type: str, elapsed: float,
+                             room_name: Optional[str]):
+        entry = {
+            "time": time.time(),
+            "type": message_type,
+            "room": room_name,
+            "nick": self.active_connections.get(websocket),
+            "ms": round(elapsed * 1000, 2),
+        }
+        self.slow_messages.append(entry)
+        metrics.slow_messages.inc(message_type)
+        logger.warning(f"Wolna wiadomość {message_type}: {entry['ms']} ms (pokój '{room_name}', gracz {entry['nick']})")
+
+    async def slow_message_report(self) -> list:
+        return list(self.slow_messages)
+
+    async def profile(self, seconds: float, interval: float = profiler.DEFAULT_INTERVAL) -> str:
+        """Próbkujący profiler pętli zdarzeń (GET /admin/profile) - wynik w formacie collapsed stacks."""
+        return await profiler.profile_loop(seconds, interval)
+
+    def track_action(self, websocket: WebSocket, message_type: Optional[str]):
+        if message_type in ACTION_MESSAGES:
+            queue = self.outbound.get(websocket)
+            if queue is not None:
+                queue.action_started = time.perf_counter()
+
+    def stats(self) -> dict:
+        rooms, _ = self._get_rooms_and_players()
+        return {
+            "connections": len(self.active_connections),
+            "rooms": len(rooms),
+            "action_latency": self.action_latency.summary(),
+            "broadcasts": self.scheduler.stats(),
+        }
+
+    def collect_metrics(self):
+        """Gauge dla GET /metrics - liczone dopiero przy odczycie (metrics.registry.add_collector)."""
+        metrics.connections.set(value=len(self.active_connections))
+        metrics.rooms.set(value=len(self.rooms))
+        per_phase = dict.fromkeys(Phase, 0)
+        for room in self.rooms.values():
+            per_phase[room.phase] += len(room.players_data)
+        for phase, count in per_phase.items():
+            metrics.players.set(phase.value, value=count)
+        metrics.action_latency.bind(self.action_latency)
+
+    async def metrics_text(self) -> str:
+        return metrics.registry.render()
+
+    def send(self, websocket: WebSocket, message, kind: Optional[str] = None):
+        """
+        Wrzuca wiadomość (dict, gotowy JSON albo gotowe bajty msgpack) do kolejki połączenia.
+        Nigdy nie czeka na klienta.
+        """
+        queue = self.outbound.get(websocket)
+        if queue is None:
+            return
+        if isinstance(message, dict):
+            kind = message.get("type")
+            message = packb(message) if self._wants_binary(websocket, kind) else dumps(message)
+        elif isinstance(message, str) and self._wants_binary(websocket, kind):
+            message = json_to_msgpack(message)  # gotowy JSON, np. z procesu sharda
+        queue.put(message, kind)
+
+    def _wants_binary(self, websocket: WebSocket, kind: Optional[str]) -> bool:
+        return kind in BINARY_MESSAGES and websocket in self.binary_clients
 
     async def remove_player(self, websocket: WebSocket, remove_connection: bool):
         nick = None
         if remove_connection:
             nick = self.active_connections.pop(websocket, None)
+            self._close_connection(websocket)
         else:
             nick = self.active_connections.get(websocket)
 
         room_name = self.player_room_map.pop(websocket, None)
         room = self.rooms.get(room_name) if room_name else None
-
-        if room and room.remove_player(websocket):
-            logger.info(f"Pokój '{room_name}' jest pusty. Usuwanie.")
-            del self.rooms[room_name]
-            await self.broadcast_room_list()
+        self._client_state.pop(websocket, None)
+        if room_name and not remove_connection:
+            self.bus.unsubscribe(websocket, room_topic(room_name))
+            self.bus.subscribe(websocket, LOBBY_TOPIC)
+
+        if room and remove_connection and self.session_grace > 0 and websocket in room.players_data:
+            self._hold_seat(room, websocket)
+        elif room and room.remove_player(websocket):
+            self._delete_room(room_name, room)
         elif room:
-            await self.broadcast_room_state(room_name)
+            self.schedule_room_state(room_name)
 
-        await self.broadcast_lobby_players()
+        self.schedule_lobby_players()
         # Jeśli gracz był w lobby (nie w pokoju) i miał nick -> dźwięk wyjścia
         if room_name is None and nick:
             await self.broadcast_lobby_sound("goodbye")
 
+    def _close_connection(self, websocket: WebSocket):
+        queue = self.outbound.pop(websocket, None)
+        if queue is not None: queue.close()
+        self.delta_clients.discard(websocket)
+        self.binary_clients.discard(websocket)
+        self.bus.unsubscribe_all(websocket)
+
+    def _hold_seat(self, room: GameEngine, websocket: WebSocket):
+        # Bez wyrzucania i broadcastów - dla reszty pokoju nic się nie zmienia, dopóki miejsce czeka na RESUME
+        seat = room.hold_seat(websocket)
+        self.deadlines.schedule((room, "seat", seat.connection_id), self.session_grace,
+                                partial(self._drop_held_seat, room, seat.connection_id))
+        metrics.sessions.inc("held")
+
+    async def _drop_held_seat(self, room: GameEngine, connection_id: str):
+        # Gracz nie wrócił w session_grace - dopiero teraz traci miejsce
+        seat = room.find_vacant_seat(connection_id)
+        if self.rooms.get(room.room_name) is not room or seat is None:
+            return
+        metrics.sessions.inc("expired")
+        if room.remove_player(seat):
+            self._delete_room(room.room_name, room)
+        else:
+            self.schedule_room_state(room.room_name)
+            self.schedule_room_count(room.room_name)
+
+    async def resume_session(self, websocket: WebSocket, token) -> str:
+        """RESUME: przepina miejsce wskazane tokenem na nowe połączenie. "OK" albo kod błędu."""
+        claims = self.sessions.verify(token)
+        room = self.rooms.get(claims[0]) if claims else None
+        seat = room.find_seat(claims[1]) if room else None
+        if seat is None or seat is websocket or websocket in self.player_room_map:
+            metrics.sessions.inc("rejected")
+            return ERR_SESSION_EXPIRED
+
+        if not isinstance(seat, VacantSeat):
+            # Stare połączenie jeszcze nie wie, że jest zerwane (czeka na timeout pingu) - przejmujemy miejsce
+            self._replace_connection(seat)
+            seat = room.hold_seat(seat)
+        self.deadlines.cancel((room, "seat", seat.connection_id))
+        room.take_seat(seat, websocket)
+
+        self.active_connections[websocket] = room.players_data[websocket]['nick']
+        self.player_room_map[websocket] = room.room_name
+        self.bus.unsubscribe(websocket, LOBBY_TOPIC)
+        self.bus.subscribe(websocket, room_topic(room.room_name))
+        metrics.sessions.inc("resumed")
+        return "OK"
+
+    def _replace_connection(self, websocket: WebSocket):
+        # Jego późniejsze rozłączenie nie dotyka już pokoju (nie ma go w player_room_map)
+        queue = self.outbound.get(websocket)
+        if queue is not None: queue.disconnect(CLOSE_CODE_REPLACED)
+        self.active_connections.pop(websocket, None)
+        self.player_room_map.pop(websocket, None)
+        self._client_state.pop(websocket, None)
+        self._close_connection(websocket)
+
+    def _delete_room(self, room_name: str, room: GameEngine):
+        logger.info(f"Pokój '{room_name}' jest pusty. Usuwanie.")
+        del self.rooms[room_name]
+        self.deadlines.cancel(room)
+        self._room_snapshots.pop(room_name, None)
+        self._room_packed.pop(room_name, None)
+        self._room_sent.pop(room_name, None)
+        self.chat.forget(room_topic(room_name))
+        if self.store:
+            self.store.forget(room_name)
+        self.schedule_room_list()
+
+    def room_count(self) -> int:
+        return len(self.rooms)
+
     def get_deck_list(self):
         files = glob.glob("decks/*.*")
         decks = set()
@@ -59,13 +345,28 @@ class RoomManager:
             decks.add(name)
         return list(decks)
 
+    def schedule_room_state(self, room_name: str):
+        self.scheduler.room_state(room_name)
+        # Każda zmiana stanu pokoju przechodzi tędy - przy okazji oznaczamy go do zapisu
+        if self.store and room_name in self.rooms:
+            self.store.mark_dirty(self.rooms[room_name])
+
+    def schedule_room_count(self, room_name: str):
+        self.scheduler.room_count(room_name)
+
+    def schedule_lobby_players(self):
+        self.scheduler.lobby_players()
+
+    def schedule_room_list(self):
+        self.scheduler.room_list()
+
     async def broadcast_room_count(self, room_name: str):
         """Send a minimal update about a single room to lobby clients only."""
         room = self.rooms.get(room_name)
         if not room:
             return
 
-        payload = {
+        self.bus.publish(LOBBY_TOPIC, {
             "type": "ROOM_UPDATE",
             "room": {
                 "name": room_name,
@@ -73,14 +374,7 @@ class RoomManager:
                 "max": room.settings.max_players,
                 "has_password": room.settings.has_password()
             }
-        }
-
-        for ws, nick in list(self.active_connections.items()):
-            try:
-                if self.player_room_map.get(ws) is None:
-                    await ws.send_json(payload)
-            except Exception:
-                pass
+        })
 
     async def broadcast_lobby_players(self):
         """Send current list of connected players (with room info) to lobby clients."""
@@ -89,63 +383,191 @@ class RoomManager:
             'room': self.player_room_map.get(ws)
         } for ws, nick in self.active_connections.items() if nick]
 
-        payload = {"type": "LOBBY_PLAYERS", "players": players_list}
-
-        for ws, _ in list(self.active_connections.items()):
-            try:
-                if not self.player_room_map.get(ws):
-                    await ws.send_json(payload)
-            except Exception:
-                pass
+        self.bus.publish(LOBBY_TOPIC, {"type": "LOBBY_PLAYERS", "players": players_list})
 
     def create_room(self, owner_name: str, settings: GameSettings):
         if settings.name in self.rooms:
             return False
         
-        engine = GameEngine(owner_name, settings)
-        engine.broadcast_callback = self.broadcast_room_state
+        self._register_room(GameEngine(owner_name, settings, self.deck_registry))
+        return True
+
+    def _register_room(self, engine: GameEngine):
+        engine.broadcast_callback = self.schedule_room_state
         engine.sound_callback = self.broadcast_sound_to_room
+        engine.chat_callback = self.send_room_chat
+        engine.deadlines = self.deadlines
 
-        self.rooms[settings.name] = engine
-        return True
+        self.rooms[engine.room_name] = engine
 
-    async def join_room(self, websocket, room_name, password, connection_id):
+    async def join_room(self, websocket, room_name, password, connection_id, rejoin_id=None):
         room = self.rooms.get(room_name)
         if not room: return TEXTS["ERR_NO_ROOM"]
 
-        if not room.is_password_correct(password):
+        # Powrót po restarcie serwera: gracz odzyskuje swoje miejsce (hasło i limit już raz sprawdzone).
+        # Miejsca trzymane po zerwanym połączeniu odzyskuje się tylko przez RESUME z podpisanym tokenem.
+        seat = room.find_restored_seat(rejoin_id) if rejoin_id else None
+
+        if not seat and not room.is_password_correct(password):
             return TEXTS["ERR_WRONG_PASS"]
 
-        if len(room.players_data) >= room.settings.max_players:
+        if not seat and len(room.players_data) >= room.settings.max_players:
             return TEXTS["ERR_ROOM_FULL"]
 
         nick = self.active_connections.get(websocket)
         if not nick:
             return "ERR_NO_NICK"
         self.player_room_map[websocket] = room_name
-        room.add_player(websocket, nick, connection_id)
+        self.bus.unsubscribe(websocket, LOBBY_TOPIC)
+        self.bus.subscribe(websocket, room_topic(room_name))
+        if seat:
+            room.take_seat(seat, websocket)
+        else:
+            room.add_player(websocket, nick, connection_id)
         return "OK"
 
+    def send_room_chat(self, room_name: str, message: str, author: str = TEXTS["MSG_SYSTEM"]):
+        self.chat.post(room_topic(room_name), author, message)
+
+    def send_chat_history(self, websocket: WebSocket, topic: str):
+        """Ostatnie linie czatu pokoju / lobby jedną wiadomością (nic, jeśli czat jest pusty)."""
+        message = self.chat.history_message(topic)
+        if message["lines"]:
+            self.send(websocket, message)
+
     async def send_room_list(self, websocket):
         rooms, players = self._get_rooms_and_players()
         
-        await websocket.send_json({"type": "ROOM_LIST", "rooms": rooms, "players": players})
+        self.send(websocket, {"type": "ROOM_LIST", "rooms": rooms, "players": players})
 
     async def broadcast_room_list(self):
         # Full room list is intended only for lobby clients.
+        if not self.bus.count(LOBBY_TOPIC):
+            return
         rooms, players = self._get_rooms_and_players()
-
-        for ws in list(self.active_connections.keys()):
-            try:
-                if self.player_room_map.get(ws) is None:
-                    await ws.send_json({"type": "ROOM_LIST", "rooms": rooms, "players": players})
-            except Exception:
-                pass
+        self.bus.publish(LOBBY_TOPIC, {"type": "ROOM_LIST", "rooms": rooms, "players": players})
 
     async def broadcast_room_state(self, room_name):
+        """
+        Wysyła stan pokoju. Klienci z włączonymi deltami (ENABLE_DELTAS), którzy mają poprzednią
+        wersję, dostają GAME_DELTA; pozostali pełny GAME_UPDATE z numerem wersji "v".
+        Pola gracza budujemy i porównujemy tylko wtedy, gdy zmienił się ich klucz (_player_key) -
+        przy typowej zmianie (ktoś kliknął "gotowy") większość graczy dostaje tę samą, raz
+        zakodowaną deltę części wspólnej.
+        """
         room = self.rooms.get(room_name)
         if not room: return
 
+        started = time.perf_counter()
+        version, shared_state, shared = self._get_room_snapshot(room)
+        prev = self._room_sent.get(room_name)
+        prev_version = prev[1] if prev and prev[0] is room else None
+        if prev_version == version:
+            shared_ops = ''
+        elif prev_version is not None:
+            shared_ops = dumps(diff_state(prev[2], shared_state))[1:-1]
+        else:
+            shared_ops = None
+
+        shared_delta = None  # GAME_DELTA dla graczy bez zmian we własnych polach - taki sam dla wszystkich
+        for ws in list(room.players_data):
+            known = self._client_state.get(ws)
+            queue = self.outbound.get(ws)
+            if queue is None:
+                continue
+            key = self._player_key(room, ws)
+
+            if known and shared_ops is not None and known[0] == prev_version and not queue.state_dropped:
+                if known[0] == version:
+                    continue
+                if key == known[2]:
+                    fields = known[1]
+                    if shared_delta is None:
+                        shared_delta = f'{{"type":"GAME_DELTA","v":{version},"base":{prev_version},"ops":[{shared_ops}]}}'
+                    queue.put(shared_delta, "GAME_DELTA")
+                else:
+                    fields = self._player_view(room, ws, key)
+                    ops = dumps(diff_state(known[1], fields))[1:-1]
+                    ops = f'{shared_ops},{ops}' if shared_ops and ops else shared_ops or ops
+                    queue.put(f'{{"type":"GAME_DELTA","v":{version},"base":{known[0]},"ops":[{ops}]}}', "GAME_DELTA")
+            elif not known or known[0] != version or queue.state_dropped:
+                fields = self._player_view(room, ws, key)
+                self._send_full_state(ws, room, version, fields, shared)
+            else:
+                continue
+            if ws in self.delta_clients:
+                self._client_state[ws] = (version, fields, key)
+
+        self._room_sent[room_name] = (room, version, shared_state)
+        metrics.broadcast_seconds.observe(time.perf_counter() - started, "GAME_STATE")
+        metrics.broadcast_recipients.observe(len(room.players_data), "GAME_STATE")
+
+    def send_room_state_to(self, websocket: WebSocket):
+        """Pełny stan pokoju tylko dla jednego klienta (dołączenie / RESYNC po wykryciu luki w wersjach)."""
+        room = self.rooms.get(self.player_room_map.get(websocket))
+        if not room or websocket not in room.players_data:
+            return
+        version, _, shared = self._get_room_snapshot(room)
+        key = self._player_key(room, websocket)
+        fields = self._player_view(room, websocket, key)
+        self._send_full_state(websocket, room, version, fields, shared)
+        if websocket in self.delta_clients:
+            self._client_state[websocket] = (version, fields, key)
+
+    def _send_full_state(self, ws, room: GameEngine, version, fields, shared):
+        # Część wspólna jest zakodowana raz, tu doklejamy tylko pola gracza.
+        queue = self.outbound.get(ws)
+        if queue is None:
+            return
+        if ws in self.binary_clients:
+            count, packed = self._get_room_packed(room)
+            head = {"type": "GAME_UPDATE", "v": version}
+            queue.put(pack_map(len(head) + len(fields) + count, pack_fields(head), pack_fields(fields), packed),
+                      "GAME_UPDATE")
+        else:
+            queue.put(f'{{"type":"GAME_UPDATE","v":{version},{dumps_fields(fields)},{shared}}}', "GAME_UPDATE")
+        queue.state_dropped = False
+
+    def _get_room_packed(self, room: GameEngine):
+        """Część wspólna GAME_UPDATE w MessagePack - jak _get_room_snapshot, raz na wersję stanu."""
+        cached = self._room_packed.get(room.room_name)
+        if cached and cached[0] is room and cached[1] == room.state_version:
+            return cached[2:]
+        _, shared_state, _ = self._get_room_snapshot(room)
+        packed = pack_fields(shared_state)
+        self._room_packed[room.room_name] = (room, room.state_version, len(shared_state), packed)
+        return len(shared_state), packed
+
+    @staticmethod
+    def _player_key(room: GameEngine, ws) -> tuple:
+        """Wszystko, od czego zależą pola gracza - tanie do policzenia; ten sam klucz = te same pola."""
+        player = room.players_data[ws]
+        return (
+            room.white_deck_master,  # teksty kart w ręce (nowy deck po uploadzie = nowe teksty)
+            tuple(player['hand']),
+            ws == room.czar_socket,
+            ws in room.round_submissions,
+            ws in room.ready_players,
+            room.phase == Phase.LOBBY and len(room.players_data) > 1 and room.can_start_game(player['nick']),
+        )
+
+    @staticmethod
+    def _player_view(room: GameEngine, ws, key: tuple) -> dict:
+        _, hand, is_czar, has_submitted, am_i_ready, can_start_game = key
+        return {
+            "hand": [{"id": cid, "text": room.get_white_card(cid).get_nominative()} for cid in hand],
+            "is_czar": is_czar,
+            "has_submitted": has_submitted,
+            "am_i_ready": am_i_ready,
+            "can_start_game": can_start_game,
+        }
+
+    def _get_room_snapshot(self, room: GameEngine):
+        """Wspólna część GAME_UPDATE (słownik + zakodowany fragment), budowana raz na wersję stanu pokoju."""
+        cached = self._room_snapshots.get(room.room_name)
+        if cached and cached[0] is room and cached[1] == room.state_version:
+            return cached[1:]
+
         black_card_data = None
         if room.current_black_card:
             black_card_data = {
@@ -155,47 +577,32 @@ class RoomManager:
 
         submissions_data = []
         if room.phase in [Phase.JUDGING, Phase.SUMMARY]:
-            for i, (ws, cards) in enumerate(room.judging_order):
-                full_text = room.current_black_card.fill_blanks(cards)
-                entry = {"id": i, "full_text": full_text}
+            texts = room.get_submission_texts()
+            for i, (ws, _) in enumerate(room.judging_order):
+                entry = {"id": i, "full_text": texts[i]}
                 if room.phase == Phase.SUMMARY:
                     entry['author'] = room.players_data.get(ws, {}).get('nick', '???')
                     entry['is_winner'] = (i == room.winning_submission_index)
                 submissions_data.append(entry)
 
-        relevant = [s for s, p in room.players_data.items() if len(p['hand']) > 0]
-        if not relevant: relevant = list(room.players_data.keys())
-        ready_count = len([s for s in room.ready_players if s in relevant])
+        ready_count, relevant_count = room.ready_status()
 
         players_list = [{
-            "nick": p['nick'], "score": p['score'], "is_czar": (ws == room.czar_socket), "id": p['id']
+            "nick": p['nick'], "score": p['score'], "is_czar": (ws == room.czar_socket), "id": p['public_id']
         } for ws, p in room.players_data.items()]
 
-        for ws in list(room.players_data.keys()):
-            try:
-                player = room.players_data.get(ws, {})
-                hand = player.get('hand', [])
-                nick = player.get('nick', '')
-                hand_data = [{"id": c.id, "text": c.get_nominative()} for c in hand]
-                can_start_game = room.phase == Phase.LOBBY and len(room.players_data) > 1 and room.can_start_game(nick)
-                
-                await ws.send_json({
-                    "type": "GAME_UPDATE",
-                    "phase": room.phase.value,
-                    "black_card": black_card_data,
-                    "hand": hand_data,
-                    "is_czar": (ws == room.czar_socket),
-                    "submissions": submissions_data,
-                    "has_submitted": (ws in room.round_submissions),
-                    "ready_status": {"ready": ready_count, "total": len(relevant)},
-                    "am_i_ready": (ws in room.ready_players),
-                    "players_list": players_list,
-                    "winner": room.winner_nick,
-                    "room_name": room_name,
-                    "can_start_game": can_start_game
-                })
-            except Exception:
-                pass
+        shared_state = {
+            "phase": room.phase.value,
+            "black_card": black_card_data,
+            "submissions": submissions_data,
+            "ready_status": {"ready": ready_count, "total": relevant_count},
+            "players_list": players_list,
+            "winner": room.winner_nick,
+            "room_name": room.room_name,
+        }
+        shared = dumps_fields(shared_state)
+        self._room_snapshots[room.room_name] = (room, room.state_version, shared_state, shared)
+        return room.state_version, shared_state, shared
 
     def _get_rooms_and_players(self):
         rooms_list = [{
@@ -212,24 +619,22 @@ class RoomManager:
 
         return rooms_list, players_list
 
-        # --- SOUND SYSTEM ---
-
-    def _get_random_sound_file(self, prefix: str) -> Optional[str]:
-        """Skanuje static/sounds w poszukiwaniu plików pasujących do prefixu i losuje jeden."""
-        # Szukamy plików zaczynających się od prefixu (np. welcome*)
-        search_pattern = os.path.join("static", "sounds", f"{prefix}*")
-        files = glob.glob(search_pattern)
+    # --- SOUND SYSTEM ---
 
-        # Filtrujemy tylko audio
-        valid_exts = {'.mp3', '.wav', '.ogg', '.m4a'}
-        audio_files = [f for f in files if os.path.splitext(f)[1].lower() in valid_exts]
+    def _get_random_sound(self, prefix: str) -> Optional[int]:
+        """Losuje indeks dźwięku z manifestu (bez dotykania dysku)."""
+        if self.sound_manifest.check_for_changes():
+            self._send_sound_manifest_to_all()
+        return self.sound_manifest.pick(prefix)
 
-        if not audio_files:
-            return None
+    def reload_sounds(self):
+        """Ręczne przeskanowanie katalogu z dźwiękami (np. po SIGHUP)."""
+        if self.sound_manifest.rescan():
+            self._send_sound_manifest_to_all()
 
-        selected = random.choice(audio_files)
-        # Zamieniamy ścieżkę na URL (np. static/sounds/welcome1.mp3 -> /static/sounds/welcome1.mp3)
-        return "/" + selected.replace(os.sep, "/")
+    def _send_sound_manifest_to_all(self):
+        for ws in list(self.active_connections):
+            self.send(ws, self.sound_manifest.message, "SOUND_MANIFEST")
 
     async def broadcast_lobby_sound(self, prefix: str):
         """Odtwarza dźwięk wszystkim w lobby (z anty-spamem)."""
@@ -237,32 +642,18 @@ class RoomManager:
         if now - self.last_lobby_sound_time < self.lobby_sound_cooldown:
             return
 
-        sound_src = self._get_random_sound_file(prefix)
-        if not sound_src:
+        sound = self._get_random_sound(prefix)
+        if sound is None:
             return
 
         self.last_lobby_sound_time = now
-        payload = {"type": "PLAY_SOUND", "src": sound_src}
-
-        for ws in list(self.active_connections.keys()):
-            # Tylko gracze, którzy nie są w żadnym pokoju
-            if self.player_room_map.get(ws) is None:
-                try:
-                    await ws.send_json(payload)
-                except Exception:
-                    pass
+        # Tylko gracze, którzy nie są w żadnym pokoju
+        self.bus.publish(LOBBY_TOPIC, {"type": "PLAY_SOUND", "i": sound})
 
     async def broadcast_sound_to_room(self, room_name: str, prefix: str):
         """Odtwarza dźwięk wszystkim w danym pokoju."""
-        sound_src = self._get_random_sound_file(prefix)
-        if not sound_src:
+        sound = self._get_random_sound(prefix)
+        if sound is None:
             return
 
-        payload = {"type": "PLAY_SOUND", "src": sound_src}
-        room = self.rooms.get(room_name)
-        if room:
-            for ws in list(room.players_data):
-                try:
-                    await ws.send_json(payload)
-                except Exception:
-                    pass
\ No newline at end of file
+        self.bus.publish(room_topic(room_name), {"type": "PLAY_SOUND", "i": sound})
\ No newline at end of file
@@ -1,3 +1,4 @@
+import os
 import uvicorn
 import multiprocessing
 import time
@@ -8,7 +9,44 @@ from bot import start_bot_process
 # --- KONFIGURACJA ---
 HOST = "0.0.0.0"
 PORT = 2137
-RELOAD = True
+# Auto-reload przy zmianie kodu (tryb deweloperski). Wyłącz: CAH_RELOAD=0
+RELOAD = os.environ.get("CAH_RELOAD", "1") != "0"
+# Liczba procesów z pokojami (1 = wszystko w jednym procesie, jak dotąd)
+SHARDS = int(os.environ.get("CAH_SHARDS", "1"))
+# Zapis pokoi na dysk, żeby przetrwały restart (pusty = wyłączony)
+ROOMS_DB = os.environ.get("CAH_ROOMS_DB", os.path.join("data", "rooms.db"))
+# Obsługa wiadomości dłuższa niż tyle ms trafia do logu wolnych wiadomości
+SLOW_MESSAGE_MS = float(os.environ.get("CAH_SLOW_MESSAGE_MS", "50"))
+# Token do endpointów /admin/* (nagłówek X-Admin-Token); pusty = endpointy wyłączone
+ADMIN_TOKEN = os.environ.get("CAH_ADMIN_TOKEN", "")
+# Sprawdzanie decków przy starcie: strict = błędny deck zatrzymuje start, warn = tylko log, off = wyłączone
+DECK_PREFLIGHT = os.environ.get("CAH_DECK_PREFLIGHT", "strict")
+# Kompresja permessage-deflate dla WebSocketów (wyłącz: CAH_WS_DEFLATE=0, np. gdy kompresuje proxy)
+WS_DEFLATE = os.environ.get("CAH_WS_DEFLATE", "1") != "0"
+# Ile sekund miejsce gracza czeka na RESUME po zerwanym połączeniu (0 = od razu wyrzucamy, jak dawniej)
+SESSION_GRACE = float(os.environ.get("CAH_SESSION_GRACE", "60"))
+# Sekret podpisu tokenów sesji; pusty = losowany przy starcie (tokeny nie przeżyją restartu)
+SESSION_SECRET = os.environ.get("CAH_SESSION_SECRET", "")
+# Limity wiadomości (token bucket): typ -> (wiadomości na sekundę, zapas); "*" = wszystkie typy łącznie.
+# Wyłączenie wszystkich limitów (np. loadtest.py z jednego adresu): CAH_RATE_LIMITS=0
+RATE_LIMITS_ENABLED = os.environ.get("CAH_RATE_LIMITS", "1") != "0"
+RATE_LIMITS = {  # na jedno połączenie
+    "*": (20, 40),
+    "CHAT_MSG": (1, 5),
+    "CREATE_ROOM": (0.2, 3),
+    "JOIN_ROOM": (1, 5),
+    "GET_ROOMS": (1, 5),
+    "GET_DECKS": (0.5, 3),
+    "SET_NICK": (0.5, 3),
+}
+IP_RATE_LIMITS = {  # na jeden adres IP, wszystkie jego połączenia razem
+    "*": (200, 400),
+    "CHAT_MSG": (5, 20),
+    "CREATE_ROOM": (0.5, 5),
+}
+MAX_CONNECTIONS = int(os.environ.get("CAH_MAX_CONNECTIONS", "5000"))
+MAX_CONNECTIONS_PER_IP = int(os.environ.get("CAH_MAX_CONNECTIONS_PER_IP", "50"))
+MAX_ROOMS = int(os.environ.get("CAH_MAX_ROOMS", "500"))
 NUM_BOTS = 3  # <-- TUTAJ USTALASZ LICZBĘ BOTÓW
 # Auto-refresh interval for lobby (seconds)
 LOBBY_REFRESH = 3
@@ -55,6 +93,7 @@ if __name__ == "__main__":
             host=HOST,
             port=PORT,
             reload=RELOAD,
+            ws_per_message_deflate=WS_DEFLATE,
             log_level="warning"  # Mniej logów z uvicorna, żeby widzieć logi botów
         )
     except KeyboardInterrupt:
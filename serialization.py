@@ -0,0 +1,73 @@
+import json
+from typing import Optional
+
+# orjson jest opcjonalny - jeśli go nie ma, używamy kompaktowego enkodera z biblioteki standardowej.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def dumps(obj) -> str:
+    """Szybkie, kompaktowe kodowanie JSON do str (gotowe do ws.send_text)."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return _encoder.encode(obj)
+
+
+def dumps_fields(obj: dict) -> str:
+    """Koduje słownik jako fragment JSON bez klamer, do sklejania z innymi polami."""
+    return dumps(obj)[1:-1]
+
+
+# --- MessagePack (podprotokół "cah.msgpack") ---
+
+# msgpack też jest opcjonalny - bez niego serwer wybiera "cah.json" i wszystko leci tekstem jak dotąd.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+SUBPROTOCOL_MSGPACK = "cah.msgpack"
+SUBPROTOCOL_JSON = "cah.json"
+
+# Duże, częste wiadomości, które klienci "cah.msgpack" dostają binarnie; reszta zostaje tekstem JSON
+BINARY_MESSAGES = {"GAME_UPDATE", "ROOM_LIST"}
+
+
+def choose_subprotocol(offered) -> Optional[str]:
+    """Podprotokół dla połączenia. Przeglądarka zrywa połączenie, jeśli nie wybierzemy żadnego z podanych."""
+    if SUBPROTOCOL_MSGPACK in offered and msgpack is not None:
+        return SUBPROTOCOL_MSGPACK
+    if SUBPROTOCOL_JSON in offered:
+        return SUBPROTOCOL_JSON
+    return None
+
+
+def packb(obj) -> bytes:
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def _map_header(count: int) -> bytes:
+    if count < 16:
+        return bytes((0x80 | count,))
+    if count < 65536:
+        return b"\xde" + count.to_bytes(2, "big")
+    return b"\xdf" + count.to_bytes(4, "big")
+
+
+def pack_fields(obj: dict) -> bytes:
+    """Pary klucz-wartość słownika bez nagłówka mapy - odpowiednik dumps_fields do sklejania (pack_map)."""
+    return packb(obj)[len(_map_header(len(obj))):]
+
+
+def pack_map(count: int, *fragments: bytes) -> bytes:
+    """Mapa z `count` parami sklejona z fragmentów pack_fields."""
+    return _map_header(count) + b"".join(fragments)
+
+
+def json_to_msgpack(text: str) -> bytes:
+    """Przekodowanie gotowego JSON-a (np. stan z procesu sharda) - wolniejsze niż pakowanie od razu."""
+    return packb(orjson.loads(text) if orjson is not None else json.loads(text))
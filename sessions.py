@@ -0,0 +1,71 @@
+"""
+Tokeny wznowienia sesji: gracz dostaje token przy wejściu do pokoju (JOIN_ROOM_OK), a po zerwanym
+połączeniu wysyła go w RESUME z nowego gniazda. Do tego czasu serwer trzyma jego miejsce
+(ręka, punkty, car) przez okres łaski - bez wyrzucania z pokoju i bez broadcastów.
+
+Token to podpisane HMAC-SHA256 (nazwa pokoju, connection_id miejsca). Nie wygasa sam - ważny jest,
+dopóki istnieje miejsce, które wskazuje.
+"""
+import hmac
+import json
+import base64
+import hashlib
+import secrets
+from typing import Optional, Tuple
+
+DEFAULT_SESSION_GRACE = 60  # sekundy trzymania miejsca po zerwaniu połączenia; 0 = od razu wyrzucamy
+SIGNATURE_BYTES = 16
+PUBLIC_ID_CHARS = 16
+
+ERR_SESSION_EXPIRED = "ERR_SESSION_EXPIRED"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def public_id(connection_id: str) -> str:
+    """
+    Identyfikator gracza widoczny dla innych (players_list). connection_id zna tylko sam gracz -
+    z nim można zająć odtworzone po restarcie miejsce, więc nie rozsyłamy go po pokoju.
+    """
+    return hashlib.sha256(connection_id.encode("utf-8")).hexdigest()[:PUBLIC_ID_CHARS]
+
+
+class SessionSigner:
+    """
+    Wystawia i sprawdza tokeny. Sekret musi być ten sam w bramce i shardach; bez CAH_SESSION_SECRET
+    jest losowany przy starcie, więc tokeny nie przeżywają restartu serwera.
+    """
+
+    def __init__(self, secret: Optional[bytes] = None):
+        self.secret = secret or secrets.token_bytes(32)
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self.secret, payload, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+    def issue(self, room_name: str, connection_id: str) -> str:
+        payload = json.dumps([room_name, connection_id], separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return f"{_b64encode(payload)}.{_b64encode(self._sign(payload))}"
+
+    def verify(self, token) -> Optional[Tuple[str, str]]:
+        """(nazwa pokoju, connection_id) z poprawnego tokenu, inaczej None."""
+        if not isinstance(token, str) or token.count(".") != 1:
+            return None
+        payload_part, signature_part = token.split(".")
+        try:
+            payload = _b64decode(payload_part)
+            signature = _b64decode(signature_part)
+        except ValueError:
+            return None
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        try:
+            room_name, connection_id = json.loads(payload)
+        except (ValueError, TypeError):
+            return None
+        return room_name, connection_id
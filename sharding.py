@@ -0,0 +1,502 @@
+import os
+import json
+import bisect
+import socket
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+from typing import Dict, Optional
+
+from fastapi import WebSocket
+
+import metrics
+import profiler
+from room_manager import RoomManager, message_label, DEFAULT_SLOW_MESSAGE_THRESHOLD
+from message_handler import MessageHandler
+from pubsub import PubSub, LOBBY_TOPIC, room_topic
+from persistence import RoomStore
+from serialization import dumps
+from sessions import DEFAULT_SESSION_GRACE
+
+logger = logging.getLogger(__name__)
+
+# Wiadomości obsługiwane zawsze przez bramkę (lobby), nawet gdy gracz siedzi w pokoju na shardzie.
+GATEWAY_MESSAGES = {'GET_ROOMS', 'GET_DECKS', 'SET_NICK'}
+
+# Tyle czekamy na metryki z shardów przy GET /metrics; kto nie zdąży, nie trafia do tego odczytu.
+METRICS_TIMEOUT = 1.0
+
+
+class HashRing:
+    """Spójne haszowanie nazw pokoi na shardy (wirtualne węzły, żeby rozkład był równy)."""
+
+    def __init__(self, nodes, replicas: int = 64):
+        self._ring = sorted((self._hash(f"{node}:{i}"), node) for node in nodes for i in range(replicas))
+        self._keys = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def get(self, key: str):
+        i = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._ring[i][1]
+
+
+# --- Ramki między bramką a shardami: 4 bajty długości + lista JSON ---
+
+def encode_frame(frame: list) -> bytes:
+    payload = dumps(frame).encode('utf-8')
+    return len(payload).to_bytes(4, 'big') + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[list]:
+    try:
+        header = await reader.readexactly(4)
+        return json.loads(await reader.readexactly(int.from_bytes(header, 'big')))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+
+
+# --- Strona sharda ---
+
+class RemoteSocket:
+    """Zastępca WebSocketa w shardzie - prawdziwe połączenie trzyma bramka."""
+
+    def __init__(self, connection_id: str):
+        self.connection_id = connection_id
+
+    def __repr__(self):
+        return f"RemoteSocket({self.connection_id})"
+
+
+class RemoteQueue:
+    """Kolejka wychodząca sharda: każdą wiadomość od razu przekazuje do bramki (tam jest prawdziwa kolejka)."""
+
+    def __init__(self, link, connection_id: str):
+        self.link = link
+        self.connection_id = connection_id
+        self.state_dropped = False  # wyrzucenia stanu obsługuje kolejka bramki + RESYNC klienta
+
+    def put(self, text: str, kind: Optional[str] = None) -> bool:
+        self.link.emit(["send", self.connection_id, text, kind])
+        return True
+
+    def close(self):
+        pass
+
+
+class RemotePubSub(PubSub):
+    """Publikacja do tematu to jedna ramka do bramki - ona zna prawdziwych subskrybentów."""
+
+    def __init__(self, link):
+        super().__init__(send=None)
+        self.link = link
+
+    def publish(self, topic: str, message, kind: Optional[str] = None) -> int:
+        if isinstance(message, dict):
+            kind = message.get("type")
+            message = dumps(message)
+        self.link.emit(["publish", topic, message, kind])
+        return self.count(topic)
+
+
+class ShardLink:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    def emit(self, frame: list):
+        # Lokalne gniazdo - bufor transportu wystarcza, nie czekamy na drain()
+        if not self.writer.is_closing():
+            self.writer.write(encode_frame(frame))
+
+
+class ShardRoomManager(RoomManager):
+    """
+    RoomManager w procesie sharda: trzyma tylko swoje pokoje. Stan lobby, dźwięki
+    i prawdziwe połączenia należą do bramki, więc te części zamieniamy na ramki do niej.
+    """
+
+    def __init__(self, index: int, link: ShardLink, store: Optional[RoomStore] = None, **kwargs):
+        super().__init__(store=store, **kwargs)
+        self.index = index
+        self.link = link
+        self.bus = RemotePubSub(link)
+        self.chat.bus = self.bus
+        self.handlers: Dict[str, MessageHandler] = {}  # connection_id -> handler
+
+    def attach(self, connection_id: str, nick: Optional[str], deltas: bool):
+        ws = RemoteSocket(connection_id)
+        self.active_connections[ws] = nick
+        self.outbound[ws] = RemoteQueue(self.link, connection_id)
+        self.bus.subscribe(ws, LOBBY_TOPIC)
+        if deltas:
+            self.delta_clients.add(ws)
+        self.handlers[connection_id] = MessageHandler(self, ws)
+
+    async def on_message(self, connection_id: str, data: dict):
+        handler = self.handlers.get(connection_id)
+        if handler is None:
+            return
+        try:
+            await self.timed_handle(handler, data, connection_id)
+        except Exception:
+            logger.exception(f"Shard {self.index}: błąd obsługi wiadomości {data.get('type')}")
+
+        # Gracz nie jest (już) w żadnym pokoju tego sharda - oddajemy go bramce
+        ws = handler.websocket
+        if ws not in self.player_room_map:
+            self._forget(ws)
+            self.link.emit(["detached", connection_id])
+
+    async def on_disconnect(self, connection_id: str):
+        handler = self.handlers.pop(connection_id, None)
+        if handler:
+            await self.remove_player(handler.websocket, remove_connection=True)
+
+    def _forget(self, ws: RemoteSocket):
+        self.handlers.pop(ws.connection_id, None)
+        self.active_connections.pop(ws, None)
+        self.outbound.pop(ws, None)
+        self.delta_clients.discard(ws)
+        self.bus.unsubscribe_all(ws)
+        self._client_state.pop(ws, None)
+
+    def collect_metrics(self):
+        super().collect_metrics()
+        metrics.connections.set(value=0)  # połączenia liczy bramka
+
+    async def profile(self, seconds: float, interval: float = profiler.DEFAULT_INTERVAL) -> str:
+        return await profiler.profile_loop(seconds, interval, root=f"shard{self.index}")
+
+    async def answer_profile(self, seconds: float, interval: float):
+        # Osobny task - pętla ramek sharda działa dalej, a profil widzi normalną pracę
+        try:
+            text = await self.profile(seconds, interval)
+        except profiler.ProfilerBusy:
+            text = ""
+        self.link.emit(["profile", text])
+
+    def send(self, websocket, message, kind: Optional[str] = None):
+        # Manifest dźwięków wysyła bramka (jej indeksy są jedyne obowiązujące)
+        if kind == "SOUND_MANIFEST":
+            return
+        super().send(websocket, message, kind)
+
+    async def join_room(self, websocket, room_name, password, connection_id, rejoin_id=None):
+        result = await super().join_room(websocket, room_name, password, connection_id, rejoin_id)
+        if result == "OK":
+            self.link.emit(["joined", websocket.connection_id, room_name, self.active_connections.get(websocket)])
+        return result
+
+    async def resume_session(self, websocket, token) -> str:
+        result = await super().resume_session(websocket, token)
+        if result == "OK":
+            # Nick gracza jest w jego miejscu - bramka dostaje go razem z pokojem
+            self.link.emit(["joined", websocket.connection_id, self.player_room_map[websocket],
+                            self.active_connections[websocket]])
+        return result
+
+    def _replace_connection(self, websocket: RemoteSocket):
+        # Prawdziwe gniazdo starego połączenia ma bramka - ona je zamyka
+        self.player_room_map.pop(websocket, None)
+        self._forget(websocket)
+        self.link.emit(["replaced", websocket.connection_id])
+
+    # Widok lobby składa bramka - shard tylko zgłasza swoje pokoje (przez scheduler, więc najwyżej raz na okno)
+    async def broadcast_room_list(self):
+        self._report_rooms()
+
+    async def broadcast_lobby_players(self):
+        self._report_rooms()
+
+    async def broadcast_room_count(self, room_name: str):
+        self._report_rooms()
+
+    def _report_rooms(self):
+        rooms, _ = self._get_rooms_and_players()
+        self.link.emit(["rooms", {r["name"]: r for r in rooms}])
+
+    async def broadcast_lobby_sound(self, prefix: str):
+        pass
+
+    async def broadcast_sound_to_room(self, room_name: str, prefix: str):
+        self.link.emit(["sound", room_name, prefix])
+
+
+async def _shard_main(index: int, sock: socket.socket, store_path: Optional[str], slow_message_threshold: float,
+                      session_secret: Optional[bytes], session_grace: float):
+    reader, writer = await asyncio.open_unix_connection(sock=sock)
+    manager = ShardRoomManager(index, ShardLink(writer), RoomStore(store_path) if store_path else None,
+                               slow_message_threshold=slow_message_threshold,
+                               session_secret=session_secret, session_grace=session_grace)
+    metrics.registry.add_collector(manager.collect_metrics)
+    await manager.start()
+    logger.info(f"Shard {index} gotowy.")
+
+    while True:
+        frame = await read_frame(reader)
+        if frame is None:
+            break
+        match frame[0]:
+            case "attach":
+                manager.attach(frame[1], frame[2], frame[3])
+            case "message":
+                await manager.on_message(frame[1], frame[2])
+            case "disconnect":
+                await manager.on_disconnect(frame[1])
+            case "metrics":
+                manager.link.emit(["metrics", metrics.registry.to_dict()])
+            case "slow":
+                manager.link.emit(["slow", await manager.slow_message_report()])
+            case "profile":
+                asyncio.create_task(manager.answer_profile(frame[1], frame[2]))
+
+    logger.info(f"Shard {index}: bramka zamknęła połączenie, kończę.")
+    await manager.stop()
+    writer.close()
+
+
+def run_shard(index: int, sock: socket.socket, store_path: Optional[str] = None,
+              slow_message_threshold: float = DEFAULT_SLOW_MESSAGE_THRESHOLD,
+              session_secret: Optional[bytes] = None, session_grace: float = DEFAULT_SESSION_GRACE):
+    """Punkt wejścia procesu sharda."""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [shard {index}] [%(levelname)s] %(message)s",
+                        datefmt="%H:%M:%S")
+    try:
+        asyncio.run(_shard_main(index, sock, store_path, slow_message_threshold, session_secret, session_grace))
+    except KeyboardInterrupt:
+        pass
+
+
+# --- Strona bramki ---
+
+class ShardedRoomManager(RoomManager):
+    """
+    Bramka trybu shardów: jedno gniazdo WebSocket dla klientów, pokoje rozłożone na N procesów
+    po spójnym haszu nazwy. Bramka trzyma połączenia, lobby (lista pokoi, gracze, czat) i dźwięki;
+    CREATE_ROOM/JOIN_ROOM i wszystko, co gracz robi w pokoju, idzie do sharda właściciela.
+    """
+
+    def __init__(self, shard_count: int, store_path: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.shard_count = shard_count
+        self.store_path = store_path  # każdy shard ma własny plik: <nazwa>-shard<N><rozszerzenie>
+        self.ring = HashRing(range(shard_count))
+        self.processes = []
+        self.links: Dict[int, ShardLink] = {}
+        self._readers = []
+        self.shard_rooms: Dict[int, Dict[str, dict]] = {i: {} for i in range(shard_count)}
+
+        self._attached: Dict[WebSocket, tuple] = {}  # ws -> (shard, connection_id)
+        self._sockets: Dict[str, WebSocket] = {}  # connection_id -> ws
+        self._waiters: Dict[tuple, asyncio.Future] = {}  # (shard, typ ramki) -> odpowiedź na zapytanie
+
+    async def start(self):
+        ctx = multiprocessing.get_context("spawn")
+        for index in range(self.shard_count):
+            store_path = None
+            if self.store_path:
+                root, ext = os.path.splitext(self.store_path)
+                store_path = f"{root}-shard{index}{ext}"
+
+            parent, child = socket.socketpair()
+            # Ten sam sekret co bramka: token wystawiony w jednym procesie sprawdza każdy
+            process = ctx.Process(target=run_shard, args=(index, child, store_path, self.slow_message_threshold,
+                                                          self.sessions.secret, self.session_grace),
+                                  name=f"cah-shard-{index}", daemon=True)
+            process.start()
+            child.close()
+
+            reader, writer = await asyncio.open_unix_connection(sock=parent)
+            self.links[index] = ShardLink(writer)
+            self.processes.append(process)
+            self._readers.append(asyncio.create_task(self._read_shard(index, reader)))
+        logger.info(f"Uruchomiono {self.shard_count} shardów pokoi.")
+
+    async def stop(self):
+        for link in self.links.values():
+            link.writer.close()
+        for task in self._readers:
+            task.cancel()
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+
+    async def handle_message(self, handler, data: dict, connection_id: str):
+        ws = handler.websocket
+        message_type = data.get('type')
+        self.track_action(ws, message_type)
+        # Liczymy tu, czas obsługi mierzy ten, kto obsługuje (bramka albo shard)
+        metrics.messages_received.inc(message_label(message_type))
+
+        attached = self._attached.get(ws)
+        if attached and message_type not in GATEWAY_MESSAGES:
+            if message_type == 'ENABLE_DELTAS':
+                self.delta_clients.add(ws)
+            self.links[attached[0]].emit(["message", attached[1], data])
+            return
+
+        name = self._target_room(message_type, data)
+        if name is not None:
+            shard = self.ring.get(name)
+            self._attached[ws] = (shard, connection_id)
+            self._sockets[connection_id] = ws
+            link = self.links[shard]
+            link.emit(["attach", connection_id, self.active_connections.get(ws), ws in self.delta_clients])
+            link.emit(["message", connection_id, data])
+            return
+
+        await self.timed_handle(handler, data, connection_id)
+
+    def _target_room(self, message_type, data: dict) -> Optional[str]:
+        """
+        Pokój, do którego wiadomość przypina gracza (i którego shard ją obsłuży), albo None.
+        Wiadomość bez poprawnej nazwy pokoju obsługuje bramka - odpowiada zwykłym błędem.
+        """
+        name = None
+        if message_type == 'CREATE_ROOM':
+            settings = data.get('settings')
+            name = settings.get('name') if isinstance(settings, dict) else None
+        elif message_type == 'JOIN_ROOM':
+            name = data.get('name')
+        elif message_type == 'RESUME':
+            # Nieważny token obsługuje bramka (odpowiada błędem), poprawny - shard z miejscem gracza
+            claims = self.sessions.verify(data.get('token'))
+            name = claims[0] if claims else None
+        return name if isinstance(name, str) else None
+
+    async def remove_player(self, websocket: WebSocket, remove_connection: bool):
+        attached = self._attached.pop(websocket, None)
+        if attached:
+            self._sockets.pop(attached[1], None)
+            self.links[attached[0]].emit(["disconnect", attached[1]])
+        await super().remove_player(websocket, remove_connection)
+
+    async def _read_shard(self, index: int, reader: asyncio.StreamReader):
+        while True:
+            frame = await read_frame(reader)
+            if frame is None:
+                break
+            try:
+                await self._on_shard_frame(index, frame)
+            except Exception:
+                logger.exception(f"Błąd obsługi ramki z sharda {index}")
+
+        logger.error(f"Shard {index} rozłączony - jego gracze wracają do lobby.")
+        for connection_id in [c for ws, (s, c) in self._attached.items() if s == index]:
+            self._detach(connection_id)
+        self.shard_rooms[index] = {}
+        self.schedule_room_list()
+
+    async def _on_shard_frame(self, index: int, frame: list):
+        match frame[0]:
+            case "send":
+                ws = self._sockets.get(frame[1])
+                if ws:
+                    self.send(ws, frame[2], frame[3])
+            case "publish":
+                self.bus.publish(frame[1], frame[2], frame[3])
+            case "sound":
+                await self.broadcast_sound_to_room(frame[1], frame[2])
+            case "joined":
+                ws = self._sockets.get(frame[1])
+                if ws:
+                    self.player_room_map[ws] = frame[2]
+                    self.active_connections[ws] = frame[3]
+                    self.bus.unsubscribe(ws, LOBBY_TOPIC)
+                    self.bus.subscribe(ws, room_topic(frame[2]))
+                    self.schedule_lobby_players()
+            case "detached":
+                self._detach(frame[1])
+            case "replaced":
+                # Miejsce przejęło nowe połączenie (RESUME) - stare zamykamy, jego rozłączenie niczego już nie zmienia
+                ws = self._sockets.pop(frame[1], None)
+                if ws:
+                    self._attached.pop(ws, None)
+                    self._replace_connection(ws)
+            case "rooms":
+                self._update_shard_rooms(index, frame[1])
+            case "metrics" | "slow" | "profile":
+                future = self._waiters.pop((index, frame[0]), None)
+                if future and not future.done():
+                    future.set_result(frame[1])
+
+    async def _ask_shards(self, request: list, timeout: float) -> list:
+        """
+        Wysyła zapytanie do każdego sharda i zbiera odpowiedzi (ramki tego samego typu).
+        Równoległe zapytania tego samego typu czekają na jedną odpowiedź; kto nie zdąży w `timeout`, jest pomijany.
+        """
+        loop = asyncio.get_running_loop()
+        waiting = []
+        for index, link in self.links.items():
+            future = self._waiters.get((index, request[0]))
+            if future is None or future.done():
+                future = self._waiters[(index, request[0])] = loop.create_future()
+                link.emit(request)
+            waiting.append(future)
+        if not waiting:
+            return []
+        done, _ = await asyncio.wait(waiting, timeout=timeout)
+        return [f.result() for f in waiting if f in done]
+
+    async def metrics_text(self) -> str:
+        """Metryki bramki zsumowane z metrykami wszystkich shardów."""
+        return metrics.registry.render(await self._ask_shards(["metrics"], METRICS_TIMEOUT))
+
+    async def slow_message_report(self) -> list:
+        entries = list(self.slow_messages)
+        for shard_entries in await self._ask_shards(["slow"], METRICS_TIMEOUT):
+            entries.extend(shard_entries)
+        return sorted(entries, key=lambda e: e["time"])
+
+    async def profile(self, seconds: float, interval: float = profiler.DEFAULT_INTERVAL) -> str:
+        """Profil bramki i wszystkich shardów naraz (stosy shardów zaczynają się od "shardN")."""
+        seconds = min(seconds, profiler.MAX_SECONDS)
+        shards = asyncio.create_task(self._ask_shards(["profile", seconds, interval], seconds + METRICS_TIMEOUT))
+        try:
+            gateway = await profiler.profile_loop(seconds, interval, root="gateway")
+        except profiler.ProfilerBusy:
+            shards.cancel()
+            raise
+        return gateway + "".join(await shards)
+
+    def _detach(self, connection_id: str):
+        ws = self._sockets.pop(connection_id, None)
+        if ws is None:
+            return
+        self._attached.pop(ws, None)
+        room_name = self.player_room_map.pop(ws, None)
+        if room_name:
+            self.bus.unsubscribe(ws, room_topic(room_name))
+            self.bus.subscribe(ws, LOBBY_TOPIC)
+            # Czat lobby jest w bramce - historia po powrocie z pokoju idzie stąd, nie z sharda
+            self.send_chat_history(ws, LOBBY_TOPIC)
+            self.schedule_lobby_players()
+
+    def _update_shard_rooms(self, index: int, rooms: Dict[str, dict]):
+        old, self.shard_rooms[index] = self.shard_rooms[index], rooms
+        if old.keys() != rooms.keys():
+            self.schedule_room_list()
+            return
+        for name, room in rooms.items():
+            if old[name] != room:
+                self.schedule_room_count(name)
+
+    def room_count(self) -> int:
+        return sum(len(rooms) for rooms in self.shard_rooms.values())
+
+    def _find_room(self, room_name: str) -> Optional[dict]:
+        return self.shard_rooms[self.ring.get(room_name)].get(room_name)
+
+    async def broadcast_room_count(self, room_name: str):
+        room = self._find_room(room_name)
+        if room:
+            self.bus.publish(LOBBY_TOPIC, {"type": "ROOM_UPDATE", "room": room})
+
+    def _get_rooms_and_players(self):
+        _, players_list = super()._get_rooms_and_players()
+        rooms_list = [room for rooms in self.shard_rooms.values() for room in rooms.values()]
+        return rooms_list, players_list
@@ -0,0 +1,85 @@
+import os
+import re
+import time
+import random
+import logging
+from typing import Dict, List, Optional
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+SOUNDS_DIR = os.path.join("static", "sounds")
+AUDIO_EXTENSIONS = {'.mp3', '.wav', '.ogg', '.m4a'}
+# Jak często (najwyżej) sprawdzać mtime katalogu z dźwiękami, w sekundach
+RESCAN_CHECK_INTERVAL = 5.0
+
+
+class SoundManifest:
+    """
+    Lista dźwięków budowana raz przy starcie i pogrupowana po prefiksie (welcome, game_start, win...).
+    Klient dostaje listę URL-i raz (SOUND_MANIFEST), a PLAY_SOUND niesie już tylko indeks.
+    """
+
+    def __init__(self, directory: str = SOUNDS_DIR, check_interval: float = RESCAN_CHECK_INTERVAL):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.version = 0
+        self.sounds: List[str] = []  # indeks -> URL
+        self.groups: Dict[str, List[int]] = {}  # prefiks -> indeksy
+        self.message = ''  # zakodowany SOUND_MANIFEST
+
+        self._dir_mtime = None
+        self._last_check = 0.0
+        self.rescan()
+
+    def rescan(self) -> bool:
+        """Przebudowuje manifest. Zwraca True, jeśli lista plików się zmieniła."""
+        try:
+            self._dir_mtime = os.stat(self.directory).st_mtime_ns
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            self._dir_mtime = None
+            names = []
+
+        sounds = []
+        groups: Dict[str, List[int]] = {}
+        for name in names:
+            stem, ext = os.path.splitext(name)
+            if ext.lower() not in AUDIO_EXTENSIONS:
+                continue
+            # welcome3.wav -> welcome, game_start10.wav -> game_start
+            prefix = re.sub(r'\d+$', '', stem)
+            groups.setdefault(prefix, []).append(len(sounds))
+            # Zamieniamy ścieżkę na URL (np. static/sounds/welcome1.mp3 -> /static/sounds/welcome1.mp3)
+            sounds.append("/" + os.path.join(self.directory, name).replace(os.sep, "/"))
+
+        if sounds == self.sounds and self.message:
+            return False
+
+        self.sounds = sounds
+        self.groups = groups
+        self.version += 1
+        self.message = dumps({"type": "SOUND_MANIFEST", "version": self.version, "sounds": sounds})
+        logger.info(f"Manifest dźwięków v{self.version}: {len(sounds)} plików, grupy: {sorted(groups)}.")
+        return True
+
+    def check_for_changes(self) -> bool:
+        """Tani test mtime katalogu (najwyżej raz na check_interval); przebudowuje manifest po zmianie."""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._dir_mtime:
+            return False
+        return self.rescan()
+
+    def pick(self, prefix: str) -> Optional[int]:
+        indexes = self.groups.get(prefix)
+        if not indexes:
+            return None
+        return random.choice(indexes)
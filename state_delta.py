@@ -0,0 +1,54 @@
+from typing import List
+
+
+def diff_state(old, new, path: str = '') -> List[dict]:
+    """
+    Minimalny zestaw operacji w stylu JSON Patch (add/replace/remove), który zamienia `old` w `new`.
+    Słowniki porównujemy po kluczach, listy o tej samej długości po indeksach; resztę podmieniamy w całości.
+    Ścieżki nie są escapowane (~0/~1) - klucze stanu gry nie zawierają '/' ani '~'.
+    Równe poddrzewa odrzucamy jednym porównaniem (w C), zanim zaczniemy schodzić po kluczach -
+    większość pól między wersjami się nie zmienia, a rekurencja po nich kosztowała więcej niż
+    zakodowanie pełnego stanu.
+    """
+    if old is new or (type(old) is type(new) and old == new):
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": f"{path}/{key}", "value": value})
+            else:
+                ops.extend(diff_state(old[key], value, f"{path}/{key}"))
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{key}"})
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for i, (a, b) in enumerate(zip(old, new)):
+            ops.extend(diff_state(a, b, f"{path}/{i}"))
+        return ops
+
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def apply_ops(target, ops: List[dict]):
+    """Nakłada operacje z diff_state na `target` (w miejscu). Zwraca nowy korzeń (gdy podmieniono cały stan)."""
+    for op in ops:
+        keys = op["path"].split('/')[1:]
+        if not keys:
+            target = op["value"]
+            continue
+        parent = target
+        for key in keys[:-1]:
+            parent = parent[int(key)] if isinstance(parent, list) else parent[key]
+        last = keys[-1]
+        if isinstance(parent, list):
+            last = int(last)
+        if op["op"] == "remove":
+            del parent[last]
+        else:
+            parent[last] = op["value"]
+    return target
@@ -5,6 +5,7 @@
   const localFile = document.getElementById('local-file');
   const newDeckBtn = document.getElementById('new-deck');
   const downloadBtn = document.getElementById('download-deck');
+  const uploadBtn = document.getElementById('upload-deck');
 
   let currentDeck = null;
 
@@ -58,6 +59,28 @@
     const a = document.createElement('a'); a.href=url; a.download = name + '.json'; document.body.appendChild(a); a.click(); a.remove(); URL.revokeObjectURL(url);
   });
 
+  // Upload na serwer (PUT /admin/decks/<nazwa>, token admina z CAH_ADMIN_TOKEN); gra w toku zostaje przy starej wersji
+  uploadBtn.addEventListener('click', async ()=>{
+    if(!currentDeck) return alert('Brak decku');
+    const name = document.getElementById('meta-name').value.trim() || (currentDeck.meta && currentDeck.meta.name) || '';
+    if(!name) return alert('Podaj nazwę pliku decku');
+    let token = sessionStorage.getItem('cah_admin_token');
+    if(!token){
+      token = prompt('Token administratora:');
+      if(!token) return;
+    }
+    const body = new Blob([JSON.stringify(currentDeck)], {type:'application/json;charset=utf-8'});
+    try{
+      const r = await fetch('/admin/decks/'+encodeURIComponent(name), {method:'PUT', headers:{'X-Admin-Token': token}, body});
+      if(r.status === 403){ sessionStorage.removeItem('cah_admin_token'); return alert('Niepoprawny token administratora'); }
+      sessionStorage.setItem('cah_admin_token', token);
+      const res = await r.json();
+      if(!r.ok) return alert('Deck odrzucony: '+res.error+(res.problems.length ? '\n\n'+res.problems.join('\n') : ''));
+      alert(`Wysłano '${res.deck}' (${res.white} białych, ${res.black} czarnych).`+(res.warning_count ? `\nOstrzeżenia: ${res.warning_count}\n`+res.warnings.join('\n') : ''));
+      ws.send(JSON.stringify({type:'GET_DECKS'}));
+    }catch(e){ alert('Błąd wysyłania: '+e); }
+  });
+
   document.querySelectorAll('.tab').forEach(btn=>btn.addEventListener('click', ()=>{
     document.querySelectorAll('.tab').forEach(t=>t.classList.remove('active'));
     document.querySelectorAll('.tab-panel').forEach(p=>p.classList.remove('active'));
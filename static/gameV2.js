@@ -4,6 +4,8 @@ class GameApiClient {
     }
 
     send(message) {
+        // W trakcie wznawiania sesji nowe połączenie może być jeszcze otwierane
+        if (this.ws.readyState !== WebSocket.OPEN) return;
         this.ws.send(JSON.stringify(message));
     }
 
@@ -42,6 +44,16 @@ class GameApiClient {
         this.send({ type: 'JOIN_ROOM', name: roomName, password: password });
     }
 
+    rejoinRoom({ room, connection_id }) {
+        // Powrót na swoje miejsce po restarcie serwera / przeładowaniu strony
+        this.send({ type: 'JOIN_ROOM', name: room, connection_id: connection_id });
+    }
+
+    resume(session) {
+        // Powrót na to samo miejsce po zerwanym połączeniu (token z JOIN_ROOM_OK)
+        this.send({ type: 'RESUME', token: session });
+    }
+
     leaveRoom() {
         this.send({ type: 'LEAVE_ROOM' });
     }
@@ -63,27 +75,244 @@ class GameApiClient {
     setReady() {
         this.send({ type: 'PLAYER_READY' });
     }
+
+    enableDeltas() {
+        this.send({ type: 'ENABLE_DELTAS' });
+    }
+
+    requestResync() {
+        this.send({ type: 'RESYNC' });
+    }
+}
+
+// Składa stan gry z pełnych GAME_UPDATE i wersjonowanych GAME_DELTA (operacje w stylu JSON Patch).
+class GameStateSync {
+    constructor(gameApiClient) {
+        this.gameApiClient = gameApiClient;
+        this.reset();
+    }
+
+    reset() {
+        this.state = null;
+        this.version = null;
+        this.awaitingResync = false;
+    }
+
+    onFullState(message) {
+        this.state = message;
+        this.version = message.v;
+        this.awaitingResync = false;
+        return this.state;
+    }
+
+    onDelta(message) {
+        if (this.state === null || message.base !== this.version) {
+            // Luka w wersjach - prosimy o pełny stan (raz, dopóki nie przyjdzie)
+            if (!this.awaitingResync) {
+                this.awaitingResync = true;
+                this.gameApiClient.requestResync();
+            }
+            return null;
+        }
+
+        let state = this.state;
+        for (const op of message.ops) {
+            state = applyPatchOp(state, op);
+        }
+        this.state = state;
+        this.version = message.v;
+        return this.state;
+    }
+}
+
+// Kopiowanie przy zapisie: obiekty na ścieżce operacji są odtwarzane, reszta jest współdzielona.
+// Zmienione pola mają nowe referencje, więc Alpine widzi zmianę po przypisaniu (np. blackCard).
+function applyPatchOp(target, { op, path, value }) {
+    const keys = path.split('/').slice(1);
+    if (keys.length === 0) {
+        return value;
+    }
+    return patchAt(target, keys, op, value);
+}
+
+function patchAt(node, keys, op, value) {
+    const copy = Array.isArray(node) ? node.slice() : { ...node };
+    const [key, ...rest] = keys;
+
+    if (rest.length > 0) {
+        copy[key] = patchAt(node[key], rest, op, value);
+    } else if (op === 'remove') {
+        delete copy[key];
+    } else {
+        copy[key] = value;
+    }
+    return copy;
 }
 
 function on(eventType, callback) {
     window.addEventListener(eventType, callback);
 }
 
+// Rozmiar i czas dekodowania odebranych wiadomości wg formatu - w konsoli: wireStats.summary()
+const wireStats = {
+    json: { messages: 0, bytes: 0, decodeMs: 0 },
+    msgpack: { messages: 0, bytes: 0, decodeMs: 0 },
+
+    record(format, bytes, decodeMs) {
+        const stats = this[format];
+        stats.messages += 1;
+        stats.bytes += bytes;
+        stats.decodeMs += decodeMs;
+    },
+
+    summary() {
+        const rows = {};
+        for (const format of ['json', 'msgpack']) {
+            const stats = this[format];
+            if (!stats.messages) continue;
+            rows[format] = {
+                messages: stats.messages,
+                avgBytes: Math.round(stats.bytes / stats.messages),
+                avgDecodeUs: Math.round(stats.decodeMs * 1000 / stats.messages),
+            };
+        }
+        console.table(rows);
+        return rows;
+    },
+};
+
+function decodeMessage(data) {
+    const started = performance.now();
+    let message, format, size;
+    if (typeof data === 'string') {
+        message = JSON.parse(data);
+        format = 'json';
+        size = data.length;  // w znakach, jak licznik po stronie serwera
+    } else {
+        const bytes = new Uint8Array(data);
+        message = msgpackDecode(bytes);
+        format = 'msgpack';
+        size = bytes.byteLength;
+    }
+    wireStats.record(format, size, performance.now() - started);
+    return message;
+}
+
+// Odstępy kolejnych prób wznowienia sesji po zerwanym połączeniu [ms] - razem mniej niż CAH_SESSION_GRACE
+const RESUME_DELAYS = [500, 1000, 2000, 4000, 8000, 15000];
+// Serwer zamknął to połączenie, bo nasze miejsce przejęło inne (RESUME z innej karty) - nie wznawiamy
+const CLOSE_REPLACED = 4001;
+
+function savedSeat() {
+    const seat = sessionStorage.getItem('cah_seat');
+    return seat ? JSON.parse(seat) : null;
+}
+
 function initialize() {
-    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    ws = new WebSocket(`${protocol}//${window.location.host}/ws`);
-    ws.onopen = () => console.log("WS Connected");
-    ws.onmessage = (e) => {
-        let message = JSON.parse(e.data);
-        let event = new CustomEvent(message.type, { detail: message });
-        window.dispatchEvent(event);
-    };
-    ws.onclose = () => { alert("Rozłączono!"); location.reload(); };
+    gameApiClient = new GameApiClient(null);
+    const stateSync = new GameStateSync(gameApiClient);
+    let inRoom = false;
+    let resumeAttempt = -1;  // >= 0: trwa wznawianie sesji po zerwanym połączeniu
+
+    function connect() {
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        // Serwer wybiera "cah.msgpack" (duże wiadomości binarnie), jeśli ma bibliotekę msgpack, inaczej "cah.json"
+        ws = new WebSocket(`${protocol}//${window.location.host}/ws`, ['cah.msgpack', 'cah.json']);
+        ws.binaryType = 'arraybuffer';
+        gameApiClient.ws = ws;
+
+        ws.onopen = () => {
+            console.log("WS Connected");
+            gameApiClient.enableDeltas();
+            if (resumeAttempt >= 0) gameApiClient.resume(savedSeat().session);
+        };
+        ws.onmessage = (e) => {
+            let message = decodeMessage(e.data);
+
+            if (message.type === 'GAME_UPDATE') {
+                message = stateSync.onFullState(message);
+            } else if (message.type === 'GAME_DELTA') {
+                const state = stateSync.onDelta(message);
+                if (state === null) return;
+                message = state;
+            } else if (message.type === 'LEFT_ROOM') {
+                stateSync.reset();
+            }
+
+            let event = new CustomEvent(message.type, { detail: message });
+            window.dispatchEvent(event);
+        };
+        ws.onclose = (e) => {
+            // 1013: serwer odrzucił połączenie (limit) - powód przyszedł w ERROR, bez automatycznego przeładowania
+            if (e.code === 1013) return;
+            if (e.code === CLOSE_REPLACED) {
+                sessionStorage.removeItem('cah_seat');
+                alert("Gra jest kontynuowana w innym oknie.");
+                location.reload();
+                return;
+            }
+            // Gracz w pokoju: serwer trzyma jego miejsce - łączymy się ponownie i wysyłamy RESUME
+            const seat = savedSeat();
+            if (inRoom && seat && seat.session && resumeAttempt + 1 < RESUME_DELAYS.length) {
+                resumeAttempt += 1;
+                console.log(`Połączenie zerwane - wznawianie sesji (próba ${resumeAttempt + 1})`);
+                setTimeout(connect, RESUME_DELAYS[resumeAttempt]);
+                return;
+            }
+            alert("Rozłączono!");
+            location.reload();
+        };
+    }
+
+    connect();
     Alpine.store('texts', TEXTS);
 
-    gameApiClient = new GameApiClient(ws);
+    on('ERROR', (e) => {
+        if (e.detail.code === 'ERR_RATE_LIMITED') console.warn(e.detail.message);
+        else if (e.detail.code === 'ERR_SESSION_EXPIRED') onSessionExpired(e.detail.message);
+        else alert(e.detail.message);
+    });
+
+    function onSessionExpired(message) {
+        const seat = savedSeat();
+        sessionStorage.removeItem('cah_seat');
+        if (resumeAttempt >= 0) {
+            alert(message);
+            location.reload();
+        } else if (seat) {
+            // Token sprzed restartu serwera - zostaje powrót po connection_id do odtworzonego pokoju
+            gameApiClient.rejoinRoom(seat);
+        }
+    }
 
-    on('ERROR', (e) => alert(e.detail.message));
+    // Zapamiętane miejsce w pokoju (sessionStorage przeżywa location.reload po rozłączeniu)
+    on('JOIN_ROOM_OK', (e) => {
+        inRoom = true;
+        sessionStorage.setItem('cah_seat', JSON.stringify(e.detail));
+    });
+    on('LEFT_ROOM', () => {
+        inRoom = false;
+        sessionStorage.removeItem('cah_seat');
+    });
+    on('NICK_OK', () => {
+        const seat = savedSeat();
+        if (!seat) return;
+        if (seat.session) {
+            gameApiClient.resume(seat.session);
+        } else {
+            sessionStorage.removeItem('cah_seat');
+            gameApiClient.rejoinRoom(seat);
+        }
+    });
+    on('RESUME_OK', (e) => {
+        resumeAttempt = -1;
+        Alpine.store('nickname', e.detail.nick);
+        // Po zerwanym połączeniu widok pokoju został - wystarczy pełny stan, który zaraz przyjdzie
+        if (inRoom) return;
+        const { room, connection_id, player_id } = e.detail;
+        const detail = { room, connection_id, player_id, session: savedSeat().session };
+        window.dispatchEvent(new CustomEvent('JOIN_ROOM_OK', { detail }));
+    });
 
     createLogin(gameApiClient);
     createRoomList(gameApiClient);
@@ -212,6 +441,16 @@ function createChat(gameApiClient) {
                 // todo scroll to bottom of chat
             });
 
+            // Kilka linii z jednego okna serwera w jednej ramce
+            on('CHAT_DIGEST', (e) => {
+                this.messages.push(...e.detail.lines.map(models.chatMessage));
+            });
+
+            // Ostatnie linie czatu pokoju / lobby - przychodzą zaraz po wejściu
+            on('CHAT_HISTORY', (e) => {
+                this.messages = e.detail.lines.map(models.chatMessage);
+            });
+
             on('JOIN_ROOM_OK', () => {
                 this.newMessage = "";
                 this.messages = [];
@@ -326,8 +565,8 @@ function createGameRoom(gameApiClient) {
             });
         },
 
-        onRoomJoined({room, connection_id}) {
-            this.id = connection_id;
+        onRoomJoined({room, player_id}) {
+            this.id = player_id;
             this.roomName = room;
             this.show = true;
         },
@@ -436,19 +675,34 @@ function createGameRoom(gameApiClient) {
 }
 
 function createSoundPlayer() {
+    // Manifest przychodzi raz po połączeniu, PLAY_SOUND niesie tylko indeks dźwięku
+    let sounds = [];
+
+    on('SOUND_MANIFEST', (e) => {
+        sounds = e.detail.sounds.map(src => {
+            const audio = new Audio();
+            audio.preload = 'auto';
+            audio.src = src;
+            return audio;
+        });
+    });
+
     Alpine.data('soundPlayer', () => ({
         mute: false,
 
         init() {
-            on('PLAY_SOUND', (e) => this.playSound(e.detail.src));
+            on('PLAY_SOUND', (e) => this.playSound(e.detail.i));
             this.mute = localStorage.getItem('mute_sounds') === 'true';
         },
 
-        playSound(src) {
+        playSound(index) {
             if (localStorage.getItem('mute_sounds') === 'true') return;
 
+            const preloaded = sounds[index];
+            if (!preloaded) return;
+
             try {
-                const audio = new Audio(src);
+                const audio = preloaded.cloneNode();
                 audio.volume = 0.5;
                 audio.play().catch(e => console.warn("Audio blocked:", e));
             } catch (e) { console.error(e); }
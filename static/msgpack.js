@@ -0,0 +1,74 @@
+// Minimalny dekoder MessagePack (tylko odczyt) dla podprotokołu "cah.msgpack".
+// Serwer koduje binarnie tylko GAME_UPDATE i ROOM_LIST, klient nadal wysyła JSON.
+const msgpackTextDecoder = new TextDecoder();
+
+function msgpackDecode(bytes) {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    let pos = 0;
+
+    function str(length) {
+        const value = msgpackTextDecoder.decode(bytes.subarray(pos, pos + length));
+        pos += length;
+        return value;
+    }
+
+    function array(length) {
+        const value = new Array(length);
+        for (let i = 0; i < length; i++) value[i] = read();
+        return value;
+    }
+
+    function map(length) {
+        const value = {};
+        for (let i = 0; i < length; i++) {
+            const key = read();
+            value[key] = read();
+        }
+        return value;
+    }
+
+    function bin(length) {
+        const value = bytes.slice(pos, pos + length);
+        pos += length;
+        return value;
+    }
+
+    function read() {
+        const type = bytes[pos++];
+        if (type < 0x80) return type;
+        if (type < 0x90) return map(type & 0x0f);
+        if (type < 0xa0) return array(type & 0x0f);
+        if (type < 0xc0) return str(type & 0x1f);
+        if (type >= 0xe0) return type - 0x100;
+
+        let value;
+        switch (type) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: value = view.getUint8(pos); pos += 1; return bin(value);
+            case 0xc5: value = view.getUint16(pos); pos += 2; return bin(value);
+            case 0xc6: value = view.getUint32(pos); pos += 4; return bin(value);
+            case 0xca: value = view.getFloat32(pos); pos += 4; return value;
+            case 0xcb: value = view.getFloat64(pos); pos += 8; return value;
+            case 0xcc: value = view.getUint8(pos); pos += 1; return value;
+            case 0xcd: value = view.getUint16(pos); pos += 2; return value;
+            case 0xce: value = view.getUint32(pos); pos += 4; return value;
+            case 0xcf: value = Number(view.getBigUint64(pos)); pos += 8; return value;
+            case 0xd0: value = view.getInt8(pos); pos += 1; return value;
+            case 0xd1: value = view.getInt16(pos); pos += 2; return value;
+            case 0xd2: value = view.getInt32(pos); pos += 4; return value;
+            case 0xd3: value = Number(view.getBigInt64(pos)); pos += 8; return value;
+            case 0xd9: value = view.getUint8(pos); pos += 1; return str(value);
+            case 0xda: value = view.getUint16(pos); pos += 2; return str(value);
+            case 0xdb: value = view.getUint32(pos); pos += 4; return str(value);
+            case 0xdc: value = view.getUint16(pos); pos += 2; return array(value);
+            case 0xdd: value = view.getUint32(pos); pos += 4; return array(value);
+            case 0xde: value = view.getUint16(pos); pos += 2; return map(value);
+            case 0xdf: value = view.getUint32(pos); pos += 4; return map(value);
+        }
+        throw new Error(`msgpack: nieobsługiwany typ 0x${type.toString(16)}`);
+    }
+
+    return read();
+}
@@ -0,0 +1,81 @@
+import heapq
+import asyncio
+import logging
+import itertools
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """
+    Wspólny zegar terminów dla wszystkich pokoi: kopiec (deadline, seq, klucz) i jeden
+    TimerHandle pętli zdarzeń ustawiony na najbliższy termin - zamiast tysięcy śpiących tasków.
+    Klucz (np. obiekt pokoju) ma najwyżej jeden aktywny termin; nowy zastępuje poprzedni.
+    """
+
+    def __init__(self):
+        self._heap = []  # (deadline, seq, key)
+        self._entries = {}  # key -> (deadline, seq, callback)
+        self._seq = itertools.count()
+        self._handle = None
+        self._armed_at = None
+
+    def schedule(self, key, delay: float, callback):
+        """callback: async func() wywoływana po `delay` sekundach."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + delay
+        seq = next(self._seq)
+        self._entries[key] = (deadline, seq, callback)
+        heapq.heappush(self._heap, (deadline, seq, key))
+        self._arm(loop)
+
+    def cancel(self, key):
+        self._entries.pop(key, None)
+        # Wpis w kopcu zostaje jako nieaktualny; sprzątamy, gdy jest ich za dużo
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(d, s, k) for d, s, k in self._heap if self._is_current(k, s)]
+            heapq.heapify(self._heap)
+
+    def pending(self) -> int:
+        return len(self._entries)
+
+    def _is_current(self, key, seq) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[1] == seq
+
+    def _arm(self, loop):
+        heap = self._heap
+        while heap and not self._is_current(heap[0][2], heap[0][1]):
+            heapq.heappop(heap)
+
+        if not heap:
+            if self._handle: self._handle.cancel()
+            self._handle = self._armed_at = None
+            return
+
+        first = heap[0][0]
+        if self._handle and self._armed_at == first:
+            return
+        if self._handle: self._handle.cancel()
+        self._handle = loop.call_at(first, self._fire)
+        self._armed_at = first
+
+    def _fire(self):
+        loop = asyncio.get_running_loop()
+        self._handle = self._armed_at = None
+        now = loop.time()
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, seq, key = heapq.heappop(heap)
+            if not self._is_current(key, seq):
+                continue
+            _, _, callback = self._entries.pop(key)
+            loop.create_task(self._run(callback))
+        self._arm(loop)
+
+    @staticmethod
+    async def _run(callback):
+        try:
+            await callback()
+        except Exception:
+            logger.exception("Błąd w obsłudze terminu")